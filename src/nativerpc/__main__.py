@@ -8,6 +8,15 @@ import sys
 
 
 def main():
+    # Python commands run in process, the rest in the node cli
+    if sys.argv[1:2] == ["compile"]:
+        from .compiler import main as compileMain
+        compileMain(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["bench"]:
+        from .bench import main as benchMain
+        benchMain(sys.argv[2:])
+        return
     dir = os.path.dirname(__file__)
     args = " ".join([f"\"{x}\"" for x in sys.argv[1:]])
     res = os.system(f"node {dir}/cli.js {args}")
@@ -0,0 +1,527 @@
+##
+#   Native RPC Benchmarks
+#
+#       LAZY_MODULES
+#       PARSER_CASES
+#       PARSER_LANGUAGES
+#       LOAD_SCHEMA
+#       LOAD_PAYLOAD
+#       LOAD_ITEMS
+#       LOAD_OPTIONS
+#
+#       benchStartup
+#       runPython
+#       benchParser
+#       generateSchema
+#       timeCall
+#       measureMemory
+#       benchLoad
+#       createWorkspace
+#       runScript
+#       readOutput
+#       createService
+#       createParams
+#       runLoadServer
+#       runLoadClient
+#       benchMicro
+#       runMicro
+#       timeOperation
+#       getPercentile
+#       writeResults
+#       compareResults
+#       main
+##
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Final
+
+# Modules that must not be loaded by import nativerpc
+LAZY_MODULES: Final = [
+    "requests",
+    "psutil",
+    "nativerpc.parser",
+    "multiprocessing.shared_memory",
+]
+
+# Synthetic schema shapes, class count, nesting depth and comments
+PARSER_CASES: Final = {
+    "10": (10, 0, False),
+    "1k": (1000, 0, False),
+    "10k": (10000, 0, False),
+    "nested": (1000, 16, False),
+    "commented": (1000, 0, True),
+}
+
+# Parsed languages, by file extension
+PARSER_LANGUAGES: Final = {
+    "python": ".py",
+    "typescript": ".ts",
+    "cpp": ".h",
+}
+
+# Load test schema, echo sends a flat message and place a nested one
+LOAD_SCHEMA: Final = """class BenchItem:
+    name: str
+    count: int
+    tags: dict
+
+    def __init__(self):
+        self.name = ""
+        self.count = 0
+        self.tags = {}
+
+
+class BenchOrder:
+    item: BenchItem
+    items: list
+    note: str
+
+    def __init__(self):
+        self.item = BenchItem()
+        self.items = []
+        self.note = ""
+
+
+class BenchService:
+    def echo(self, param: BenchItem) -> BenchItem: ...
+
+    def place(self, param: BenchOrder) -> BenchOrder: ...
+"""
+
+# Load test defaults, calls are per client and pipelined calls share one connection
+LOAD_PAYLOAD: Final = 64
+LOAD_ITEMS: Final = 10
+LOAD_OPTIONS: Final = {
+    "--clients": "4",
+    "--calls": "2000",
+    "--pipeline": "1",
+    "--protocol": "framed",
+    "--payload": f"{LOAD_PAYLOAD}",
+    "--items": f"{LOAD_ITEMS}",
+    "--mix": "echo:1",
+}
+
+
+def benchStartup(repeat):
+    emptyTimes = [runPython("pass") for _ in range(repeat)]
+    importTimes = [runPython("import nativerpc") for _ in range(repeat)]
+    loaded = json.loads(subprocess.check_output([
+        sys.executable,
+        "-c",
+        f"import json, sys, nativerpc; print(json.dumps([x for x in {LAZY_MODULES!r} if x in sys.modules]))"
+    ], env=dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(__file__)))))
+
+    # Import cost is reported above interpreter startup
+    return {
+        "interpreterMs": statistics.median(emptyTimes) * 1000,
+        "importMs": max(statistics.median(importTimes) - statistics.median(emptyTimes), 0) * 1000,
+        "eagerModules": loaded,
+    }
+
+
+def runPython(code):
+    startTime = time.perf_counter()
+    subprocess.check_call(
+        [sys.executable, "-c", code],
+        env=dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(__file__))),
+    )
+    return time.perf_counter() - startTime
+
+
+def benchParser(repeat):
+    from . import parser
+    patterns = {".py": parser.PYTHON_TOKENS, ".ts": parser.TYPESCRIPT_TOKENS, ".h": parser.CPP_TOKENS}
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for language, extension in PARSER_LANGUAGES.items():
+            for name, (classCount, depth, comments) in PARSER_CASES.items():
+                file = os.path.join(folder, f"schema_{name}{extension}")
+                with open(file, "wt") as stream:
+                    stream.write(generateSchema(language, classCount, depth, comments))
+                with open(file, "rt") as stream:
+                    tokens = sum(1 for x in parser.tokenize(stream.read(), patterns[extension]) if x[0] != "space")
+
+                # Large schemas are timed fewer times, memory is traced in a separate run
+                count = max(1, repeat * 100 // max(classCount, 100))
+                sceneTime = timeCall(parser.parseSchemaScene, file, count)
+                listTime = timeCall(parser.parseSchemaList, file, count)
+                prefix = f"{language}.{name}"
+                results[f"{prefix}.tokens"] = tokens
+                results[f"{prefix}.sceneMs"] = sceneTime * 1000
+                results[f"{prefix}.listMs"] = listTime * 1000
+                results[f"{prefix}.sceneTokensPerSec"] = tokens / sceneTime
+                results[f"{prefix}.listTokensPerSec"] = tokens / listTime
+                results[f"{prefix}.scenePeakKb"] = measureMemory(parser.parseSchemaScene, file) / 1024
+                results[f"{prefix}.listPeakKb"] = measureMemory(parser.parseSchemaList, file) / 1024
+    return results
+
+
+def generateSchema(language, classCount, depth, comments):
+    # Even classes are messages, odd classes are services over the previous message
+    lines = ["# Synthetic schema" if language == "python" else "/* Synthetic schema */", ""]
+    for index in range(classCount):
+        message = f"Message{index - index % 2}"
+        body = []
+        if language == "python":
+            opener, closer, indent = "class {}:", None, "    "
+            if index % 2 == 0:
+                body += ["name: str", "count: int", "items: list", "tags: dict", ""]
+                body += ["def __init__(self):", "    self.name = \"\"", "    self.count = 0"]
+                body += ["    self.items = []", "    self.tags = {}"]
+            else:
+                body += [f"def call{index}(self, param: {message}) -> {message}: ..."]
+            comment = "# Synthetic comment, kept as text by the parser"
+        elif language == "typescript":
+            opener, closer, indent = "export class {} {{", "}", "    "
+            if index % 2 == 0:
+                body += ["name: string;", "count: number;", "items: Array;", "tags: object;"]
+            else:
+                opener = "export abstract class {} {{"
+                body += [f"abstract call{index}(param: {message}): Promise<{message}>;"]
+            comment = "// Synthetic comment, kept as text by the parser"
+        else:
+            opener, closer, indent = "class {} {{", "};", "    "
+            if index % 2 == 0:
+                body += ["public:", "std::string name;", "int count;", "nlohmann::json items;", "nlohmann::json tags;"]
+            else:
+                body += ["public:", f"virtual {message} call{index}({message} param) = 0;"]
+            comment = "// Synthetic comment, kept as text by the parser"
+
+        # Nested classes wrap each declaration, comment lines precede members, C++ keeps access
+        # specifiers next to the member
+        name = f"Message{index}" if index % 2 == 0 else f"Service{index}"
+        if comments:
+            body = [y for i, x in enumerate(body) for y in (
+                [comment, x] if x and (i == 0 or body[i - 1] != "public:") else [x])]
+        block = [opener.format(name)] + [indent + x if x else x for x in body] + ([closer] if closer else [])
+        for level in reversed(range(depth)):
+            block = [opener.format(f"Level{level}")] + [indent + x if x else x for x in block] + ([closer] if closer else [])
+        lines += block + [""]
+    return "\n".join(lines)
+
+
+def timeCall(function, file, count):
+    times = []
+    for _ in range(count):
+        startTime = time.perf_counter()
+        function(file)
+        times.append(time.perf_counter() - startTime)
+    return statistics.median(times)
+
+
+def measureMemory(function, *args):
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchLoad(options):
+    import psutil
+    options = dict(LOAD_OPTIONS, **options)
+    clientCount = int(options["--clients"])
+    pipeline = int(options["--pipeline"])
+    assert pipeline == 1 or options["--protocol"] == "framed", "Pipelining needs the framed protocol"
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        port = sock.getsockname()[1]
+
+    with tempfile.TemporaryDirectory() as folder:
+        command, env = createWorkspace(folder)
+        server = subprocess.Popen(command + ["server", json.dumps({"port": port})], stdout=subprocess.PIPE, env=env)
+        try:
+            assert server.stdout.readline(), "Failed to start server"
+            serverProcess = psutil.Process(server.pid)
+
+            # Clients connect and warm up, then start together
+            config = dict(
+                port=port,
+                protocol=options["--protocol"],
+                calls=int(options["--calls"]),
+                pipeline=pipeline,
+                payload=int(options["--payload"]),
+                items=int(options["--items"]),
+                mix={x.split(":")[0]: float(x.split(":")[1]) for x in options["--mix"].split(",")},
+                startTime=time.time() + 1 + 0.2 * clientCount,
+            )
+            # Results are passed through files, clients print connection warnings to stdout
+            outputFiles = [os.path.join(folder, f"client{x}.json") for x in range(clientCount)]
+            clients = [
+                subprocess.Popen(command + ["client", json.dumps(dict(config, seed=x, output=outputFiles[x]))],
+                                 stdout=subprocess.DEVNULL, env=env)
+                for x in range(clientCount)
+            ]
+            while time.time() < config["startTime"]:
+                time.sleep(0.01)
+            serverTimes = serverProcess.cpu_times()
+            failed = [x.wait() for x in clients]
+            if any(failed):
+                raise RuntimeError(f"Failed load clients: {failed}")
+            outputs = [readOutput(x) for x in outputFiles]
+            serverCpu = sum(serverProcess.cpu_times()[0: 2]) - sum(serverTimes[0: 2])
+            serverRss = serverProcess.memory_info().rss
+        finally:
+            server.terminate()
+            server.wait()
+
+    latencies = sorted(x for item in outputs for x in item["latencies"])
+    calls = len(latencies)
+    duration = max(x["endTime"] for x in outputs) - config["startTime"]
+    return {
+        "calls": calls,
+        "errors": sum(x["errors"] for x in outputs),
+        "throughputPerSec": calls / duration,
+        "latencyP50Ms": getPercentile(latencies, 0.5) * 1000,
+        "latencyP99Ms": getPercentile(latencies, 0.99) * 1000,
+        "latencyP999Ms": getPercentile(latencies, 0.999) * 1000,
+        "serverCpuUs": serverCpu / calls * 1e6,
+        "clientCpuUs": sum(x["cpuTime"] for x in outputs) / calls * 1e6,
+        "serverRssMb": serverRss / 1024 / 1024,
+    }
+
+
+def createWorkspace(folder):
+    # Benchmark processes run as scripts of a temporary workspace, the workspace is found from the entry point
+    sourcePath = os.path.join(folder, "bench", "src")
+    os.makedirs(sourcePath)
+    with open(os.path.join(folder, "workspace.json"), "wt") as stream:
+        json.dump({"projectNames": ["bench"], "schemaNames": ["bench_schema"], "verifyPython": False}, stream)
+    with open(os.path.join(sourcePath, "bench_schema.py"), "wt") as stream:
+        stream.write(LOAD_SCHEMA)
+    with open(os.path.join(sourcePath, "bench_main.py"), "wt") as stream:
+        stream.write("import sys\nfrom nativerpc.bench import runScript\n\nrunScript(sys.argv[1:])\n")
+    command = [sys.executable, "-u", os.path.join(sourcePath, "bench_main.py")]
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(__file__)))
+    return command, env
+
+
+def runScript(args):
+    # Entry point of the benchmark processes, results are written to the output file of the config
+    config = json.loads(args[1])
+    if args[0] == "server":
+        runLoadServer(config)
+        return
+    result = runLoadClient(config) if args[0] == "client" else runMicro(config)
+    with open(config["output"], "wt") as stream:
+        json.dump(result, stream)
+
+
+def readOutput(file):
+    with open(file, "rt") as stream:
+        return json.load(stream)
+
+
+def createService():
+    import bench_schema
+
+    class BenchImpl(bench_schema.BenchService):
+        def echo(self, param):
+            return param
+
+        def place(self, param):
+            param.item.count += len(param.items)
+            return param
+
+    return BenchImpl
+
+
+def createParams(payload, items):
+    import bench_schema
+    item = bench_schema.BenchItem()
+    item.name = "x" * payload
+    item.tags = {"kind": "bench"}
+    order = bench_schema.BenchOrder()
+    order.item = item
+    order.items = [{"name": f"item{x}", "count": x} for x in range(items)]
+    order.note = "x" * payload
+    return {"echo": item, "place": order}
+
+
+def runLoadServer(config):
+    import nativerpc
+    nativerpc.Server({"service": createService(), "host": ("localhost", config["port"])}).listen()
+
+
+def runLoadClient(config):
+    import nativerpc
+    import bench_schema
+    client = nativerpc.Client({
+        "service": bench_schema.BenchService,
+        "host": ("localhost", config["port"]),
+        "protocol": config["protocol"],
+    }).connect()
+
+    # Payloads are built once, the call sequence is drawn from the mix weights
+    params = createParams(config["payload"], config["items"])
+    names = random.Random(config["seed"]).choices(list(config["mix"]), list(config["mix"].values()), k=config["calls"])
+    for name in names[0: 100]:
+        getattr(client, name)(params[name])
+
+    latencies = []
+    errors = []
+
+    def callLoop(names):
+        for name in names:
+            startTime = time.perf_counter()
+            try:
+                getattr(client, name)(params[name])
+            except Exception:
+                errors.append(name)
+                continue
+            latencies.append(time.perf_counter() - startTime)
+
+    while time.time() < config["startTime"]:
+        time.sleep(0.001)
+    cpuTime = time.process_time()
+    threads = [threading.Thread(target=callLoop, args=(names[x::config["pipeline"]],)) for x in range(config["pipeline"])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result = {
+        "latencies": latencies,
+        "errors": len(errors),
+        "cpuTime": time.process_time() - cpuTime,
+        "endTime": time.time(),
+    }
+    client.close()
+    return result
+
+
+def benchMicro(repeat):
+    with tempfile.TemporaryDirectory() as folder:
+        command, env = createWorkspace(folder)
+        outputFile = os.path.join(folder, "micro.json")
+        subprocess.check_call(command + ["micro", json.dumps({"repeat": repeat, "output": outputFile})],
+                              stdout=subprocess.DEVNULL, env=env)
+        return readOutput(outputFile)
+
+
+def runMicro(config):
+    from .common import Connection
+    from .extension import getHeaderMap
+    from .main import Serializer, Server
+
+    # Hot paths of a served call, on the nested load test message
+    serializer = Serializer()
+    server = Server({"service": createService(), "host": ("localhost", 0)})
+    order = createParams(LOAD_PAYLOAD, LOAD_ITEMS)["place"]
+    data = serializer.toJson("BenchOrder", order)
+    body = json.dumps(data).encode("utf-8")
+    head = (
+        f"POST /BenchService/place HTTP/1.1\r\n"
+        f"Host: localhost:0\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Project-Id: bench\r\n"
+        f"Sender-Id: bench\r\n\r\n"
+    )
+    connection = Connection(connectionId=1, socket=None, address=("localhost", 0), stime=0, wtime=0, projectId="bench")
+
+    def readRequest():
+        connection.readBuffer = head.encode() + body
+        return server.readRequest(connection)
+
+    operations = {
+        "toJson": lambda: serializer.toJson("BenchOrder", order),
+        "fromJson": lambda: serializer.fromJson("BenchOrder", data),
+        "serverCall": lambda: server.serverCall("/BenchService/place", data),
+        "getHeaderMap": lambda: getHeaderMap(head, ["Content-Length", "Project-Id", "Sender-Id", "Deadline"]),
+        "readRequest": readRequest,
+    }
+    results = {}
+    for name, function in operations.items():
+        results[f"{name}.nsPerOp"] = timeOperation(function, config["repeat"])
+        results[f"{name}.peakBytes"] = measureMemory(function)
+    return results
+
+
+def timeOperation(function, repeat):
+    # Rounds are sized to about 20 ms, the median round is reported
+    count = 1
+    while True:
+        startTime = time.perf_counter_ns()
+        for _ in range(count):
+            function()
+        if time.perf_counter_ns() - startTime >= 20_000_000:
+            break
+        count *= 2
+    times = []
+    for _ in range(repeat):
+        startTime = time.perf_counter_ns()
+        for _ in range(count):
+            function()
+        times.append((time.perf_counter_ns() - startTime) / count)
+    return statistics.median(times)
+
+
+def getPercentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0
+
+
+def writeResults(results, file):
+    with open(file, "wt") as stream:
+        json.dump(results, stream, indent=4)
+        stream.write("\n")
+
+
+def compareResults(results, baseline, tolerance):
+    # Numeric metrics regress when they exceed the baseline by the tolerance, rates when they fall
+    # below it, lists must stay equal
+    regressions = []
+    for name, value in results.items():
+        if name not in baseline:
+            continue
+        if isinstance(value, (int, float)) and name.endswith("PerSec"):
+            if value < baseline[name] * (1 - tolerance):
+                regressions.append(f"{name}: {value:.3f} < {baseline[name]:.3f}")
+        elif isinstance(value, (int, float)) and value > baseline[name] * (1 + tolerance):
+            regressions.append(f"{name}: {value:.3f} > {baseline[name]:.3f}")
+        elif isinstance(value, list) and value != baseline[name]:
+            regressions.append(f"{name}: {value} != {baseline[name]}")
+    return regressions
+
+
+def main(args):
+    suites = {
+        "startup": lambda: benchStartup(repeat),
+        "parser": lambda: benchParser(repeat),
+        "load": lambda: benchLoad({x: y for x, y in options.items() if x in LOAD_OPTIONS}),
+        "micro": lambda: benchMicro(repeat),
+    }
+    names = [x for x in args if not x.startswith("--") and not x[0].isdigit()]
+    options = {x.split("=")[0]: x.split("=")[1] for x in args if x.startswith("--") and "=" in x}
+    repeat = int(options.get("--repeat", "10"))
+    tolerance = float(options.get("--tolerance", "0.2"))
+    name = names[0] if names else "startup"
+    if name not in suites:
+        print(f"Usage: nativerpc bench {'|'.join(suites)} [--repeat=N] [--output=FILE] [--baseline=FILE]")
+        print(f"       nativerpc bench load {' '.join(f'[{x}={y}]' for x, y in LOAD_OPTIONS.items())}")
+        sys.exit(1)
+
+    results = suites[name]()
+    print(json.dumps(results, indent=4))
+    if "--output" in options:
+        writeResults(results, options["--output"])
+    if "--baseline" in options:
+        with open(options["--baseline"], "rt") as stream:
+            regressions = compareResults(results, json.load(stream), tolerance)
+        for item in regressions:
+            print(f"REGRESSION: {item}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
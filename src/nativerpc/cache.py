@@ -0,0 +1,162 @@
+##
+#   Native RPC Cache
+#
+#       CacheEntry
+#
+#       ResponseCache
+#           __init__
+#           get
+#           put
+#           evict
+#           clear
+#           getStats
+#
+#       FlightCall
+#
+#       SingleFlight
+#           __init__
+#           call
+#           getStats
+##
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheEntry:
+    body: bytes
+    expireTime: float
+
+    def __init__(self, **kwargs):
+        self.body = kwargs["body"]
+        self.expireTime = kwargs["expireTime"]
+
+
+class ResponseCache:
+    entries: OrderedDict[tuple, CacheEntry]
+    maxEntries: int
+    maxBytes: int
+    totalBytes: int
+    hits: int
+    misses: int
+    evictions: int
+    lock: threading.Lock
+
+    def __init__(self, maxEntries=1024, maxBytes=16 * 1024 * 1024):
+        self.entries = OrderedDict()
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.totalBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.expireTime < time.monotonic():
+                self.totalBytes -= len(entry.body)
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry.body
+
+    def put(self, key, body, ttl):
+        if len(body) > self.maxBytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.totalBytes -= len(self.entries.pop(key).body)
+            self.entries[key] = CacheEntry(
+                body=body,
+                expireTime=time.monotonic() + ttl,
+            )
+            self.totalBytes += len(body)
+            self.evict()
+
+    def evict(self):
+        while self.entries and (len(self.entries) > self.maxEntries or self.totalBytes > self.maxBytes):
+            _, entry = self.entries.popitem(last=False)
+            self.totalBytes -= len(entry.body)
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.totalBytes = 0
+
+    def getStats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.totalBytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class FlightCall:
+    event: threading.Event
+    result: any
+    error: Exception
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    calls: dict[tuple, FlightCall]
+    leaders: int
+    followers: int
+    lock: threading.Lock
+
+    def __init__(self):
+        self.calls = {}
+        self.leaders = 0
+        self.followers = 0
+        self.lock = threading.Lock()
+
+    def call(self, key, function):
+        with self.lock:
+            flight = self.calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = FlightCall()
+                self.calls[key] = flight
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        # Wait for the leading call
+        if not leader:
+            flight.event.wait()
+            if flight.error:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = function()
+        except Exception as ex:
+            flight.error = ex
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            flight.event.set()
+        return flight.result
+
+    def getStats(self):
+        with self.lock:
+            return {
+                "inflight": len(self.calls),
+                "leaders": self.leaders,
+                "followers": self.followers,
+            }
@@ -38,6 +38,21 @@ function main() {
         const manager = new Manager();
         manager.showProcesses(parts.includes('-f') || parts.includes('--follow'));
     }
+    else if (command === 'compile' || command == 'c') {
+        const manager = new Manager();
+        manager.compileProjects(parts.includes('--slots'));
+    }
+    else if (command === 'bench') {
+        const { status } = spawnSync(
+            'python',
+            ['-m', 'nativerpc', ...parts],
+            {
+                stdio: 'inherit',
+                env: { ...process.env, PYTHONPATH: path.dirname(__dirname) }
+            }
+        );
+        process.exit(status);
+    }
     else if (command === 'parse') {
         const { stdout, stderr } = spawnSync(
             'python',
@@ -56,7 +71,7 @@ function main() {
         }
     }
     else {
-        console.log('Usage: nativerpc init|files|types|ps')
+        console.log('Usage: nativerpc init|files|types|ps|compile|bench')
     }
 }
 
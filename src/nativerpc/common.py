@@ -2,33 +2,63 @@
 #   Native RPC Common
 #
 #       CONFIG_NAME
+#       COMPILED_NAME
 #       COMMON_TYPES
+#       FRAME_HEADER
+#       FRAME_SHARED
+#       SHARED_PREFIX
 #
 #       SchemaInfo
 #       FieldInfo
 #       MethodInfo
 #       Options
 #       Connection
+#       Endpoint
 #       Service
+#       LatencyTracker
+#
+#       WorkspaceContext
+#           __init__
+#           resolve
+#           refresh
+#           getShellId
 #
 #       verifyPython
+#       getPythonVersion
+#       getHostAddress
 #       getProjectName
 #       getProjectPath
 #       getEntryPoint
 #       getMessageFiles
+#       getModuleName
 #       parseSchemaList
+#       parseSchemaFiles
+#       mergeSchemaLists
+#       readSchemaCache
+#       writeSchemaCache
+#       getSchemaCacheFile
 #       getShellId
+#       getIdentity
+#       getWorkspace
 ##
 import __main__
+import collections
+import glob
+import hashlib
+import json
 import os
-import psutil
+import shutil
+import struct
 import subprocess
 import sys
-from typing import TypedDict, Final
+import threading
+import time
+from typing import TypedDict, Final, NotRequired
 
-from . import parser
 
 CONFIG_NAME = "workspace.json"
+CACHE_FOLDER = os.path.join(".nativerpc", "cache")
+COMPILED_NAME: Final = "schema_compiled"
 
 COMMON_TYPES = {
     "int": int,
@@ -41,6 +71,40 @@ COMMON_TYPES = {
 
 SERVICE: Final = "service"
 HOST: Final = "host"
+PROTOCOL: Final = "protocol"
+CACHE: Final = "cache"
+COALESCE: Final = "coalesce"
+TIMEOUT: Final = "timeout"
+BALANCE: Final = "balance"
+HEDGE: Final = "hedge"
+LAZY: Final = "lazy"
+SHARED_MEMORY: Final = "sharedMemory"
+SERVER: Final = "server"
+LOOPBACK: Final = "loopback"
+WATCH: Final = "watch"
+
+PROTOCOL_HTTP: Final = "http"
+PROTOCOL_FRAMED: Final = "framed"
+PROTOCOL_LOOPBACK: Final = "loopback"
+
+LOOPBACK_JSON: Final = "json"
+LOOPBACK_DIRECT: Final = "direct"
+
+BALANCE_OUTSTANDING: Final = "outstanding"
+BALANCE_LATENCY: Final = "latency"
+
+# Framed protocol message header: request id, method id or response status, payload length,
+# caller deadline as unix time or zero, frame flags
+FRAME_HEADER: Final = struct.Struct("!IiIdB")
+
+# Frame flag, the payload is a descriptor of a shared memory segment
+FRAME_SHARED: Final = 1
+
+# Shared memory segments of the framed transport, other names are never opened or unlinked
+SHARED_PREFIX: Final = "nativerpc_"
+
+_workspace = None
+_workspaceLock = threading.Lock()
 
 
 class SchemaInfo:
@@ -97,7 +161,18 @@ class MethodInfo:
 
 class Options(TypedDict):
     service: type
-    host: tuple[str, int]
+    host: NotRequired[tuple[str, int] | str | list[tuple[str, int] | str]]
+    protocol: NotRequired[str]
+    cache: NotRequired[dict[str, float]]
+    coalesce: NotRequired[list[str]]
+    timeout: NotRequired[float]
+    balance: NotRequired[str]
+    hedge: NotRequired[list[str]]
+    sharedMemory: NotRequired[int]
+    server: NotRequired[any]
+    loopback: NotRequired[str]
+    lazy: NotRequired[bool]
+    watch: NotRequired[float]
 
 
 class Connection:
@@ -116,6 +191,9 @@ class Connection:
     shellId: str
     projectId: str
     entryPoint: str
+    protocol: str
+    sharedMemory: int
+    sendLock: threading.Lock
 
     def __init__(self, **kwargs):
         self.connectionId = kwargs["connectionId"]
@@ -133,6 +211,36 @@ class Connection:
         self.parentId = kwargs.get("parentId", "")
         self.shellId = kwargs.get("shellId", "")
         self.entryPoint = kwargs.get("entryPoint", "")
+        self.protocol = kwargs.get("protocol", PROTOCOL_HTTP)
+        self.sharedMemory = kwargs.get("sharedMemory", 0)
+        self.sendLock = threading.Lock()
+
+
+class Endpoint:
+    host: str
+    port: int
+    unixPath: str
+    mainSocket: any
+    framedSocket: any
+    methodIds: dict[str, int]
+    connectionId: int
+    outstanding: int
+    callCount: int
+    latency: float
+    failed: bool
+
+    def __init__(self, **kwargs):
+        self.host = kwargs["host"]
+        self.port = kwargs["port"]
+        self.unixPath = kwargs.get("unixPath", "")
+        self.mainSocket = kwargs.get("mainSocket")
+        self.framedSocket = kwargs.get("framedSocket")
+        self.methodIds = kwargs.get("methodIds", {})
+        self.connectionId = kwargs.get("connectionId", 0)
+        self.outstanding = kwargs.get("outstanding", 0)
+        self.callCount = kwargs.get("callCount", 0)
+        self.latency = kwargs.get("latency", 0.0)
+        self.failed = kwargs.get("failed", False)
 
 
 class Service:
@@ -145,61 +253,337 @@ class Service:
         self.client.close()
 
 
+class LatencyTracker:
+    samples: collections.deque
+    sampleCount: int
+    minSamples: int
+    quantiles: dict[float, float]
+    lock: threading.Lock
+
+    def __init__(self, maxSamples=256, minSamples=20):
+        self.samples = collections.deque(maxlen=maxSamples)
+        self.sampleCount = 0
+        self.minSamples = minSamples
+        self.quantiles = {}
+        self.lock = threading.Lock()
+
+    def addSample(self, elapsed):
+        with self.lock:
+            self.samples.append(elapsed)
+            self.sampleCount += 1
+            # Quantiles are recomputed every 16 samples
+            if self.sampleCount % 16 == 0:
+                self.quantiles = {}
+
+    def getQuantile(self, quantile):
+        with self.lock:
+            if len(self.samples) < self.minSamples:
+                return None
+            if quantile not in self.quantiles:
+                ordered = sorted(self.samples)
+                self.quantiles[quantile] = ordered[min(int(len(ordered) * quantile), len(ordered) - 1)]
+            return self.quantiles[quantile]
+
+
+class WorkspaceContext:
+    processId: int
+    entryPoint: str
+    projectPath: str
+    projectName: str
+    workspaceFile: str
+    workspaceTime: float
+    settings: dict
+    checkTime: float
+    shellId: str
+
+    def __init__(self):
+        self.processId = os.getpid()
+        self.shellId = None
+        self.resolve()
+
+    def resolve(self):
+        self.entryPoint = getattr(__main__, '__file__', "")
+        self.projectPath = "unknown"
+        self.workspaceFile = ""
+        self.workspaceTime = 0
+        self.settings = {}
+        self.checkTime = time.monotonic()
+        if not self.entryPoint:
+            self.projectName = "unknown"
+            return
+
+        # Project root
+        folder = os.path.dirname(self.entryPoint)
+        while True:
+            if os.path.exists(os.path.join(folder, 'package.json')) or \
+                    os.path.exists(os.path.join(folder, 'pyproject.toml')) or \
+                    os.path.exists(os.path.join(folder, 'tsconfig.json')) or \
+                    os.path.exists(os.path.join(folder, '.git')):
+                break
+            if os.path.exists(os.path.join(os.path.dirname(folder), 'workspace.json')):
+                break
+            folder = os.path.join(folder, '..')
+            folder = os.path.abspath(folder)
+        self.projectPath = folder
+        self.projectName = os.path.basename(folder)
+
+        # Workspace settings
+        folder = os.path.abspath(os.path.dirname(self.entryPoint))
+        while not os.path.exists(os.path.join(folder, CONFIG_NAME)):
+            if os.path.dirname(folder) == folder:
+                return
+            folder = os.path.dirname(folder)
+        self.workspaceFile = os.path.join(folder, CONFIG_NAME)
+        self.workspaceTime = os.stat(self.workspaceFile).st_mtime
+        with open(self.workspaceFile, "rt") as file:
+            self.settings = json.load(file)
+
+    def refresh(self):
+        # Checked at most once a second, changes resolve into a new context so readers never see partial state
+        if time.monotonic() - self.checkTime < 1:
+            return self
+        self.checkTime = time.monotonic()
+        try:
+            workspaceTime = os.stat(self.workspaceFile).st_mtime if self.workspaceFile else 0
+        except OSError:
+            workspaceTime = -1
+        if workspaceTime != self.workspaceTime:
+            # The parent process chain lives as long as the process, the new context keeps it
+            context = WorkspaceContext()
+            context.shellId = self.shellId
+            return context
+        return self
+
+    def getShellId(self):
+        if self.shellId is None:
+            import psutil
+            self.shellId = ":".join([f"{x.pid}" for x in psutil.Process(os.getppid()).parent().parents()])
+        return self.shellId
+
+
 def verifyPython():
-    res = subprocess.check_output(["python", "--version"]).decode()
-    res = res.replace("Python ", "").strip()
+    workspace = getWorkspace()
+    if workspace.settings.get("verifyPython", True) is False:
+        return
+    res = getPythonVersion(workspace)
     if f"{sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}" != res:
         raise RuntimeError(f"Mismatching python version: {sys.version_info}, {res}")
 
 
+def getPythonVersion(workspace):
+    # Cached per interpreter binary, spawning python costs tens of milliseconds
+    command = shutil.which("python")
+    key = None
+    cacheFile = ""
+    if command and workspace.workspaceFile:
+        key = [os.path.realpath(command), os.stat(command).st_mtime_ns]
+        cacheFile = os.path.join(os.path.dirname(workspace.workspaceFile), CACHE_FOLDER, "python.json")
+        try:
+            with open(cacheFile, "rt") as stream:
+                cached = json.load(stream)
+            if cached["key"] == key:
+                return cached["version"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    res = subprocess.check_output(["python", "--version"]).decode()
+    res = res.replace("Python ", "").strip()
+    if cacheFile:
+        try:
+            os.makedirs(os.path.dirname(cacheFile), exist_ok=True)
+            tempFile = f"{cacheFile}.{os.getpid()}"
+            with open(tempFile, "wt") as stream:
+                json.dump({"key": key, "version": res}, stream)
+            os.replace(tempFile, cacheFile)
+        except OSError:
+            pass
+    return res
+
+
+def getHostAddress(value):
+    # Unix socket paths are given as plain strings
+    if isinstance(value, str):
+        return "localhost", 0, value
+    return value[0], value[1], ""
+
+
 def getProjectName():
-    if not hasattr(__main__, '__file__'):
-        return "unknown"
-    folder = os.path.dirname(__main__.__file__)
-    while True:
-        if os.path.exists(os.path.join(folder, 'package.json')) or \
-                os.path.exists(os.path.join(folder, 'pyproject.toml')) or \
-                os.path.exists(os.path.join(folder, 'tsconfig.json')) or \
-                os.path.exists(os.path.join(folder, '.git')):
-            break
-        if os.path.exists(os.path.join(os.path.dirname(folder), 'workspace.json')):
-            break
-        folder = os.path.join(folder, '..')
-        folder = os.path.abspath(folder)
-    return os.path.basename(folder)
+    return getWorkspace().projectName
 
 
 def getProjectPath():
-    if not hasattr(__main__, '__file__'):
-        return "unknown"
-    folder = os.path.dirname(__main__.__file__)
-    while True:
-        if os.path.exists(os.path.join(folder, 'package.json')) or \
-                os.path.exists(os.path.join(folder, 'pyproject.toml')) or \
-                os.path.exists(os.path.join(folder, 'tsconfig.json')) or \
-                os.path.exists(os.path.join(folder, '.git')):
-            break
-        if os.path.exists(os.path.join(os.path.dirname(folder), 'workspace.json')):
-            break
-        folder = os.path.join(folder, '..')
-        folder = os.path.abspath(folder)
-    return folder
+    return getWorkspace().projectPath
 
 
 def getEntryPoint():
-    return __main__.__file__
+    return getWorkspace().entryPoint
 
 
 def getMessageFiles(projectPath):
-    schemaName = "common"
-    result = [os.path.join(projectPath, "src", schemaName + ".py")]
-    assert os.path.exists(result[0])
+    # Schema modules are listed by name or by glob pattern relative to the source folder, in the
+    # settings of the project's workspace, tools like nativerpc compile run outside of it
+    workspace = getWorkspace()
+    settings = workspace.settings
+    workspaceFile = os.path.join(os.path.dirname(os.path.abspath(projectPath)), CONFIG_NAME)
+    if workspace.workspaceFile != workspaceFile and os.path.exists(workspaceFile):
+        with open(workspaceFile, "rt") as file:
+            settings = json.load(file)
+    sourcePath = os.path.join(projectPath, "src")
+    result = []
+    for name in settings.get("schemaNames", ["common"]):
+        file = os.path.join(sourcePath, name + ".py")
+        if os.path.exists(file) and file not in result:
+            result.append(file)
+    for pattern in settings.get("schemaPatterns", []):
+        for file in sorted(glob.glob(os.path.join(sourcePath, pattern), recursive=True)):
+            if file.endswith(".py") and os.path.basename(file) != f"{COMPILED_NAME}.py" and file not in result:
+                result.append(file)
+    assert result, f"Missing schema files: {sourcePath}"
     return result
 
 
+def getModuleName(projectPath, file):
+    return os.path.splitext(os.path.relpath(file, os.path.join(projectPath, "src")))[0].replace(os.sep, ".")
+
+
 def parseSchemaList(file):
-    return parser.parseSchemaList(file)
+    return parseSchemaFiles([file])[0]
+
+
+def parseSchemaFiles(files, workers=None):
+    entries = [readSchemaCache(os.path.abspath(x)) for x in files]
+    missing = [x["file"] for x in entries if x["schemaList"] is None]
+
+    # Uncached files are parsed by a process pool only when workers are asked for, as the compiler command
+    # does, and they outweigh pool startup, spawned workers never inherit the threads of a running service
+    parsed = {}
+    if workers is None:
+        workers = getWorkspace().settings.get("schemaWorkers", 1)
+    workers = min(len(missing), workers)
+    if missing:
+        from . import parser
+        if workers > 1 and sum(os.path.getsize(x) for x in missing) >= 256 * 1024:
+            import concurrent.futures
+            import multiprocessing
+            with concurrent.futures.ProcessPoolExecutor(workers, multiprocessing.get_context("spawn")) as pool:
+                parsed = dict(zip(missing, pool.map(parser.parseSchemaList, missing)))
+        else:
+            parsed = {x: parser.parseSchemaList(x) for x in missing}
+
+    for entry in entries:
+        if entry["schemaList"] is None:
+            entry["schemaList"] = parsed[entry["file"]]
+        if entry["changed"]:
+            writeSchemaCache(entry)
+    return [x["schemaList"] for x in entries]
+
+
+def mergeSchemaLists(files, schemaLists):
+    # Declarations repeated across files are kept once, conflicting ones keep the first declaration
+    result = []
+    declared = {}
+    for file, schemaList in zip(files, schemaLists):
+        for item in schemaList:
+            name = (item["className"], item.get("fieldName"), item.get("methodName"))
+            if name not in declared:
+                declared[name] = (file, item)
+                result.append(item)
+            elif declared[name][1] != item:
+                print(f"WARNING: Conflicting schema: {item['className']}.{name[1] or name[2]}, "
+                      f"{declared[name][0]}, {file}")
+    return result
+
+
+def readSchemaCache(file):
+    entry = {
+        "file": file,
+        "cacheFile": getSchemaCacheFile(file),
+        "schemaList": None,
+        "changed": False,
+    }
+    if not entry["cacheFile"]:
+        return entry
+
+    # Cache entries are valid for the same path and parser, checked by stat first and content hash second
+    fileStat = os.stat(file)
+    parserStat = os.stat(os.path.join(os.path.dirname(__file__), "parser.py"))
+    entry["key"] = {
+        "path": file,
+        "parser": [parserStat.st_mtime_ns, parserStat.st_size],
+    }
+    cached = None
+    try:
+        with open(entry["cacheFile"], "rt") as stream:
+            cached = json.load(stream)
+        if any(cached.get(name) != value for name, value in entry["key"].items()):
+            cached = None
+    except (OSError, ValueError):
+        pass
+    if cached and cached["mtime"] == fileStat.st_mtime_ns and cached["size"] == fileStat.st_size:
+        entry["schemaList"] = cached["schemaList"]
+        return entry
+    with open(file, "rb") as stream:
+        contentHash = hashlib.sha256(stream.read()).hexdigest()
+    if cached and cached["hash"] == contentHash:
+        entry["schemaList"] = cached["schemaList"]
+    entry.update(mtime=fileStat.st_mtime_ns, size=fileStat.st_size, hash=contentHash, changed=True)
+    return entry
+
+
+def writeSchemaCache(entry):
+    # Replaced atomically, concurrent startups may write the same entry
+    try:
+        os.makedirs(os.path.dirname(entry["cacheFile"]), exist_ok=True)
+        tempFile = f"{entry['cacheFile']}.{os.getpid()}"
+        with open(tempFile, "wt") as stream:
+            json.dump(dict(entry["key"], mtime=entry["mtime"], size=entry["size"],
+                           hash=entry["hash"], schemaList=entry["schemaList"]), stream)
+        os.replace(tempFile, entry["cacheFile"])
+    except OSError:
+        pass
+
+
+def getSchemaCacheFile(file):
+    folder = os.path.dirname(file)
+    while not os.path.exists(os.path.join(folder, CONFIG_NAME)):
+        if os.path.dirname(folder) == folder:
+            return ""
+        folder = os.path.dirname(folder)
+    name = hashlib.sha1(file.encode("utf-8")).hexdigest()[0: 16]
+    return os.path.join(folder, CACHE_FOLDER, f"{name}.json")
 
 
 def getShellId():
-    return ":".join([f"{x.pid}" for x in psutil.Process(os.getppid()).parent().parents()])
+    return getWorkspace().getShellId()
+
+
+def getIdentity():
+    workspace = getWorkspace()
+    return {
+        "projectId": workspace.projectName,
+        "clientId": workspace.processId,
+        "parentId": os.getppid(),
+        "shellId": workspace.getShellId(),
+        "entryPoint": workspace.entryPoint,
+    }
+
+
+def getWorkspace():
+    global _workspace
+
+    # Resolved once per process, forked children resolve their own
+    workspace = _workspace
+    if workspace is None or workspace.processId != os.getpid():
+        with _workspaceLock:
+            if _workspace is None or _workspace.processId != os.getpid():
+                _workspace = WorkspaceContext()
+            return _workspace
+
+    # Refreshed contexts are swapped in whole
+    refreshed = workspace.refresh()
+    if refreshed is not workspace:
+        with _workspaceLock:
+            if _workspace is workspace:
+                _workspace = refreshed
+            return _workspace
+    return workspace
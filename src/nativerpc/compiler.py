@@ -0,0 +1,184 @@
+##
+#   Native RPC Compiler
+#
+#       compileSchema
+#       loadCompiled
+#       generateModule
+#       getSourceHashes
+#       main
+##
+import hashlib
+import importlib
+import os
+import sys
+
+from .common import COMMON_TYPES, COMPILED_NAME, getMessageFiles, getModuleName, parseSchemaFiles, mergeSchemaLists
+
+
+def compileSchema(projectPath, slots=False, workers=1):
+    files = getMessageFiles(projectPath)
+    schemaLists = parseSchemaFiles(files, workers)
+    for file, items in zip(files, schemaLists):
+        assert len(items) > 0, f"Empty schema file: {file}"
+
+    # Schema modules are imported for field defaults of slotted classes
+    modules = []
+    if slots:
+        sys.path.insert(0, os.path.join(projectPath, "src"))
+        modules = [importlib.import_module(getModuleName(projectPath, x)) for x in files]
+
+    outputFile = os.path.join(projectPath, "src", f"{COMPILED_NAME}.py")
+    with open(outputFile, "wt") as stream:
+        stream.write(generateModule(projectPath, files, schemaLists, modules))
+    return outputFile
+
+
+def loadCompiled(projectPath):
+    files = getMessageFiles(projectPath)
+    if not os.path.exists(os.path.join(projectPath, "src", f"{COMPILED_NAME}.py")):
+        return None
+    module = importlib.import_module(COMPILED_NAME)
+
+    # Stale modules are ignored, schema files are parsed instead
+    if module.SOURCE_HASHES != getSourceHashes(projectPath, files):
+        print(f"WARNING: Ignoring stale compiled schema: {module.__file__}")
+        return None
+    return module
+
+
+def generateModule(projectPath, files, schemaLists, modules):
+    schemaList = mergeSchemaLists(files, schemaLists)
+    classNames = []
+    for item in schemaList:
+        if item["className"] not in classNames:
+            classNames.append(item["className"])
+    fieldList = {
+        name: [x for x in schemaList if x["className"] == name and x.get("fieldName")]
+        for name in classNames
+    }
+    messageNames = [x for x in classNames if fieldList[x]]
+    lines = [
+        "# Generated by nativerpc compile, do not edit",
+        "",
+    ]
+
+    # Schema classes, imported from the first file declaring them
+    imported = set()
+    for file, items in zip(files, schemaLists):
+        names = [x for x in classNames if x in [y["className"] for y in items] and (not modules or not fieldList[x])]
+        names = [x for x in names if x not in imported]
+        imported.update(names)
+        if names:
+            lines.append(f"from {getModuleName(projectPath, file)} import {', '.join(names)}")
+    lines.extend([
+        "",
+        f"SOURCE_HASHES = {getSourceHashes(projectPath, files)!r}",
+        "",
+        "SCHEMA_LIST = [",
+        *[f"    {item!r}," for item in schemaList],
+        "]",
+        "",
+    ])
+
+    # Slotted message classes replace the schema classes
+    for name in messageNames if modules else []:
+        classType = None
+        for module in modules:
+            classType = classType or getattr(module, name, None)
+        inst = classType()
+        fields = [x["fieldName"] for x in fieldList[name]]
+        lines.extend([
+            "",
+            f"class {name}:",
+            f"    __slots__ = {tuple(fields)!r}",
+            "",
+            f"    def __init__(self, {', '.join(f'{x}=None' for x in fields)}):",
+        ])
+
+        # Defaults are copied from the schema class, mutable ones are created per instance
+        for field in fieldList[name]:
+            value = getattr(inst, field["fieldName"], None)
+            if field["fieldType"] not in COMMON_TYPES and value is not None:
+                default = f"{field['fieldType']}()"
+            elif isinstance(value, (dict, list)):
+                default = f"{type(value).__name__}({value!r})"
+            else:
+                default = repr(value)
+            lines.append(
+                f"        self.{field['fieldName']} = {field['fieldName']}" if default == "None" else
+                f"        self.{field['fieldName']} = {field['fieldName']} if {field['fieldName']} is not None else {default}"
+            )
+        lines.append("")
+
+    # Encoders and decoders
+    for name in messageNames:
+        lines.extend([
+            "",
+            f"def encode_{name}(obj):",
+            "    return {",
+        ])
+        for field in fieldList[name]:
+            value = f"obj.{field['fieldName']}"
+            if field["fieldType"] == "dict":
+                value = f"dict({value})"
+            elif field["fieldType"] not in COMMON_TYPES:
+                value = f"encode_{field['fieldType']}({value})"
+            lines.append(f"        {field['fieldName']!r}: {value},")
+        lines.extend([
+            "    }",
+            "",
+            "",
+            f"def decode_{name}(data):",
+            f"    result = {name}()",
+        ])
+        for field in fieldList[name]:
+            value = f"data[{field['fieldName']!r}]"
+            if field["fieldType"] == "dict":
+                value = f"dict({value})"
+            elif field["fieldType"] not in COMMON_TYPES:
+                value = f"decode_{field['fieldType']}({value})"
+            lines.extend([
+                f"    if {field['fieldName']!r} in data:",
+                f"        result.{field['fieldName']} = {value}",
+            ])
+        lines.extend([
+            "    return result",
+            "",
+        ])
+
+    # Lookup tables
+    lines.extend([
+        "",
+        "TYPES = {",
+        *[f"    {x!r}: {x}," for x in classNames],
+        "}",
+        "",
+        "ENCODERS = {",
+        *[f"    {x!r}: encode_{x}," for x in messageNames],
+        "}",
+        "",
+        "DECODERS = {",
+        *[f"    {x!r}: decode_{x}," for x in messageNames],
+        "}",
+        "",
+    ])
+    return "\n".join(lines)
+
+
+def getSourceHashes(projectPath, files):
+    result = {}
+    for file in files:
+        with open(file, "rb") as stream:
+            result[getModuleName(projectPath, file)] = hashlib.sha256(stream.read()).hexdigest()
+    return result
+
+
+def main(args):
+    paths = [x for x in args if not x.startswith("--")]
+    projectPath = os.path.abspath(paths[0] if paths else os.getcwd())
+    outputFile = compileSchema(projectPath, "--slots" in args, os.cpu_count() or 1)
+    print(f"Compiled schema: {outputFile}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
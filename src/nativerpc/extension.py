@@ -2,6 +2,7 @@
 #   Native RPC Python Language Extensions
 #
 #       parseInt
+#       parseFloat
 #       getHeaderMap
 ##
 
@@ -13,6 +14,14 @@ def parseInt(value):
     return 0
 
 
+def parseFloat(value):
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    return 0.0
+
+
 def getHeaderMap(headers, names):
     result = {}
     headers = headers.lower()
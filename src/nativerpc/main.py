@@ -3,7 +3,9 @@
 #
 #       Serializer
 #           __init__
+#           loadSchema
 #           findType
+#           findClasses
 #           getFields
 #           getMethods
 #           getSize
@@ -17,82 +19,155 @@
 #           __init__
 #           listen
 #           startServer
+#           close
+#           readRequest
+#           registerMethods
+#           getSchemaStats
+#           watchSchema
+#           reloadSchema
 #           serverCall
+#           dispatchCall
+#           invokeMethod
+#           shedCall
+#           readFrame
+#           frameCall
+#           sendFrame
 #           connectClient
 #           getMetadata
 #           closeClient
+#           currentConnection
+#           openLoopback
+#           loopbackCall
+#           closeLoopback
 #
 #       Client
 #           __init__
 #           connect
 #           initSocket
+#           connectSockets
+#           connectEndpoint
 #           setupInstance
 #           clientCall
+#           sendCall
+#           attemptCall
+#           recordLatency
+#           hedgedCall
+#           endpointCall
+#           framedCall
+#           pickEndpoint
+#           ejectEndpoint
+#           probeEndpoints
 #           close
+#           closeEndpoint
+#
+#       importRequests
 ##
-import __main__
 import json
 import os
 import importlib
+import importlib.util
+import queue
 import socket
-import requests
 import select
+import stat
+import sys
+import threading
 import time
 import traceback
-import requests.adapters
+from concurrent.futures import ThreadPoolExecutor
 
 from .common import (
-    CONFIG_NAME, COMMON_TYPES,
-    SchemaInfo, FieldInfo, MethodInfo, SERVICE, HOST, Options, Connection, Service,
-    verifyPython,
-    getProjectName, getProjectPath, getMessageFiles, parseSchemaList, getShellId,
+    CONFIG_NAME, COMMON_TYPES, FRAME_HEADER, FRAME_SHARED,
+    SchemaInfo, FieldInfo, MethodInfo, SERVICE, HOST, PROTOCOL, CACHE, COALESCE, TIMEOUT, BALANCE, HEDGE,
+    SHARED_MEMORY, SERVER, LOOPBACK, LAZY, WATCH,
+    PROTOCOL_HTTP, PROTOCOL_FRAMED, PROTOCOL_LOOPBACK, BALANCE_OUTSTANDING, BALANCE_LATENCY,
+    LOOPBACK_JSON, LOOPBACK_DIRECT,
+    Options, Connection, Endpoint, Service, LatencyTracker,
+    verifyPython, getHostAddress,
+    getProjectName, getProjectPath, getMessageFiles, getModuleName, parseSchemaFiles, mergeSchemaLists, getIdentity, getWorkspace, getEntryPoint,
 )
 from .extension import (
-    getHeaderMap
+    getHeaderMap, parseFloat
 )
+from .cache import ResponseCache, SingleFlight
+from .compiler import loadCompiled
+from .transport import FramedSocket, writeShared, readShared, discardShared
+
+requests = None
 
 
 class Serializer:
     modules: list
     schemaList: list[SchemaInfo]
     fieldList: dict[str, list[FieldInfo]]
+    compiled: any
+    reloaded: bool
     verbose: bool
+    sharedSchemas = {}
+    sharedLock = threading.Lock()
 
-    def __init__(self):
+    def __init__(self, reload=False):
         self.modules = []
         self.schemaList = []
         self.fieldList = {}
+        self.compiled = None
+        self.reloaded = reload
         self.verbose = False
 
+        # Schema state is loaded once per process and project, instances get their own schema list
+        projectPath = getProjectPath()
+        with Serializer.sharedLock:
+            if projectPath not in Serializer.sharedSchemas or reload:
+                self.loadSchema(projectPath, reload)
+                Serializer.sharedSchemas[projectPath] = (
+                    self.modules, self.schemaList, self.fieldList, self.compiled, self.reloaded)
+            modules, schemaList, fieldList, self.compiled, self.reloaded = Serializer.sharedSchemas[projectPath]
+        self.modules = list(modules)
+        self.schemaList = [SchemaInfo(**x.__dict__) for x in schemaList]
+        self.fieldList = dict(fieldList)
+
+    def loadSchema(self, projectPath, reload=False):
         # Read settings
-        package_dir = os.path.join(os.path.dirname(__main__.__file__), '..')
-        while os.path.basename(package_dir) and not os.path.exists(os.path.join(package_dir, CONFIG_NAME)):
-            package_dir = os.path.dirname(package_dir)
-        assert package_dir
-        settings = None
-        with open(os.path.join(package_dir, CONFIG_NAME), "rt") as file:
-            settings = json.load(file)
+        workspace = getWorkspace()
+        assert workspace.workspaceFile, f"Missing {CONFIG_NAME}"
+        settings = workspace.settings
+
+        # Compiled schema modules replace parsing and reflection
+        self.compiled = loadCompiled(projectPath)
+        if self.compiled:
+            self.modules.append(self.compiled)
+
+        # Reloads resolve types from fresh module copies first, running modules stay for services derived from them
+        files = getMessageFiles(projectPath) if not self.compiled else []
+        if reload:
+            for item in files:
+                spec = importlib.util.spec_from_file_location(getModuleName(projectPath, item), item)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                self.modules.append(module)
 
         # Read module list
-        for item in getMessageFiles(getProjectPath()):
-            schemaName = os.path.basename(item).replace(".py", "")
-            self.modules.append(importlib.import_module(schemaName, item))
-
-        # Read class metadata
-        for file in getMessageFiles(getProjectPath()):
-            schemaList = parseSchemaList(file)
-            for item in schemaList:
-                self.schemaList.append(SchemaInfo(
-                    projectName="",
-                    className=item["className"],
-                    fieldName=item.get("fieldName"),
-                    fieldType=item.get("fieldType"),
-                    methodName=item.get("methodName"),
-                    methodRequest=item.get("methodRequest"),
-                    methodResponse=item.get("methodResponse"),
-                    idNumber=item["idNumber"],
-                ))
-            assert len(schemaList) > 0
+        for item in files:
+            self.modules.append(importlib.import_module(getModuleName(projectPath, item)))
+
+        # Read class metadata, declarations repeated across schema files are merged, reloads parse
+        # in-process as a process pool is unsafe next to the server's threads
+        schemaLists = parseSchemaFiles(files, 1 if reload else None)
+        for file, schemaList in zip(files, schemaLists):
+            assert len(schemaList) > 0, f"Empty schema file: {file}"
+        schemaList = self.compiled.SCHEMA_LIST if self.compiled else mergeSchemaLists(files, schemaLists)
+        for item in schemaList:
+            self.schemaList.append(SchemaInfo(
+                projectName="",
+                className=item["className"],
+                fieldName=item.get("fieldName"),
+                fieldType=item.get("fieldType"),
+                methodName=item.get("methodName"),
+                methodRequest=item.get("methodRequest"),
+                methodResponse=item.get("methodResponse"),
+                idNumber=item["idNumber"],
+            ))
+        assert len(schemaList) > 0
 
         # Register types
         for item in self.schemaList:
@@ -108,6 +183,8 @@ class Serializer:
     def findType(self, name, requireFound):
         if name in COMMON_TYPES:
             return COMMON_TYPES[name]
+        if self.compiled and name in self.compiled.TYPES:
+            return self.compiled.TYPES[name]
 
         for item in self.modules:
             for value in item.__dict__.values():
@@ -117,18 +194,25 @@ class Serializer:
             assert False, f"Failed to find type: {name}"
         return None
 
+    def findClasses(self, name):
+        # Every class of this name in the loaded modules, compiled schemas add the source modules they replace
+        modules = list(self.modules)
+        if self.compiled:
+            modules += [sys.modules[x] for x in self.compiled.SOURCE_HASHES if x in sys.modules]
+        return {getattr(x, name) for x in modules if isinstance(getattr(x, name, None), type)}
+
     def getFields(self, name):
         if name in COMMON_TYPES:
             return []
         assert [x for x in self.schemaList if x.className == name and x.fieldName]
         classType = self.findType(name, True)
-        inst = classType()
+        inst = classType() if not self.compiled else None
         result = []
         assert classType.__name__ == name
         for fieldInfo in self.schemaList:
             if fieldInfo.className != name or not fieldInfo.fieldName:
                 continue
-            assert hasattr(inst, fieldInfo.fieldName)
+            assert self.compiled or hasattr(inst, fieldInfo.fieldName)
             result.append(FieldInfo(
                 className=name,
                 classType=classType,
@@ -141,8 +225,12 @@ class Serializer:
         return result
 
     def getMethods(self, classType, classInstance, className):
-        assert classType == Server or issubclass(classType, self.findType(
-            classType.__bases__[0].__name__, True)), f"Unknown subclass: {classType.__bases__[0].__name__}, {classType}"
+        # Services derive from the running schema class, which a reload's fresh module copy shadows
+        if classType != Server:
+            baseName = classType.__bases__[0].__name__
+            baseTypes = [self.findType(baseName, True), *[getattr(x, baseName, None) for x in self.modules]]
+            assert any(isinstance(x, type) and issubclass(classType, x) for x in baseTypes), \
+                f"Unknown subclass: {baseName}, {classType}"
         result = []
         assert [x for x in self.schemaList if x.className == className and x.methodName]
         for methodInfo in self.schemaList:
@@ -188,6 +276,8 @@ class Serializer:
             typeName = obj.__class__.__name__
 
         assert typeName in self.fieldList, f"Unknown type name: {typeName}"
+        if self.compiled and typeName in self.compiled.ENCODERS:
+            return self.compiled.ENCODERS[typeName](obj)
         result = None
         if typeName == 'dict':
             result = {}
@@ -213,6 +303,8 @@ class Serializer:
         if not isinstance(typeName, str):
             typeName = typeName.__name__
         assert typeName in self.fieldList
+        if self.compiled and typeName in self.compiled.DECODERS:
+            return self.compiled.DECODERS[typeName](data)
         result = None
         if typeName == 'dict':
             assert isinstance(data, dict)
@@ -254,77 +346,83 @@ class Server:
     classInstance: any
     host: str
     port: int
+    unixPath: str
+    unixFile: os.stat_result
     serializer: Serializer
     methodList: dict[str, MethodInfo]
+    methodIndex: dict[int, MethodInfo]
+    methodIds: dict[str, int]
+    watchInterval: float
+    watchTime: float
+    schemaStats: dict[str, tuple]
     mainSocket: any
     clientSockets: list
     activeConnections: list[Connection]
     closedConnections: list[Connection]
-    currentConnection: Connection
+    loopbackConnections: list[Connection]
+    loopbackLock: threading.Lock
+    callContext: threading.local
     newConnectionId: int
+    executor: ThreadPoolExecutor
+    statsLock: threading.Lock
+    shedCount: int
+    closed: bool
     verbose: bool
 
     def __init__(self, options: Options):
         self.className = options[SERVICE].__bases__[0].__name__
         self.classType = options[SERVICE]
         self.classInstance = options[SERVICE]()
-        self.host = options[HOST][0]
-        self.port = options[HOST][1]
+        self.host, self.port, self.unixPath = getHostAddress(options[HOST])
+        self.unixFile = None
         self.serializer = Serializer()
         self.methodList = {}
+        self.methodIndex = {}
+        self.methodIds = {}
+        self.watchInterval = float(options.get(WATCH, 0))
+        self.watchTime = time.time()
+        self.schemaStats = {}
         self.mainSocket = None
         self.clientSockets = []
         self.activeConnections = []
         self.closedConnections = []
+        self.loopbackConnections = []
+        self.loopbackLock = threading.Lock()
+        self.callContext = threading.local()
         self.currentConnection = None
         self.newConnectionId = 0
+        self.executor = None
+        self.statsLock = threading.Lock()
+        self.shedCount = 0
+        self.closed = False
         self.verbose = False
         verifyPython()
 
-        # Add custom metadata
-        self.serializer.schemaList.extend([
-            SchemaInfo(
-                projectName=getProjectName(),
-                className="Metadata",
-                methodName="connectClient",
-                methodRequest="dict",
-                methodResponse="dict",
-                idNumber=-1,
-            ),
-            SchemaInfo(
-                projectName=getProjectName(),
-                className="Metadata",
-                methodName="getMetadata",
-                methodRequest="dict",
-                methodResponse="dict",
-                idNumber=-1,
-            ),
-            SchemaInfo(
-                projectName=getProjectName(),
-                className="Metadata",
-                methodName="closeClient",
-                methodRequest="dict",
-                methodResponse="dict",
-                idNumber=-1,
-            ),
-        ])
-
-        # Register methods
-        for item in self.serializer.getMethods(__class__, self, "Metadata"):
-            self.methodList[f"{item.className}.{item.methodName}"] = item
-        for item in self.serializer.getMethods(self.classType, self.classInstance, self.className):
-            self.methodList[f"{item.className}.{item.methodName}"] = item
+        self.methodList, self.methodIndex = self.registerMethods(self.serializer)
+        self.schemaStats = self.getSchemaStats() if self.watchInterval else {}
 
     def listen(self):
         self.startServer()
 
     def startServer(self):
         # Server socket
-        self.mainSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.mainSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.mainSocket.bind((self.host, self.port))
-        self.mainSocket.listen()
-        print(f"Server running at http://{self.host}:{self.port}")
+        if self.unixPath:
+            # Stale sockets are replaced, any other file at the path is an error
+            if os.path.lexists(self.unixPath):
+                if not stat.S_ISSOCK(os.lstat(self.unixPath).st_mode):
+                    raise RuntimeError(f"Not a socket: {self.unixPath}")
+                os.remove(self.unixPath)
+            self.mainSocket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.mainSocket.bind(self.unixPath)
+            self.mainSocket.listen()
+            self.unixFile = os.lstat(self.unixPath)
+            print(f"Server running at unix:{self.unixPath}")
+        else:
+            self.mainSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.mainSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.mainSocket.bind((self.host, self.port))
+            self.mainSocket.listen()
+            print(f"Server running at http://{self.host}:{self.port}")
 
         # Client sockets
         self.clientSockets = [self.mainSocket]
@@ -339,12 +437,15 @@ class Server:
         ))
 
         # Accept and read
-        while self.mainSocket:
+        while not self.closed:
             # Cleanup
             for client in self.closedConnections[:]:
                 if time.time() - client.wtime > 5:
                     self.closedConnections.remove(client)
 
+            # Schema changes are picked up between requests
+            self.watchSchema()
+
             # Accept or read
             readable, writable, errored = select.select(self.clientSockets, [], [], 0.5)
 
@@ -358,7 +459,8 @@ class Server:
                 if sockIdx == 0:
                     assert sock == self.mainSocket
                     new_sock, address = self.mainSocket.accept()
-                    self.newConnectionId += 1
+                    with self.loopbackLock:
+                        self.newConnectionId += 1
                     self.clientSockets.append(new_sock)
                     self.activeConnections.append(Connection(
                         connectionId=self.newConnectionId,
@@ -384,78 +486,63 @@ class Server:
                         data += newData
                     else:
                         closeEvent = 1
-
-                    # Parse headers and payload
-                    headerMap = None
-                    url = None
-                    middle = None
-                    contentLen = None
-                    payload = None
-                    if closeEvent > 0:
-                        pass
-                    elif b"\r\n\r\n" in data:
-                        middle = data.index(b'\r\n\r\n') + len(b'\r\n\r\n')
-                        headerMap = getHeaderMap(
-                            data[0: middle].decode(),
-                            ["Content-Length", "Project-Id", "Sender-Id"]
-                        )
-                        parts = [x.strip() for x in data[0: data.index(b'\n')].decode().split(' ') if x.strip()]
-                        assert len(parts) == 3
-                        url = parts[1]
-                        contentLen = int(headerMap["Content-Length"])
-                        if middle + contentLen <= len(data):
-                            connection.readBuffer = data[middle+contentLen:]
-                            payload = json.loads(data[middle: middle+contentLen].decode())
-                            connection.wtime = time.time()
-                            connection.messageCount += 1
-                            connection.senderId = headerMap["Sender-Id"]
-                            connection.callId = url
-                            if headerMap["Project-Id"]:
-                                connection.projectId = headerMap["Project-Id"]     # normally populated in connectClient
-                        else:
-                            connection.readBuffer = data
-                    else:
-                        connection.readBuffer = data
-
-                    # Process message
-                    buf = None
-                    if closeEvent > 0:
-                        pass
-                    elif payload is not None:
-                        # Server call
-                        try:
-                            self.currentConnection = connection
-                            buf = self.serverCall(url, payload)
-
-                        # Process error
-                        except Exception as ex:
-                            if self.verbose:
-                                print(
-                                    f"ERROR: Failed in call: "
-                                    f"{connection.connectionId}, {connection.callId}, "
-                                    f"{url}, {ex}"
-                                )
-                                traceback.print_exc()
-                            closeEvent = 2
-                            respBuf = json.dumps({
-                                "type": "https://nativerpc.com/errors/not-found",
-                                "title": "Internal error",
-                                "detail": str(ex),
-                                "instance": url,
-                                "status": 504,
-                            }).encode("utf-8")
+                    connection.readBuffer = data
+
+                    # Read buffered messages
+                    while closeEvent == 0 and connection.readBuffer:
+                        # Framed messages
+                        if connection.protocol == PROTOCOL_FRAMED:
+                            if not self.readFrame(connection):
+                                break
+                            continue
+
+                        # Parse headers and payload
+                        headerMap, url, payload = self.readRequest(connection)
+                        if payload is None:
+                            break
+
+                        # Shed calls whose caller has given up, malformed deadlines are ignored
+                        deadline = parseFloat(headerMap["Deadline"])
+                        if deadline and time.time() > deadline:
+                            respBuf = self.shedCall(url)
                             buf = (
-                                f"HTTP/1.1 504 Remote error\r\n"
+                                f"HTTP/1.1 504 Deadline exceeded\r\n"
                                 f"Content-Length: {len(respBuf)}\r\n"
                                 f"Content-type: application/problem+json\r\n\r\n"
                             ).encode() + respBuf
-                        finally:
-                            self.currentConnection = None
 
-                    # Send response
-                    if buf is None or closeEvent == 1:
-                        pass
-                    else:
+                        # Server call
+                        else:
+                            try:
+                                self.currentConnection = connection
+                                buf = self.serverCall(url, payload)
+
+                            # Process error
+                            except Exception as ex:
+                                if self.verbose:
+                                    print(
+                                        f"ERROR: Failed in call: "
+                                        f"{connection.connectionId}, {connection.callId}, "
+                                        f"{url}, {ex}"
+                                    )
+                                    traceback.print_exc()
+                                closeEvent = 2
+                                respBuf = json.dumps({
+                                    "type": "https://nativerpc.com/errors/not-found",
+                                    "title": "Internal error",
+                                    "detail": str(ex),
+                                    "instance": url,
+                                    "status": 504,
+                                }).encode("utf-8")
+                                buf = (
+                                    f"HTTP/1.1 504 Remote error\r\n"
+                                    f"Content-Length: {len(respBuf)}\r\n"
+                                    f"Content-type: application/problem+json\r\n\r\n"
+                                ).encode() + respBuf
+                            finally:
+                                self.currentConnection = None
+
+                        # Send response
                         try:
                             sock.sendall(buf)
                         except Exception as ex:
@@ -473,8 +560,9 @@ class Server:
                         self.clientSockets.remove(sock)
                         self.activeConnections.remove(connection)
                         self.closedConnections.append(connection)
-                        connection.closed = True
-                        connection.socket = None
+                        with connection.sendLock:
+                            connection.closed = True
+                            connection.socket = None
                         connection.wtime = time.time()
                         closed = False
                         try:
@@ -489,9 +577,144 @@ class Server:
                                 f"{len(self.activeConnections)}, {len(self.clientSockets)}, {len(self.closedConnections)}"
                             )
 
+        # Only the socket created here is removed, another server may have replaced it
         self.mainSocket.close()
+        self.mainSocket = None
+        if self.unixFile:
+            try:
+                unixFile = os.lstat(self.unixPath)
+                if (unixFile.st_dev, unixFile.st_ino) == (self.unixFile.st_dev, self.unixFile.st_ino):
+                    os.remove(self.unixPath)
+            except FileNotFoundError:
+                pass
+            self.unixFile = None
+        if self.executor:
+            self.executor.shutdown(wait=False)
+
+    def close(self):
+        # Server loop exits within its select timeout
+        self.closed = True
+
+    def readRequest(self, connection):
+        data = connection.readBuffer
+        headerMap = None
+        url = None
+        middle = None
+        contentLen = None
+        payload = None
+        if b"\r\n\r\n" in data:
+            middle = data.index(b'\r\n\r\n') + len(b'\r\n\r\n')
+            headerMap = getHeaderMap(
+                data[0: middle].decode(),
+                ["Content-Length", "Project-Id", "Sender-Id", "Deadline"]
+            )
+            parts = [x.strip() for x in data[0: data.index(b'\n')].decode().split(' ') if x.strip()]
+            assert len(parts) == 3
+            url = parts[1]
+            contentLen = int(headerMap["Content-Length"])
+            if middle + contentLen <= len(data):
+                connection.readBuffer = data[middle+contentLen:]
+                payload = json.loads(data[middle: middle+contentLen].decode())
+                connection.wtime = time.time()
+                connection.messageCount += 1
+                connection.senderId = headerMap["Sender-Id"]
+                connection.callId = url
+                if headerMap["Project-Id"]:
+                    connection.projectId = headerMap["Project-Id"]     # normally populated in connectClient
+        return headerMap, url, payload
+
+    def registerMethods(self, serializer):
+        # Add custom metadata
+        serializer.schemaList.extend([
+            SchemaInfo(
+                projectName=getProjectName(),
+                className="Metadata",
+                methodName="connectClient",
+                methodRequest="dict",
+                methodResponse="dict",
+                idNumber=-1,
+            ),
+            SchemaInfo(
+                projectName=getProjectName(),
+                className="Metadata",
+                methodName="getMetadata",
+                methodRequest="dict",
+                methodResponse="dict",
+                idNumber=-1,
+            ),
+            SchemaInfo(
+                projectName=getProjectName(),
+                className="Metadata",
+                methodName="closeClient",
+                methodRequest="dict",
+                methodResponse="dict",
+                idNumber=-1,
+            ),
+        ])
+
+        # Number methods, used as method ids in framed calls, ids are kept across reloads and never reused
+        methodIds = dict(self.methodIds)
+        for item in serializer.schemaList:
+            if item.methodName:
+                name = f"{item.className}.{item.methodName}"
+                if name not in methodIds:
+                    methodIds[name] = len(methodIds)
+                item.idNumber = methodIds[name]
+
+        # Register methods
+        methodList = {}
+        methodIndex = {}
+        for item in serializer.getMethods(__class__, self, "Metadata"):
+            methodList[f"{item.className}.{item.methodName}"] = item
+            methodIndex[item.idNumber] = item
+        for item in serializer.getMethods(self.classType, self.classInstance, self.className):
+            methodList[f"{item.className}.{item.methodName}"] = item
+            methodIndex[item.idNumber] = item
+        self.methodIds = methodIds
+        return methodList, methodIndex
+
+    def getSchemaStats(self):
+        result = {}
+        for item in getMessageFiles(getProjectPath()):
+            stat = os.stat(item)
+            result[item] = (stat.st_mtime_ns, stat.st_size)
+        return result
+
+    def watchSchema(self):
+        if not self.watchInterval or time.time() - self.watchTime < self.watchInterval:
+            return
+        self.watchTime = time.time()
+        try:
+            schemaStats = self.getSchemaStats()
+        except (AssertionError, OSError):
+            return
+        if schemaStats != self.schemaStats:
+            self.schemaStats = schemaStats
+            self.reloadSchema()
+
+    def reloadSchema(self):
+        # Tables are rebuilt aside and swapped in between requests, a failed reload keeps the running schema
+        try:
+            serializer = Serializer(reload=True)
+            methodList, methodIndex = self.registerMethods(serializer)
+        except Exception as ex:
+            print(f"WARNING: Failed to reload schema: {ex}")
+            if self.verbose:
+                traceback.print_exc()
+            return False
+        self.serializer, self.methodList, self.methodIndex = serializer, methodList, methodIndex
+        print(f"Reloaded schema: {len(methodList)} methods")
+        return True
 
     def serverCall(self, url, payload):
+        respBuf = self.dispatchCall(url, payload)
+        return (
+            f"HTTP/1.1 200 OK\r\n"
+            f"Content-Length: {len(respBuf)}\r\n"
+            f"Content-type: application/json\r\n\r\n"
+        ).encode() + respBuf
+
+    def dispatchCall(self, url, payload):
         parts = [x for x in url.split('/') if x]
         if len(parts) != 2:
             raise RuntimeError(f"Failed to route: {parts}")
@@ -499,23 +722,122 @@ class Server:
             raise RuntimeError(f"Failed to route: {parts}")
         if isinstance(payload, str):
             payload = json.loads(payload)
-        met = self.methodList[f"{parts[0]}.{parts[1]}"]
-        param = self.serializer.fromJson(met.methodParams[0], payload)
+        return self.invokeMethod(self.methodList[f"{parts[0]}.{parts[1]}"], payload)
+
+    def invokeMethod(self, met, payload):
+        # Read once, a schema reload may swap it while the call runs
+        serializer = self.serializer
+        param = serializer.fromJson(met.methodParams[0], payload)
         assert met.methodParams[1] in COMMON_TYPES or met.methodParams[
-            1] in self.serializer.fieldList, f"Missing type: {met.methodParams[1]}"
+            1] in serializer.fieldList, f"Missing type: {met.methodParams[1]}"
         assert met.methodParams[1] in COMMON_TYPES or len(
-            self.serializer.fieldList[met.methodParams[1]]) > 0, f"Missing field items: {met.methodParams[1]}"
+            serializer.fieldList[met.methodParams[1]]) > 0, f"Missing field items: {met.methodParams[1]}"
         respType = COMMON_TYPES[met.methodParams[1]
-                                ] if met.methodParams[1] in COMMON_TYPES else self.serializer.fieldList[met.methodParams[1]][0].classType
+                                ] if met.methodParams[1] in COMMON_TYPES else serializer.fieldList[met.methodParams[1]][0].classType
         resp = met.methodCall(param)
-        assert isinstance(resp, respType)
-        respJson = self.serializer.toJson(met.methodParams[1], resp)
-        respBuf = json.dumps(respJson).encode("utf-8")
-        return (
-            f"HTTP/1.1 200 OK\r\n"
-            f"Content-Length: {len(respBuf)}\r\n"
-            f"Content-type: application/json\r\n\r\n"
-        ).encode() + respBuf
+
+        # Compiled and reloaded schemas replace the classes services return, those are accepted from the
+        # serializer's own modules only
+        assert isinstance(resp, respType) or ((serializer.compiled or serializer.reloaded) and type(
+            resp) in serializer.findClasses(respType.__name__)), f"Invalid response: {type(resp)}"
+        respJson = serializer.toJson(met.methodParams[1], resp)
+        return json.dumps(respJson).encode("utf-8")
+
+    def readFrame(self, connection):
+        data = connection.readBuffer
+        if len(data) < FRAME_HEADER.size:
+            return False
+        requestId, methodId, length, deadline, flags = FRAME_HEADER.unpack_from(data)
+        end = FRAME_HEADER.size + length
+        if len(data) < end:
+            return False
+        payload = data[FRAME_HEADER.size: end]
+        connection.readBuffer = data[end:]
+        met = self.methodIndex.get(methodId)
+        connection.wtime = time.time()
+        connection.messageCount += 1
+        connection.callId = f"/{met.className}/{met.methodName}" if met else f"/Unknown/{methodId}"
+
+        # Metadata calls use the current connection and run inline
+        if met and met.className == "Metadata":
+            try:
+                self.currentConnection = connection
+                self.frameCall(connection, requestId, met, payload, deadline, flags)
+            finally:
+                self.currentConnection = None
+        else:
+            if not self.executor:
+                self.executor = ThreadPoolExecutor()
+            self.executor.submit(self.frameCall, connection, requestId, met, payload, deadline, flags)
+        return True
+
+    def frameCall(self, connection, requestId, met, payload, deadline, flags):
+        # Shed calls whose caller has given up
+        if deadline and time.time() > deadline:
+            if flags & FRAME_SHARED:
+                discardShared(payload)
+            self.sendFrame(connection, requestId, 504, self.shedCall(connection.callId))
+            return
+
+        status = 200
+        try:
+            # Large payloads are read off the select loop, unreadable segments fail the call
+            if flags & FRAME_SHARED:
+                payload = readShared(payload)
+            if not met:
+                raise RuntimeError(f"Failed to route: {connection.callId}")
+            respBuf = self.invokeMethod(met, json.loads(payload))
+        except Exception as ex:
+            if self.verbose:
+                print(
+                    f"ERROR: Failed in call: "
+                    f"{connection.connectionId}, {requestId}, "
+                    f"{connection.callId}, {ex}"
+                )
+                traceback.print_exc()
+            status = 504
+            respBuf = json.dumps({
+                "type": "https://nativerpc.com/errors/not-found",
+                "title": "Internal error",
+                "detail": str(ex),
+                "instance": f"/{met.className}/{met.methodName}" if met else "",
+                "status": 504,
+            }).encode("utf-8")
+        self.sendFrame(connection, requestId, status, respBuf)
+
+    def shedCall(self, url):
+        with self.statsLock:
+            self.shedCount += 1
+        if self.verbose:
+            print(f"WARNING: Deadline exceeded: {url}")
+        return json.dumps({
+            "type": "https://nativerpc.com/errors/deadline-exceeded",
+            "title": "Deadline exceeded",
+            "detail": "Caller deadline passed before the call started",
+            "instance": url,
+            "status": 504,
+        }).encode("utf-8")
+
+    def sendFrame(self, connection, requestId, status, respBuf):
+        flags = 0
+        if connection.sharedMemory and len(respBuf) >= connection.sharedMemory and not connection.closed:
+            respBuf = writeShared(respBuf)
+            flags = FRAME_SHARED
+        with connection.sendLock:
+            if connection.closed:
+                if flags:
+                    discardShared(respBuf)
+                return
+            try:
+                connection.socket.sendall(FRAME_HEADER.pack(requestId, status, len(respBuf), 0, flags) + respBuf)
+            except Exception as ex:
+                if flags:
+                    discardShared(respBuf)
+                if self.verbose:
+                    print(
+                        f"ERROR: Failed in send: "
+                        f"{connection.connectionId}, {requestId}, {ex}"
+                    )
 
     def connectClient(self, param: dict):
         connection = self.currentConnection
@@ -526,11 +848,25 @@ class Server:
         connection.entryPoint = param["entryPoint"]
         connection.projectId = param["projectId"]
 
+        # Framed protocol is used after this response
+        if param.get("protocol") == PROTOCOL_FRAMED:
+            connection.protocol = PROTOCOL_FRAMED
+
+        # Shared memory needs both processes on this host
+        local = self.unixPath or connection.address[0] in ["127.0.0.1", "::1"]
+        if connection.protocol == PROTOCOL_FRAMED and local and param.get("sharedMemory"):
+            connection.sharedMemory = int(param["sharedMemory"])
+
         return {
             "projectId": getProjectName(),
             "connected": True,
             "port": self.port,
             "connectionId": connection.connectionId,
+            "protocol": connection.protocol,
+            "sharedMemory": connection.sharedMemory,
+            "methodIds": {
+                f"/{x.className}/{x.methodName}": x.idNumber for x in self.methodIndex.values()
+            } if connection.protocol == PROTOCOL_FRAMED else {},
         }
 
     def getMetadata(self, param: dict):
@@ -549,7 +885,7 @@ class Server:
 
         # Clients
         clientInfos = []
-        for client in self.activeConnections + self.closedConnections:
+        for client in self.activeConnections + self.loopbackConnections + self.closedConnections:
             if client.projectId == "nativerpc":
                 continue
             clientInfos.append({
@@ -566,6 +902,8 @@ class Server:
                 "callId": client.callId,
                 "processId": client.processId,
                 "shellId": client.shellId,
+                "protocol": client.protocol,
+                "sharedMemory": client.sharedMemory,
             })
 
         clientInfos.sort(key=lambda item: (1 if not item["active"] else 0, item["connectionId"]))
@@ -573,8 +911,13 @@ class Server:
         return {
             "projectId": getProjectName(),
             "port": self.port,
-            "entryPoint": __main__.__file__,
-            "clientCounts": [len(self.activeConnections), len(self.closedConnections), len(clientInfos)],
+            "entryPoint": getEntryPoint(),
+            "clientCounts": [
+                len(self.activeConnections) + len(self.loopbackConnections),
+                len(self.closedConnections),
+                len(clientInfos)
+            ],
+            "shedCount": self.shedCount,
             "clientInfos": clientInfos,
             "schemaList": [[x.__dict__ for x in self.serializer.schemaList]],
         }
@@ -592,27 +935,144 @@ class Server:
             "connectionId": connection.connectionId,
         }
 
+    # Per thread, loopback calls run on caller threads
+    @property
+    def currentConnection(self) -> Connection:
+        return getattr(self.callContext, "connection", None)
+
+    @currentConnection.setter
+    def currentConnection(self, connection: Connection):
+        self.callContext.connection = connection
+
+    def openLoopback(self):
+        with self.loopbackLock:
+            self.newConnectionId += 1
+            connection = Connection(
+                connectionId=self.newConnectionId,
+                socket=None,
+                address=(PROTOCOL_LOOPBACK, 0),
+                stime=time.time(),
+                wtime=time.time(),
+                projectId="unknown",
+                protocol=PROTOCOL_LOOPBACK,
+            )
+            self.loopbackConnections.append(connection)
+        return connection
+
+    def loopbackCall(self, connection, url, payload, direct):
+        parts = [x for x in url.split('/') if x]
+        met = self.methodList.get(".".join(parts)) if len(parts) == 2 else None
+        if not met:
+            raise RuntimeError(f"Failed to route: {parts}")
+        connection.wtime = time.time()
+        connection.messageCount += 1
+        connection.callId = url
+
+        # Direct calls share objects with the caller, without serialization
+        if direct:
+            return met.methodCall(payload)
+
+        status = 200
+        try:
+            self.currentConnection = connection
+            respBuf = self.invokeMethod(met, json.loads(payload))
+        except Exception as ex:
+            if self.verbose:
+                print(
+                    f"ERROR: Failed in call: "
+                    f"{connection.connectionId}, {url}, {ex}"
+                )
+                traceback.print_exc()
+            status = 504
+            respBuf = json.dumps({
+                "type": "https://nativerpc.com/errors/not-found",
+                "title": "Internal error",
+                "detail": str(ex),
+                "instance": url,
+                "status": 504,
+            }).encode("utf-8")
+        finally:
+            self.currentConnection = None
+        return status, respBuf
+
+    def closeLoopback(self, connection):
+        with self.loopbackLock:
+            if connection in self.loopbackConnections:
+                self.loopbackConnections.remove(connection)
+                self.closedConnections.append(connection)
+        connection.closed = True
+        connection.wtime = time.time()
+
 
 class Client:
     classType: type
     host: str
     port: int
     serializer: Serializer
-    mainSocket: requests.Session
-    connectionId: int
+    protocol: str
+    timeout: float
+    balance: str
+    sharedMemory: int
+    loopbackServer: Server
+    loopbackMode: str
+    loopbackConnection: Connection
+    endpoints: list[Endpoint]
+    endpointLock: threading.Lock
+    probeThread: threading.Thread
+    cacheTimes: dict[str, float]
+    responseCache: ResponseCache
+    coalesceMethods: set[str]
+    singleFlight: SingleFlight
+    hedgeMethods: set[str]
+    hedgeExecutor: ThreadPoolExecutor
+    hedgeCount: int
+    latencyTrackers: dict[str, LatencyTracker]
     proxyInstance: any
+    lazy: bool
+    connected: bool
+    connectLock: threading.Lock
+    closed: bool
     verbose: bool
 
     def __init__(self, options: Options):
+        loopbackServer = options.get(SERVER)
+        hostList = options[HOST] if HOST in options or not loopbackServer else (
+            loopbackServer.unixPath or (loopbackServer.host, loopbackServer.port))
+        hosts = [getHostAddress(x) for x in (hostList if isinstance(hostList, list) else [hostList])]
+        assert len(hosts) > 0
         self.className = options[SERVICE].__name__
         self.classType = options[SERVICE]
-        self.host = options[HOST][0]
-        self.port = options[HOST][1]
+        self.host = hosts[0][0]
+        self.port = hosts[0][1]
+        self.protocol = options.get(PROTOCOL, PROTOCOL_HTTP)
+        self.timeout = options.get(TIMEOUT, 1)
+        self.balance = options.get(BALANCE, BALANCE_OUTSTANDING)
+        self.sharedMemory = options.get(SHARED_MEMORY, 0)
+        self.loopbackServer = loopbackServer
+        self.loopbackMode = options.get(LOOPBACK, LOOPBACK_JSON)
+        self.loopbackConnection = None
         self.serializer = Serializer()
-        self.mainSocket = None
-        self.connectionId = 0
+        self.endpoints = [Endpoint(host=host, port=port, unixPath=unixPath) for host, port, unixPath in hosts]
+        self.endpointLock = threading.Lock()
+        self.probeThread = None
+        self.cacheTimes = dict(options.get(CACHE, {}))
+        self.responseCache = ResponseCache()
+        self.coalesceMethods = set(options.get(COALESCE, []))
+        self.singleFlight = SingleFlight()
+        self.hedgeMethods = set(options.get(HEDGE, []))
+        self.hedgeExecutor = None
+        self.hedgeCount = 0
+        self.latencyTrackers = {}
         self.proxyInstance = Service(self)
+        self.lazy = options.get(LAZY, False)
+        self.connected = False
+        self.connectLock = threading.Lock()
+        self.closed = False
         self.verbose = False
+        assert self.balance in [BALANCE_OUTSTANDING, BALANCE_LATENCY], f"Unknown balance: {self.balance}"
+        assert not self.sharedMemory or self.protocol == PROTOCOL_FRAMED, "Shared memory requires framed protocol"
+        assert self.loopbackMode in [LOOPBACK_JSON, LOOPBACK_DIRECT], f"Unknown loopback: {self.loopbackMode}"
+        assert not loopbackServer or isinstance(loopbackServer, Server), "Loopback requires a server instance"
 
         # Add custom metadata
         self.serializer.schemaList.extend([
@@ -645,45 +1105,124 @@ class Client:
         # Register methods
         assert [x for x in self.serializer.schemaList if x.className == "Metadata" and x.methodName]
         assert [x for x in self.serializer.schemaList if x.className == self.className and x.methodName]
+        for methodName in [*self.cacheTimes, *self.coalesceMethods, *self.hedgeMethods]:
+            assert [x for x in self.serializer.schemaList if x.className == self.className and x.methodName == methodName], \
+                f"Unknown method option: {methodName}"
+        for item in self.serializer.schemaList:
+            if item.className == self.className and item.methodName:
+                self.latencyTrackers[item.methodName] = LatencyTracker()
         self.setupInstance()
 
     def connect(self):
-        self.initSocket()
+        # Lazy clients connect on first call
+        self.closed = False
+        if not self.lazy:
+            self.initSocket()
         return self.proxyInstance
 
     def initSocket(self):
-        payload = {
-            "projectId": getProjectName(),
-            "clientId": os.getpid(),
-            "parentId": os.getppid(),
-            "shellId": getShellId(),
-            "entryPoint": __main__.__file__,
-        }
-
-        self.mainSocket = requests.Session()
-        self.main_adapter = requests.adapters.HTTPAdapter(
+        with self.connectLock:
+            if self.connected:
+                return
+            self.closed = False
+            self.connectSockets()
+            self.connected = True
+
+    def connectSockets(self):
+        lastError = None
+
+        # Bound to an in-process server, no sockets
+        if self.loopbackServer:
+            payload = dict(getIdentity(), protocol=PROTOCOL_LOOPBACK)
+            self.loopbackConnection = self.loopbackServer.openLoopback()
+            status, body = self.loopbackServer.loopbackCall(
+                self.loopbackConnection, "/Metadata/connectClient", json.dumps(payload), False)
+            if status != 200:
+                raise RuntimeError(f"Client error: {json.loads(body)['detail']}, code={status}")
+            return
+
+        for endpoint in self.endpoints:
+            try:
+                self.connectEndpoint(endpoint)
+            except Exception as ex:
+                if len(self.endpoints) == 1:
+                    raise
+                if self.verbose:
+                    print(f"WARNING: Failed to connect: {endpoint.host}:{endpoint.port}, {ex}")
+                lastError = ex
+                self.ejectEndpoint(endpoint)
+        if all(x.mainSocket is None and x.framedSocket is None for x in self.endpoints):
+            raise RuntimeError(f"Failed to connect to any endpoint: {lastError}")
+
+    def connectEndpoint(self, endpoint):
+        payload = getIdentity()
+
+        # Framed protocol is negotiated over a plain socket, unix sockets always use one
+        if self.protocol == PROTOCOL_FRAMED or endpoint.unixPath:
+            if self.protocol == PROTOCOL_FRAMED:
+                payload["protocol"] = PROTOCOL_FRAMED
+            if self.sharedMemory:
+                payload["sharedMemory"] = self.sharedMemory
+            # Sockets are assigned once connected, a failed attempt leaves the endpoint closed
+            framedSocket = FramedSocket(endpoint.host, endpoint.port, endpoint.unixPath)
+            try:
+                framedSocket.open(timeout=self.timeout)
+                status, reason, body = framedSocket.request(
+                    "/Metadata/connectClient",
+                    payload,
+                    {
+                        "Connection": "keep-alive",
+                        "Sender-Id": "connect"
+                    },
+                    timeout=self.timeout,
+                )
+                if status != 200:
+                    raise RuntimeError(f"Client error: {reason}, code={status}")
+                data = json.loads(body)
+                if data.get("protocol") == PROTOCOL_FRAMED:
+                    framedSocket.sharedMemory = data.get("sharedMemory", 0)
+                    framedSocket.upgrade()
+            except Exception:
+                framedSocket.close()
+                raise
+            endpoint.connectionId = data["connectionId"]
+            if data.get("protocol") == PROTOCOL_FRAMED:
+                endpoint.methodIds = data["methodIds"]
+            endpoint.framedSocket = framedSocket
+            endpoint.failed = False
+            return
+
+        importRequests()
+        mainSocket = requests.Session()
+        main_adapter = requests.adapters.HTTPAdapter(
             max_retries=1, pool_connections=1, pool_maxsize=1, pool_block=True)
-        self.mainSocket.mount('http://', self.main_adapter)
-        self.mainSocket.mount('https://', self.main_adapter)
+        mainSocket.mount('http://', main_adapter)
+        mainSocket.mount('https://', main_adapter)
 
         req = requests.Request(
             'POST',
-            f"http://{self.host}:{self.port}/Metadata/connectClient",
+            f"http://{endpoint.host}:{endpoint.port}/Metadata/connectClient",
             json=payload,
             headers={
                 "Connection": "keep-alive",
                 "Sender-Id": "connect"
             }
         )
-        resp = self.mainSocket.send(
-            request=req.prepare(),
-            timeout=1,
-            stream=False,
-        )
-        resp.raise_for_status()
-        assert resp.status_code == 200
-        data = resp.json()
-        self.connectionId = data["connectionId"]
+        try:
+            resp = mainSocket.send(
+                request=req.prepare(),
+                timeout=self.timeout,
+                stream=False,
+            )
+            resp.raise_for_status()
+            assert resp.status_code == 200
+            data = resp.json()
+        except Exception:
+            mainSocket.close()
+            raise
+        endpoint.connectionId = data["connectionId"]
+        endpoint.mainSocket = mainSocket
+        endpoint.failed = False
 
     def setupInstance(self):
         assert [x for x in self.serializer.schemaList if x.className == self.className and x.methodName]
@@ -697,8 +1236,8 @@ class Client:
             setattr(
                 self.proxyInstance,
                 methodInfo.methodName,
-                lambda param, this=this, method=method, request=request, response=response:
-                this.clientCall(param, this.className, method, request, response)
+                lambda param, timeout=None, this=this, method=method, request=request, response=response:
+                this.clientCall(param, this.className, method, request, response, timeout)
             )
 
         for methodInfo in self.serializer.schemaList:
@@ -711,66 +1250,316 @@ class Client:
             setattr(
                 self.proxyInstance,
                 methodInfo.methodName,
-                lambda param, this=this, method=method, request=request, response=response:
-                this.clientCall(param, "Metadata", method, request, response)
+                lambda param, timeout=None, this=this, method=method, request=request, response=response:
+                this.clientCall(param, "Metadata", method, request, response, timeout)
             )
 
-    def clientCall(self, param, className, methodName, reqName, resName):
-        assert self.mainSocket
+    def clientCall(self, param, className, methodName, reqName, resName, timeout=None):
+        assert not self.closed
+        if not self.connected:
+            self.initSocket()
+        timeout = timeout or self.timeout
+        if self.loopbackMode == LOOPBACK_DIRECT and self.loopbackServer and className == self.className:
+            return self.loopbackServer.loopbackCall(
+                self.loopbackConnection, f"/{className}/{methodName}", param, True)
         reqJson = self.serializer.toJson(reqName, param)
-        req = requests.Request(
-            'POST',
-            f"http://{self.host}:{self.port}/{className}/{methodName}",
-            json=reqJson,
-            headers={
-                "Sender-Id": "call"
-            }
-        )
-        resp = self.mainSocket.send(
-            request=req.prepare(),
-            timeout=1,
-            stream=False
-        )
+        callKey = None
+        if className == self.className and (methodName in self.cacheTimes or methodName in self.coalesceMethods):
+            callKey = (methodName, json.dumps(reqJson, sort_keys=True, separators=(",", ":")))
+
+        # Cached responses
+        if callKey and methodName in self.cacheTimes:
+            body = self.responseCache.get(callKey)
+            if body is not None:
+                return self.serializer.fromJson(resName, json.loads(body))
+
+        # Coalesced or single call
+        if callKey and methodName in self.coalesceMethods:
+            status, reason, body = self.singleFlight.call(
+                callKey,
+                lambda: self.sendCall(className, methodName, reqJson, timeout)
+            )
+        else:
+            status, reason, body = self.sendCall(className, methodName, reqJson, timeout)
+
         # Throw client errors
-        if resp.status_code != 200:
+        if status != 200:
             details = "Internal error"
             try:
-                details = json.loads(resp.text)["detail"]
+                details = json.loads(body)["detail"]
             except Exception:
                 pass
             raise RuntimeError(
-                f"Client error: {resp.reason}: {details}, code={resp.status_code}"
+                f"Client error: {reason}: {details}, code={status}"
             )
-        data = resp.json()
+        data = json.loads(body)
+        if callKey and methodName in self.cacheTimes:
+            self.responseCache.put(callKey, body, self.cacheTimes[methodName])
         return self.serializer.fromJson(resName, data)
 
-    def close(self):
-        payload = {
-            "projectId": getProjectName(),
-            "clientId": os.getpid(),
-            "parentId": os.getppid(),
-            "shellId": getShellId(),
-            "entryPoint": __main__.__file__,
-            "connectionId": self.connectionId,
-        }
+    def sendCall(self, className, methodName, reqJson, timeout):
+        if self.loopbackServer:
+            status, body = self.loopbackServer.loopbackCall(
+                self.loopbackConnection, f"/{className}/{methodName}", json.dumps(reqJson), False)
+            return status, "OK" if status == 200 else "Remote error", body
+        if className != self.className:
+            return self.attemptCall(className, methodName, reqJson, timeout, self.pickEndpoint())
+
+        # Per-method latency as observed by callers, hedged calls sample their primary attempts
+        if methodName in self.hedgeMethods:
+            return self.hedgedCall(className, methodName, reqJson, timeout)
+        startTime = time.monotonic()
+        result = self.attemptCall(className, methodName, reqJson, timeout, self.pickEndpoint())
+        self.latencyTrackers[methodName].addSample(time.monotonic() - startTime)
+        return result
+
+    def attemptCall(self, className, methodName, reqJson, timeout, endpoint, record=True):
+        startTime = time.monotonic()
+        try:
+            # Endpoints closed after a connection error reconnect on their next call
+            if endpoint.mainSocket is None and endpoint.framedSocket is None:
+                with self.connectLock:
+                    if endpoint.mainSocket is None and endpoint.framedSocket is None:
+                        self.connectEndpoint(endpoint)
+            result = self.endpointCall(endpoint, className, methodName, reqJson, timeout)
+        except Exception as ex:
+            if isinstance(ex, ConnectionError) or (requests and isinstance(ex, requests.exceptions.ConnectionError)):
+                self.ejectEndpoint(endpoint)
+            raise
+        finally:
+            with self.endpointLock:
+                endpoint.outstanding -= 1
+
+        if record:
+            self.recordLatency(endpoint, time.monotonic() - startTime)
+        return result
+
+    def recordLatency(self, endpoint, elapsed):
+        # Exponentially weighted latency
+        with self.endpointLock:
+            endpoint.callCount += 1
+            endpoint.latency = elapsed if endpoint.callCount == 1 else endpoint.latency * 0.8 + elapsed * 0.2
+
+    def hedgedCall(self, className, methodName, reqJson, timeout):
+        tracker = self.latencyTrackers[methodName]
+        hedgeDelay = tracker.getQuantile(0.95)
+        if hedgeDelay is None or len([x for x in self.endpoints if not x.failed]) < 2:
+            startTime = time.monotonic()
+            result = self.attemptCall(className, methodName, reqJson, timeout, self.pickEndpoint())
+            tracker.addSample(time.monotonic() - startTime)
+            return result
+        if not self.hedgeExecutor:
+            self.hedgeExecutor = ThreadPoolExecutor()
+
+        # Primary attempt, hedged after the observed p95 latency
+        deadline = time.monotonic() + timeout
+        results = queue.Queue()
+
+        def attempt(endpoint):
+            startTime = time.monotonic()
+            try:
+                value = self.attemptCall(
+                    className, methodName, reqJson, max(deadline - time.monotonic(), 0.001), endpoint, False)
+            except Exception as ex:
+                results.put((False, ex, endpoint, 0))
+                return
+            # The hedge delay follows primary attempts only, hedges start late and would pull it down
+            elapsed = time.monotonic() - startTime
+            if endpoint is primary:
+                tracker.addSample(elapsed)
+            results.put((True, value, endpoint, elapsed))
+
+        primary = self.pickEndpoint()
+        self.hedgeExecutor.submit(attempt, primary)
+        attempts = 1
+        hedged = False
+        error = None
+        while attempts > 0:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                success, value, endpoint, elapsed = results.get(
+                    timeout=remaining if hedged else min(hedgeDelay, remaining))
+            except queue.Empty:
+                # Hedge once to another endpoint
+                if not hedged:
+                    hedged = True
+                    secondary = self.pickEndpoint(primary)
+                    if secondary:
+                        self.hedgeExecutor.submit(attempt, secondary)
+                        attempts += 1
+                        with self.endpointLock:
+                            self.hedgeCount += 1
+                continue
+
+            # First success wins, a losing attempt does not update its endpoint's latency
+            attempts -= 1
+            if success:
+                self.recordLatency(endpoint, elapsed)
+                return value
+            error = value
+        raise error or TimeoutError(f"Call timed out: {className}.{methodName}")
+
+    def endpointCall(self, endpoint, className, methodName, reqJson, timeout):
+        mainSocket = endpoint.mainSocket
+        if endpoint.framedSocket:
+            return self.framedCall(endpoint, f"/{className}/{methodName}", reqJson, "call", timeout)
+        if mainSocket is None:
+            raise ConnectionError(f"Endpoint closed: {endpoint.host}:{endpoint.port}")
         req = requests.Request(
             'POST',
-            f"http://{self.host}:{self.port}/Metadata/closeClient",
-            json=payload,
+            f"http://{endpoint.host}:{endpoint.port}/{className}/{methodName}",
+            json=reqJson,
             headers={
-                "Sender-Id": "close"
+                "Sender-Id": "call",
+                "Deadline": f"{time.time() + timeout:.6f}",
             }
         )
-        try:
-            resp = self.mainSocket.send(
-                request=req.prepare(),
-                timeout=1,
-                stream=False,
+        resp = mainSocket.send(
+            request=req.prepare(),
+            timeout=timeout,
+            stream=False
+        )
+        return resp.status_code, resp.reason, resp.content
+
+    def framedCall(self, endpoint, url, payload, senderId, timeout):
+        framedSocket = endpoint.framedSocket
+        if framedSocket is None:
+            raise ConnectionError(f"Endpoint closed: {endpoint.host}:{endpoint.port}")
+        if framedSocket.upgraded:
+            if url not in endpoint.methodIds:
+                raise RuntimeError(f"Failed to route: {url}")
+            status, body = framedSocket.call(
+                endpoint.methodIds[url], json.dumps(payload).encode("utf-8"), timeout)
+            return status, "OK" if status == 200 else "Remote error", body
+        return framedSocket.request(
+            url,
+            payload,
+            {
+                "Sender-Id": senderId,
+                "Deadline": f"{time.time() + timeout:.6f}",
+            },
+            timeout
+        )
+
+    def pickEndpoint(self, exclude=None):
+        with self.endpointLock:
+            healthy = [x for x in self.endpoints if not x.failed and x is not exclude]
+            if not healthy and exclude:
+                return None
+
+            # Without healthy endpoints calls go to failed ones, which reconnect inline
+            if not healthy:
+                healthy = self.endpoints
+            if self.balance == BALANCE_LATENCY:
+                endpoint = min(healthy, key=lambda x: (x.latency * (x.outstanding + 1), x.outstanding))
+            else:
+                endpoint = min(healthy, key=lambda x: (x.outstanding, x.latency))
+            endpoint.outstanding += 1
+            return endpoint
+
+    def ejectEndpoint(self, endpoint):
+        with self.endpointLock:
+            if endpoint.failed and endpoint.mainSocket is None and endpoint.framedSocket is None:
+                return
+
+            # The last healthy endpoint stays in rotation, it is only closed
+            startProbe = False
+            if [x for x in self.endpoints if not x.failed and x is not endpoint]:
+                endpoint.failed = True
+                if self.verbose:
+                    print(f"WARNING: Ejecting endpoint: {endpoint.host}:{endpoint.port}")
+                startProbe = not self.probeThread or not self.probeThread.is_alive()
+        self.closeEndpoint(endpoint, False)
+        if startProbe:
+            self.probeThread = threading.Thread(target=self.probeEndpoints, daemon=True)
+            self.probeThread.start()
+
+    def probeEndpoints(self):
+        while not self.closed:
+            time.sleep(1)
+            failed = [x for x in self.endpoints if x.failed]
+            if not failed:
+                break
+            for endpoint in failed:
+                if self.closed:
+                    break
+                with self.connectLock:
+                    if not endpoint.failed:
+                        continue
+                    try:
+                        self.closeEndpoint(endpoint, False)
+                        self.connectEndpoint(endpoint)
+                        if self.verbose:
+                            print(f"Restored endpoint: {endpoint.host}:{endpoint.port}")
+                    except Exception:
+                        self.closeEndpoint(endpoint, False)
+                        endpoint.failed = True
+
+    def close(self):
+        self.closed = True
+        self.connected = False
+        if self.loopbackConnection:
+            payload = dict(getIdentity(), connectionId=self.loopbackConnection.connectionId)
+            self.loopbackServer.loopbackCall(
+                self.loopbackConnection, "/Metadata/closeClient", json.dumps(payload), False)
+            self.loopbackServer.closeLoopback(self.loopbackConnection)
+            self.loopbackConnection = None
+            return
+        if self.hedgeExecutor:
+            self.hedgeExecutor.shutdown(wait=False)
+            self.hedgeExecutor = None
+        for endpoint in self.endpoints:
+            if not endpoint.failed:
+                self.closeEndpoint(endpoint, True)
+
+    def closeEndpoint(self, endpoint, notify):
+        # Endpoints of lazy clients may never have connected, identity is only read to notify the server
+        if endpoint.mainSocket is None and endpoint.framedSocket is None:
+            return
+        if endpoint.framedSocket:
+            if notify:
+                try:
+                    payload = dict(getIdentity(), connectionId=endpoint.connectionId)
+                    status, _, _ = self.framedCall(endpoint, "/Metadata/closeClient", payload, "close", self.timeout)
+                    assert status == 200
+                except Exception:
+                    if self.verbose:
+                        print('WARNING: Failing to close cleanly')
+            endpoint.framedSocket.close()
+            endpoint.framedSocket = None
+            return
+
+        if notify:
+            req = requests.Request(
+                'POST',
+                f"http://{endpoint.host}:{endpoint.port}/Metadata/closeClient",
+                json=dict(getIdentity(), connectionId=endpoint.connectionId),
+                headers={
+                    "Sender-Id": "close"
+                }
             )
-            resp.raise_for_status()
-            assert resp.status_code == 200
-        except Exception:
-            if self.verbose:
-                print('WARNING: Failing to close cleanly')
-        self.mainSocket.close()
-        self.mainSocket = None
+            try:
+                resp = endpoint.mainSocket.send(
+                    request=req.prepare(),
+                    timeout=self.timeout,
+                    stream=False,
+                )
+                resp.raise_for_status()
+                assert resp.status_code == 200
+            except Exception:
+                if self.verbose:
+                    print('WARNING: Failing to close cleanly')
+        endpoint.mainSocket.close()
+        endpoint.mainSocket = None
+
+
+def importRequests():
+    global requests
+
+    # Loaded with the first HTTP endpoint, it dominates import time
+    if requests is None:
+        import requests.adapters
+        requests = sys.modules["requests"]
+    return requests
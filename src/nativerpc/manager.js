@@ -16,8 +16,11 @@
  *          showFiles
  *          showTypes
  *          showProcesses
+ *          compileProjects
  * 
  *          fetchWithAbort
+ *          fetchUnixWithAbort
+ *          getGlobPattern
  *          zipArrays
  *          printText
  *          printLine
@@ -27,6 +30,7 @@
  */
 const assert = require('node:assert');
 const fs = require('node:fs');
+const http = require('node:http');
 const path = require('node:path');
 const spawnSync = require('node:child_process').spawnSync;
 const chalk = require('chalk').default;
@@ -61,7 +65,9 @@ class Manager {
         this.projectNames = [];
         this.pythonCommand = null;
         this.schemaNames = null;
+        this.schemaPatterns = null;
         this.primaryPorts = null;
+        this.primarySockets = null;
         this.followProcesses = null;
     }
 
@@ -89,11 +95,13 @@ class Manager {
         this.schemaNames = settings.schemaNames ?? [
             "common"
         ];
+        this.schemaPatterns = (settings.schemaPatterns ?? []).map(item => this.getGlobPattern(item));
         this.primaryPorts = settings.primaryPorts ?? [
             9001,
             9002,
             9003
         ];
+        this.primarySockets = settings.primarySockets ?? [];
         this.followProcesses = settings.followProcesses ?? false;
     }
 
@@ -133,6 +141,8 @@ class Manager {
                 }
             }
 
+            const sourceDir = path.join(projectDir, 'src');
+            const schemaPatterns = this.schemaPatterns;
             function read(schemaNames, projectDir) {
                 const result = [];
                 const entries = fs.readdirSync(projectDir, { withFileTypes: true });
@@ -143,7 +153,9 @@ class Manager {
                     }
                     const baseName = entry.name.substring(0, entry.name.lastIndexOf('.'));
                     const extension = entry.name.substring(entry.name.lastIndexOf('.'));
-                    if (entry.isFile() && schemaNames.includes(baseName) && sourceExtensions.includes(extension)) {
+                    const relativeFile = path.relative(sourceDir, path.join(entry.parentPath, entry.name)).split(path.sep).join('/');
+                    const matched = schemaNames.includes(baseName) || schemaPatterns.some(item => item.test(relativeFile));
+                    if (entry.isFile() && matched && baseName != 'schema_compiled' && sourceExtensions.includes(extension)) {
                         result.push(new SchemaFileInfo({
                             projectName: projectName,
                             projFiles: projFiles,
@@ -168,19 +180,29 @@ class Manager {
 
     getSchema() {
         this.schemaList = [];
+        if (this.schemaFiles.length == 0) {
+            return;
+        }
+
+        // One parser process for all schema files
+        assert(path.join(__dirname, 'parser.py'));
         for (const file of this.schemaFiles) {
-            assert(path.join(__dirname, 'parser.py'));
             assert(fs.existsSync(file.schemaFile));
-            const { status, stdout, stderr } = spawnSync(
-                'python',
-                [
-                    '-u',
-                    path.join(__dirname, 'parser.py'),
-                    file.schemaFile,
-                ]
-            );
-            assert(status === 0);
-            for (const item of JSON.parse(stdout.toString())) {
+        }
+        const { status, stdout, stderr } = spawnSync(
+            'python',
+            [
+                '-u',
+                path.join(__dirname, 'parser.py'),
+                '--batch',
+                ...this.schemaFiles.map(item => item.schemaFile),
+            ],
+            { maxBuffer: 64 * 1024 * 1024 }
+        );
+        assert(status === 0);
+        const schemaLists = JSON.parse(stdout.toString());
+        for (const file of this.schemaFiles) {
+            for (const item of schemaLists[file.schemaFile]) {
                 this.schemaList.push(new SchemaInfo({
                     projectName: file.projectName,
                     className: item.className,
@@ -205,6 +227,13 @@ class Manager {
                 queryResult: null,
             }));
         }
+        for (const socketPath of this.primarySockets) {
+            result.push(new QueryInfo({
+                port: socketPath,
+                promise: this.fetchUnixWithAbort(socketPath, '/Metadata/getMetadata', {}, controller),
+                queryResult: null,
+            }));
+        }
         await new Promise((resolve) => { setTimeout(() => { resolve(1) }, 100) });
         controller.abort()
         for (const item of result) {
@@ -351,14 +380,13 @@ class Manager {
         lines.push(chalk.dim('FOLDER                 PROJECT             SCHEMA              SERVICES       MESSAGES'))
         for (const projectName of this.projectNames) {
             const schemaFiles = this.schemaFiles.filter(item => item.projectName === projectName);
-            assert(schemaFiles.length == 1);
             const projFile = schemaFiles[0] && schemaFiles[0].projFiles.length > 0 ? schemaFiles[0].projFiles[0] : '-';
             assert(schemaFiles && schemaFiles.length > 0);
             const methods = this.schemaList.filter(item => item.projectName === projectName && item.methodName).map(item => [item.className, item.methodName]);
             const fields = this.schemaList.filter(item => item.projectName === projectName && item.fieldName).map(item => [item.className, item.fieldName]);
             const serviceNames = [...new Set(methods.map(item => item[0]))].join(', ');
             const typeNames = [...new Set(fields.map(item => item[0]))].map(item => chalk.green(item)).join(', ');
-            const schemaFile = path.basename(schemaFiles[0].schemaFile);
+            const schemaFile = path.basename(schemaFiles[0].schemaFile) + (schemaFiles.length > 1 ? ` +${schemaFiles.length - 1}` : '');
             lines.push(
                 `${projectName.padEnd(22, ' ')} ` +
                 `${projFile.padEnd(19, ' ')} ` +
@@ -503,6 +531,36 @@ class Manager {
         }
     }
 
+    compileProjects(slots) {
+        this.getSettings();
+        this.getFiles(false);
+        const projectNames = [...new Set(
+            this.schemaFiles.filter(item => item.projFiles.includes('pyproject.toml')).map(item => item.projectName)
+        )];
+        for (const projectName of projectNames) {
+            const { status, stdout, stderr } = spawnSync(
+                this.pythonCommand,
+                [
+                    '-m',
+                    'nativerpc',
+                    'compile',
+                    path.join(this.workspaceRoot, projectName),
+                    ...(slots ? ['--slots'] : []),
+                ],
+                {
+                    env: { ...process.env, PYTHONPATH: path.dirname(__dirname) }
+                }
+            );
+            process.stdout.write(stdout.toString());
+            process.stderr.write(stderr.toString());
+            if (status !== 0) {
+                console.log(`Failed to compile ${chalk.yellow(projectName)}.`);
+                process.exit(1);
+            }
+        }
+        console.log(`Compiled ${projectNames.length} projects.`);
+    }
+
     async fetchWithAbort(url, body, controller) {
         try {
             const resp = await fetch(
@@ -524,6 +582,65 @@ class Manager {
         return null;
     }
 
+    fetchUnixWithAbort(socketPath, url, body, controller) {
+        return new Promise((resolve) => {
+            const data = JSON.stringify(body);
+            const req = http.request(
+                {
+                    socketPath,
+                    path: url,
+                    method: 'POST',
+                    headers: {
+                        'Project-Id': 'nativerpc',
+                        'Sender-Id': 'fetch',
+                        'Content-Length': Buffer.byteLength(data),
+                    },
+                    signal: controller.signal
+                },
+                (resp) => {
+                    const chunks = [];
+                    resp.on('data', (chunk) => chunks.push(chunk));
+                    resp.on('end', () => {
+                        try {
+                            resolve(JSON.parse(Buffer.concat(chunks).toString()));
+                        }
+                        catch (ex) {
+                            resolve(null);
+                        }
+                    });
+                    resp.on('error', () => resolve(null));
+                }
+            );
+            req.on('error', () => resolve(null));
+            req.end(data);
+        });
+    }
+
+    getGlobPattern(pattern) {
+        // Same wildcards as Python's recursive glob, relative to the project source folder
+        let result = '';
+        for (let index = 0; index < pattern.length; index++) {
+            if (pattern.startsWith('**/', index)) {
+                result += '(?:.*/)?';
+                index += 2;
+            }
+            else if (pattern.startsWith('**', index)) {
+                result += '.*';
+                index += 1;
+            }
+            else if (pattern[index] === '*') {
+                result += '[^/]*';
+            }
+            else if (pattern[index] === '?') {
+                result += '[^/]';
+            }
+            else {
+                result += pattern[index].replace(/[.+^${}()|[\]\\]/g, '\\$&');
+            }
+        }
+        return new RegExp(`^${result}$`);
+    }
+
     zipArrays(arr1, arr2) {
         const maxLength = Math.max(arr1.length, arr2.length);
         const result = [];
@@ -3,6 +3,13 @@
 #
 #       Color
 #       NodeType
+#       NODE_TEXTS
+#       SHORT_TYPES
+#       SCOPE_ENDS
+#       TYPE_MAP
+#       PYTHON_TOKENS
+#       TYPESCRIPT_TOKENS
+#       CPP_TOKENS
 #
 #       TreeNode
 #           __init__
@@ -19,6 +26,7 @@
 #           addNodeDict
 #           addNodeWord
 #           getBlockIndent
+#           getLineIndents
 #
 #       TypescriptParser
 #           __init__
@@ -32,15 +40,23 @@
 #           addNodeDict
 #           addNodeWord
 #
+#       SchemaExtractor
+#           __init__
+#           addStatement
+#
+#       tokenize
+#       matchClass
+#       matchMembers
 #       parseSchemaScene
 #       parseSchemaList
+#       serveSchemaLists
 #       __main__
 ##
 import sys
 import json
 import os
-from enum import Enum
-from typing import Self
+import re
+from typing import Final, Self
 
 
 class Color:
@@ -59,7 +75,7 @@ class Color:
     RESET_ALL = "\033[0m"
 
 
-class NodeType(Enum):
+class NodeType:
     ROOT = 1
     # Last unclassified child
     ENDSTATEMENT = 2
@@ -78,8 +94,85 @@ class NodeType(Enum):
     BLOCK = 15
 
 
+# Fixed node texts indexed by node type, None for nodes showing their own text
+NODE_TEXTS: Final = (
+    None, 'root', 'statement', 'class', 'call', None, 'curly', 'wiggly',
+    'statement', 'square', 'argument', None, None, None, 'comment', 'wiggly',
+)
+
+SHORT_TYPES: Final = (
+    None, 'rtn', 'est', 'cls', 'cll', 'FETCH', 'crl', 'wgl',
+    'stm', 'sqr', 'arg', 'wrd', 'opr', 'str', 'cmt', 'lvl',
+)
+
+SCOPE_ENDS: Final = {
+    NodeType.WIGGLY: '}',
+    NodeType.CURLY: ')',
+    NodeType.SQUARE: ']',
+}
+
+TYPE_MAP: Final = {
+    "std::string": "str",
+    "string": "str",
+    "nlohmann::json": "dict",
+    "json": "dict",
+    "boolean": "bool",
+    "object": "dict",
+    "Object": "dict",
+    "any": "dict",
+    "list": "list",
+    "Array": "list",
+    "unknown": "dict",
+}
+
+# Master token patterns, one alternative per token kind in the parsers' order of precedence.
+# Strings and comments only match their opening characters, tokenize finds their ends.
+PYTHON_TOKENS: Final = re.compile(r"""
+    (?P<fstring>f["'])
+    |(?P<string>["'])
+    |(?P<hash>\#)
+    |(?P<join>\\\n)
+    |(?P<open>:\n|[{(\[])
+    |(?P<close>[})\]])
+    |(?P<newline>\n)
+    |(?P<comma>,)
+    |(?P<word>(?:(?!f["'])[A-Za-z0-9._])+)
+    |(?P<space>[ \r\t]+)
+    |(?P<operator>(?:(?!:\n|\\\n)[^A-Za-z0-9._ \r\t\n"'\#{}()\[\],])+)
+""", re.VERBOSE)
+
+TYPESCRIPT_TOKENS: Final = re.compile(r"""
+    (?P<string>["'`])
+    |(?P<slash>//)
+    |(?P<star>/\*)
+    |(?P<open>[{(\[])
+    |(?P<close>[})\]])
+    |(?P<newline>\n)
+    |(?P<semicolon>;)
+    |(?P<comma>,)
+    |(?P<word>[A-Za-z0-9._\#]+)
+    |(?P<space>[ \r\t]+)
+    |(?P<operator>(?:(?!//|/\*)[^A-Za-z0-9._\# \r\t\n"'`{}()\[\];,])+)
+""", re.VERBOSE)
+
+CPP_TOKENS: Final = re.compile(r"""
+    (?P<string>["'`])
+    |(?P<slash>//)
+    |(?P<star>/\*)
+    |(?P<open>[{(\[])
+    |(?P<close>[})\]])
+    |(?P<newline>\n)
+    |(?P<semicolon>;)
+    |(?P<comma>,)
+    |(?P<word>[A-Za-z0-9._\#:]+)
+    |(?P<space>[ \r\t]+)
+    |(?P<operator>(?:(?!//|/\*)[^A-Za-z0-9._\#: \r\t\n"'`{}()\[\];,])+)
+""", re.VERBOSE)
+
+
 class TreeNode:
-    nodeType: NodeType
+    __slots__ = ("nodeType", "parentNode", "textData", "childList", "startIndex", "endIndex", "blockIndent")
+    nodeType: int
     parentNode: Self
     textData: str
     childList: list[Self]
@@ -90,7 +183,7 @@ class TreeNode:
     def __init__(
         self,
         parentNode: Self,
-        nodeType: NodeType,
+        nodeType: int,
         textData: str,
         children: list,
         startIndex: int,
@@ -107,40 +200,13 @@ class TreeNode:
         self.blockIndent = blockIndent
 
     def getText(self):
-        result = \
-            'root' if self.nodeType == NodeType.ROOT else \
-            'statement' if self.nodeType == NodeType.ENDSTATEMENT else \
-            'argument' if self.nodeType == NodeType.ARGUMENT else \
-            'comment' if self.nodeType == NodeType.COMMENT else \
-            self.textData if self.nodeType == NodeType.STRING else \
-            'class' if self.nodeType == NodeType.CLASS else \
-            'call' if self.nodeType == NodeType.CALL else \
-            'statement' if self.nodeType == NodeType.STATEMENT else \
-            'wiggly' if self.nodeType == NodeType.BLOCK else \
-            'wiggly' if self.nodeType == NodeType.WIGGLY else \
-            'curly' if self.nodeType == NodeType.CURLY else \
-            'square' if self.nodeType == NodeType.SQUARE else \
-            self.textData if self.textData is not None else \
-            ''
-        return result
+        result = NODE_TEXTS[self.nodeType]
+        if result is not None:
+            return result
+        return self.textData if self.textData is not None else ''
 
     def getShortType(self):
-        return \
-            'rtn' if self.nodeType == NodeType.ROOT else \
-            'est' if self.nodeType == NodeType.ENDSTATEMENT else \
-            'cmt' if self.nodeType == NodeType.COMMENT else \
-            'arg' if self.nodeType == NodeType.ARGUMENT else \
-            'opr' if self.nodeType == NodeType.OPERATOR else \
-            'crl' if self.nodeType == NodeType.CURLY else \
-            'sqr' if self.nodeType == NodeType.SQUARE else \
-            'lvl' if self.nodeType == NodeType.BLOCK else \
-            'wgl' if self.nodeType == NodeType.WIGGLY else \
-            'str' if self.nodeType == NodeType.STRING else \
-            'stm' if self.nodeType == NodeType.STATEMENT else \
-            'wrd' if self.nodeType == NodeType.WORD else \
-            'cll' if self.nodeType == NodeType.CALL else \
-            'cls' if self.nodeType == NodeType.CLASS else \
-            self.nodeType.name
+        return SHORT_TYPES[self.nodeType]
 
     @property
     def children(self) -> list[Self]:
@@ -203,9 +269,12 @@ class PythonParser:
     nodeList: list[list[TreeNode]]
     wordType: int
     currentWord: str
+    extractor: 'SchemaExtractor'
+    lineIndents: dict[int, int]
 
     def __init__(self):
         self.textData = None
+        self.lineIndents = None
         self.lineIndex = 0
         self.pathIndex = 0
         self.pathList = None
@@ -213,9 +282,11 @@ class PythonParser:
         self.wordType = 0
         self.currentWord = None
         self.scene = None
+        self.extractor = None
 
     def parseTree(self, data):
         self.textData = data
+        self.lineIndents = self.getLineIndents()
         self.lineIndex = 0
         self.pathIndex = 0
         self.pathList = [TreeNode(
@@ -232,119 +303,67 @@ class PythonParser:
         self.currentWord = None
         self.is_done = False
 
-        while self.lineIndex < len(self.textData) and not self.is_done:
-            char = self.textData[self.lineIndex]
-            two_char = self.textData[self.lineIndex:self.lineIndex+2]
-            small = ord(char) >= ord('a') and ord(char) <= ord('z')
-            big = ord(char) >= ord('A') and ord(char) <= ord('Z')
-            digit = ord(char) >= ord('0') and ord(char) <= ord('9')
-            is_special = char in ['.', '_', '#']
-            in_scope = self.pathList[self.pathIndex].nodeType == NodeType.WIGGLY or self.pathList[
-                self.pathIndex].nodeType == NodeType.CURLY or self.pathList[self.pathIndex].nodeType == NodeType.SQUARE
-            is_command_end = not in_scope and char == '\n'
-            is_argument_end = in_scope and char == ','
-            command_end_next_indent = self.getBlockIndent(self.lineIndex + 1) if is_command_end else None
-            is_scope_end = False
-            if is_command_end and command_end_next_indent < self.pathList[self.pathIndex].blockIndent:
-                is_scope_end = True
-            start_type = \
-                NodeType.BLOCK if two_char == ':\n' else \
-                NodeType.WIGGLY if char == '{' else \
-                NodeType.CURLY if char == '(' else \
-                NodeType.SQUARE if char == '[' else \
-                None
-            scope_end_char = \
-                '}' if self.pathList[self.pathIndex].nodeType == NodeType.WIGGLY else \
-                ')' if self.pathList[self.pathIndex].nodeType == NodeType.CURLY else \
-                ']' if self.pathList[self.pathIndex].nodeType == NodeType.SQUARE else \
-                None
-            end_type = self.pathList[self.pathIndex].nodeType if scope_end_char is not None and char == scope_end_char else None
+        for kind, startIndex, endIndex, nextIndex, text in tokenize(self.textData, PYTHON_TOKENS):
+            self.lineIndex = startIndex
+            scopeType = self.pathList[self.pathIndex].nodeType
+            in_scope = scopeType == NodeType.WIGGLY or scopeType == NodeType.CURLY or scopeType == NodeType.SQUARE
 
             # Strings
-            if two_char in ['f"', "f'"]:
+            if kind == "string":
                 if self.currentWord is not None:
                     self.addNodeWord()
-                end_chr = two_char[1:]
-                endIndex = self.textData.find(end_chr, self.lineIndex + 2)
-                assert endIndex != -1
-                value = self.textData[self.lineIndex+2:endIndex]
                 self.nodeList[self.pathIndex].append(TreeNode(
                     parentNode=self.pathList[self.pathIndex],
                     nodeType=NodeType.STRING,
-                    textData=value,
+                    textData=text,
                     children=None,
-                    startIndex=self.lineIndex,
+                    startIndex=startIndex,
                     endIndex=endIndex,
                     blockIndent=self.pathList[self.pathIndex].blockIndent
                 ))
-                self.lineIndex = endIndex + 1
-                continue
-            elif char in ['"', "'"]:
-                if self.currentWord is not None:
-                    self.addNodeWord()
-                end_chr = char
-                endIndex = self.textData.find(end_chr, self.lineIndex + 1)
-                assert endIndex != -1
-                value = self.textData[self.lineIndex+1:endIndex]
-                self.nodeList[self.pathIndex].append(TreeNode(
-                    parentNode=self.pathList[self.pathIndex],
-                    nodeType=NodeType.STRING,
-                    textData=value,
-                    children=None,
-                    startIndex=self.lineIndex,
-                    endIndex=endIndex,
-                    blockIndent=self.pathList[self.pathIndex].blockIndent
-                ))
-                self.lineIndex = endIndex + 1
+                self.lineIndex = nextIndex
                 continue
 
             # Comments
-            if char == '#':
+            if kind == "comment":
                 if self.currentWord is not None:
                     self.addNodeWord()
-                endIndex = self.textData.find('\n', self.lineIndex)
-                if endIndex == -1:
-                    self.is_done = True
-                    continue
-                comment = self.textData[self.lineIndex:endIndex]
                 if len(self.nodeList[self.pathIndex]) > 0:
                     self.nodeList[self.pathIndex].append(TreeNode(
                         parentNode=self.pathList[self.pathIndex],
                         nodeType=NodeType.COMMENT,
-                        textData=comment,
+                        textData=text,
                         children=None,
-                        startIndex=self.lineIndex,
+                        startIndex=startIndex,
                         endIndex=endIndex,
                         blockIndent=self.pathList[self.pathIndex].blockIndent,
                     ))
-                else:
+                elif self.extractor is None:
                     self.pathList[self.pathIndex].childList.append(TreeNode(
                         parentNode=self.pathList[self.pathIndex],
                         nodeType=NodeType.COMMENT,
-                        textData=comment,
+                        textData=text,
                         children=None,
-                        startIndex=self.lineIndex,
+                        startIndex=startIndex,
                         endIndex=endIndex,
                         blockIndent=self.pathList[self.pathIndex].blockIndent,
                     ))
-                self.lineIndex = endIndex + 1
+                self.lineIndex = nextIndex
                 continue
 
-            # Newline whitespace
-            elif two_char == '\\\n':
-                # Start word
-                if self.wordType != 1:
-                    if self.currentWord is not None:
-                        self.addNodeWord()
-                    self.wordType = 1
-
-                # Collect words
-                self.currentWord = ' ' if self.currentWord is None else self.currentWord + ' '
-                self.lineIndex += 2
-                continue
+            elif kind == "end":
+                if self.currentWord is not None:
+                    self.addNodeWord()
+                self.is_done = True
+                break
 
             # Scope starts and ends
-            elif start_type is not None:
+            elif kind == "open":
+                start_type = \
+                    NodeType.BLOCK if text == ':\n' else \
+                    NodeType.WIGGLY if text == '{' else \
+                    NodeType.CURLY if text == '(' else \
+                    NodeType.SQUARE
                 if self.currentWord is not None:
                     self.addNodeWord()
                 new_child = TreeNode(
@@ -352,19 +371,19 @@ class PythonParser:
                     nodeType=start_type,
                     textData=None,
                     children=None,
-                    startIndex=self.lineIndex,
+                    startIndex=startIndex,
                     endIndex=None,
-                    blockIndent=self.getBlockIndent(
-                        self.lineIndex + 2) if start_type == NodeType.BLOCK else self.pathList[self.pathIndex].blockIndent
+                    blockIndent=self.getBlockIndent(nextIndex) if start_type == NodeType.BLOCK else self.pathList[self.pathIndex].blockIndent
                 )
                 self.nodeList[self.pathIndex].append(new_child)
                 self.pathIndex = len(self.pathList)
-                self.pathList = [*self.pathList, new_child]
-                self.nodeList = [*self.nodeList, []]
-                self.lineIndex += 2 if start_type == NodeType.BLOCK else 1
+                self.pathList.append(new_child)
+                self.nodeList.append([])
+                self.lineIndex = nextIndex
                 continue
 
-            elif end_type is not None:
+            elif kind == "close" and SCOPE_ENDS.get(scopeType) == text:
+                end_type = scopeType
                 assert len(self.pathList) > 1
                 if self.currentWord is not None:
                     self.addNodeWord()
@@ -372,9 +391,9 @@ class PythonParser:
                     self.addNodeDict(NodeType.ARGUMENT if in_scope else NodeType.STATEMENT)
                 self.pathList[self.pathIndex].endIndex = self.lineIndex
                 self.pathIndex = len(self.pathList) - 2
-                self.pathList = self.pathList[0:-1]
-                self.nodeList = self.nodeList[0:-1]
-                self.lineIndex += 1
+                self.pathList.pop()
+                self.nodeList.pop()
+                self.lineIndex = nextIndex
                 if end_type == NodeType.WIGGLY:
                     statement_type = \
                         NodeType.CLASS if end_type == NodeType.WIGGLY else \
@@ -386,19 +405,31 @@ class PythonParser:
                         self.addNodeDict(statement_type)
                 continue
 
-            elif is_scope_end:
+            elif kind == "newline" and not in_scope:
+                command_end_next_indent = self.getBlockIndent(nextIndex)
+
+                # Statement end
+                if command_end_next_indent >= self.pathList[self.pathIndex].blockIndent:
+                    if self.currentWord is not None:
+                        self.addNodeWord()
+                    if self.nodeList[self.pathIndex]:
+                        self.addNodeDict(NodeType.ARGUMENT if in_scope else NodeType.STATEMENT)
+                    self.lineIndex = nextIndex
+                    continue
+
+                # Scope end
                 if self.currentWord is not None:
                     self.addNodeWord()
                 if self.nodeList[self.pathIndex]:
                     self.addNodeDict(NodeType.ARGUMENT if in_scope else NodeType.STATEMENT)
-                self.lineIndex += 1
+                self.lineIndex = nextIndex
 
                 while True:
                     assert len(self.pathList) > 1
                     self.pathList[self.pathIndex].endIndex = self.lineIndex
                     self.pathIndex = len(self.pathList) - 2
-                    self.pathList = self.pathList[0:-1]
-                    self.nodeList = self.nodeList[0:-1]
+                    self.pathList.pop()
+                    self.nodeList.pop()
                     if self.pathList[self.pathIndex].blockIndent <= command_end_next_indent:
                         break
                     in_scope = self.pathList[self.pathIndex].nodeType == NodeType.WIGGLY or self.pathList[
@@ -410,34 +441,27 @@ class PythonParser:
 
                 continue
 
-            # Statement and argument end
-            elif is_command_end:
-                if self.currentWord is not None:
-                    self.addNodeWord()
-                if self.nodeList[self.pathIndex]:
-                    self.addNodeDict(NodeType.ARGUMENT if in_scope else NodeType.STATEMENT)
-                self.lineIndex += 1
-                continue
-
             # End of statements
-            elif is_argument_end:
+            elif kind == "comma" and in_scope:
                 if self.currentWord is not None:
                     self.addNodeWord()
                 if self.nodeList[self.pathIndex]:
                     self.addNodeDict(NodeType.ARGUMENT)
-                self.lineIndex += 1
+                self.lineIndex = nextIndex
                 continue
 
-            # Start word
-            wordType = 1 if char in [' ', '\r', '\n', '\t'] else 2 if small or big or digit or is_special else 3
+            # Start word, unmatched brackets and commas are operators, line joins a single space
+            wordType = 2 if kind == "word" else 1 if kind == "space" or kind == "newline" or kind == "join" else 3
             if self.wordType != wordType:
                 if self.currentWord is not None:
                     self.addNodeWord()
                 self.wordType = wordType
 
             # Collect words
-            self.currentWord = char if self.currentWord is None else self.currentWord + char
-            self.lineIndex += 1
+            if kind == "join":
+                text = ' '
+            self.currentWord = text if self.currentWord is None else self.currentWord + text
+            self.lineIndex = nextIndex
 
         assert self.pathIndex == len(self.pathList) - 1
         while len(self.pathList) > 1:
@@ -447,8 +471,8 @@ class PythonParser:
                 self.addNodeDict(NodeType.ENDSTATEMENT)
             assert len(self.pathList) > 1
             self.pathIndex = len(self.pathList) - 2
-            self.pathList = self.pathList[0:-1]
-            self.nodeList = self.nodeList[0:-1]
+            self.pathList.pop()
+            self.nodeList.pop()
 
         assert self.pathIndex == len(self.pathList) - 1
         assert len(self.pathList) == 1
@@ -480,7 +504,8 @@ class PythonParser:
         )
         for item in new_child.childList:
             item.parentNode = item
-        self.pathList[self.pathIndex].childList.append(new_child)
+        if self.extractor is None or self.extractor.addStatement(self, new_child):
+            self.pathList[self.pathIndex].childList.append(new_child)
         self.nodeList[self.pathIndex] = []
 
     def addNodeWord(self):
@@ -503,39 +528,21 @@ class PythonParser:
         self.currentWord = None
 
     def getBlockIndent(self, lineIndex):
-        stepped = 0
-        total = 0
-        while lineIndex + stepped < len(self.textData):
-            if self.textData[lineIndex + stepped] == '#':
-                while lineIndex + stepped < len(self.textData):
-                    if self.textData[lineIndex + stepped] == '\n':
-                        stepped += 1
-                        break
-                    stepped += 1
-                total = 0
-                continue
-
-            elif self.textData[lineIndex + stepped] == '\n':
-                stepped += 1
-                total = 0
-                continue
-
-            elif self.textData[lineIndex + stepped] == '\t':
-                total += 1
-                stepped += 1
-                continue
-
-            elif self.textData[lineIndex + stepped] == ' ':
-                total += 1
-                stepped += 1
-                continue
-
-            break
-
-        if lineIndex + stepped < len(self.textData):
-            return total
-
-        return 0
+        return self.lineIndents[lineIndex]
+
+    def getLineIndents(self):
+        # Indent of the next significant line for every line start, blank and comment lines are skipped
+        result = {}
+        lines = self.textData.split('\n')
+        lineIndex = len(self.textData) + 1
+        indent = 0
+        for line in reversed(lines):
+            lineIndex -= len(line) + 1
+            text = line.lstrip(' \t')
+            if text and text[0] != '#':
+                indent = len(line) - len(text)
+            result[lineIndex] = indent
+        return result
 
 
 class TypescriptParser:
@@ -546,6 +553,7 @@ class TypescriptParser:
     nodeList: list[list[TreeNode]]
     wordType: int
     currentWord: str
+    extractor: 'SchemaExtractor'
 
     def __init__(self):
         self.textData = None
@@ -556,6 +564,7 @@ class TypescriptParser:
         self.wordType = 0
         self.currentWord = None
         self.scene = None
+        self.extractor = None
 
     def parseTree(self, data):
         self.textData = data
@@ -575,40 +584,21 @@ class TypescriptParser:
         self.currentWord = None
         self.is_done = False
 
-        while self.lineIndex < len(self.textData) and not self.is_done:
-            char = self.textData[self.lineIndex]
-            two_char = self.textData[self.lineIndex:self.lineIndex+2]
-            small = ord(char) >= ord('a') and ord(char) <= ord('z')
-            big = ord(char) >= ord('A') and ord(char) <= ord('Z')
-            digit = ord(char) >= ord('0') and ord(char) <= ord('9')
-            is_special = char in ['.', '_', '#']
-            in_scope2 = self.pathList[self.pathIndex].nodeType == NodeType.WIGGLY or self.pathList[
-                self.pathIndex].nodeType == NodeType.CURLY or self.pathList[self.pathIndex].nodeType == NodeType.SQUARE
-            in_scope = self.pathList[
-                self.pathIndex].nodeType == NodeType.CURLY or self.pathList[self.pathIndex].nodeType == NodeType.SQUARE
-            is_command_end = char == ';'
-            is_argument_end = in_scope2 and char == ','
-            start_type = \
-                NodeType.WIGGLY if char == '{' else \
-                NodeType.CURLY if char == '(' else \
-                NodeType.SQUARE if char == '[' else \
-                None
-            scope_end_char = \
-                '}' if self.pathList[self.pathIndex].nodeType == NodeType.WIGGLY else \
-                ')' if self.pathList[self.pathIndex].nodeType == NodeType.CURLY else \
-                ']' if self.pathList[self.pathIndex].nodeType == NodeType.SQUARE else \
-                None
-            end_type = self.pathList[self.pathIndex].nodeType if scope_end_char is not None and char == scope_end_char else None
+        for kind, startIndex, endIndex, nextIndex, text in tokenize(self.textData, TYPESCRIPT_TOKENS):
+            self.lineIndex = startIndex
+            scopeType = self.pathList[self.pathIndex].nodeType
+            in_scope2 = scopeType == NodeType.WIGGLY or scopeType == NodeType.CURLY or scopeType == NodeType.SQUARE
+            in_scope = scopeType == NodeType.CURLY or scopeType == NodeType.SQUARE
             is_include_end = \
+                kind == "newline" and \
                 len(self.nodeList[self.pathIndex]) > 0 and \
                 self.nodeList[self.pathIndex][0].nodeType == NodeType.WORD and \
                 self.nodeList[self.pathIndex][0].textData == 'import' and \
-                len(self.nodeList[self.pathIndex]) == 4 and \
-                char == '\n'
+                len(self.nodeList[self.pathIndex]) == 4
             is_field_end = \
+                kind == "newline" and \
                 len(self.nodeList[self.pathIndex]) >= 2 and \
-                self.nodeList[self.pathIndex][1].getText() == ":" and \
-                char == '\n'
+                self.nodeList[self.pathIndex][1].getText() == ":"
 
             # Include end
             if is_include_end:
@@ -616,63 +606,64 @@ class TypescriptParser:
                     self.addNodeWord()
                 if self.nodeList[self.pathIndex]:
                     self.addNodeDict(NodeType.ARGUMENT if in_scope else NodeType.STATEMENT)
-                self.lineIndex += 1
+                self.lineIndex = nextIndex
                 continue
 
             # Strings
-            if char in ['"', "'", "`"]:
+            if kind == "string":
                 if self.currentWord is not None:
                     self.addNodeWord()
-                end_chr = char
-                endIndex = self.textData.find(end_chr, self.lineIndex + 1)
-                assert endIndex != -1
-                value = self.textData[self.lineIndex+1:endIndex]
                 self.nodeList[self.pathIndex].append(TreeNode(
                     parentNode=self.pathList[self.pathIndex],
                     nodeType=NodeType.STRING,
-                    textData=value,
+                    textData=text,
                     children=None,
-                    startIndex=self.lineIndex,
+                    startIndex=startIndex,
                     endIndex=endIndex,
                     blockIndent=self.pathList[self.pathIndex].blockIndent
                 ))
-                self.lineIndex = endIndex + 1
+                self.lineIndex = nextIndex
                 continue
 
             # Comments
-            if two_char in ['//', '/*']:
+            if kind == "comment":
                 if self.currentWord is not None:
                     self.addNodeWord()
-                endIndex = self.textData.find('\n' if two_char == '//' else '*/', self.lineIndex)
-                if endIndex == -1:
-                    self.is_done = True
-                    continue
-                comment = self.textData[self.lineIndex:endIndex]
                 if len(self.nodeList[self.pathIndex]) > 0:
                     self.nodeList[self.pathIndex].append(TreeNode(
                         parentNode=self.pathList[self.pathIndex],
                         nodeType=NodeType.COMMENT,
-                        textData=comment,
+                        textData=text,
                         children=None,
-                        startIndex=self.lineIndex,
+                        startIndex=startIndex,
                         endIndex=endIndex,
                         blockIndent=self.pathList[self.pathIndex].blockIndent,
                     ))
-                else:
+                elif self.extractor is None:
                     self.pathList[self.pathIndex].childList.append(TreeNode(
                         parentNode=self.pathList[self.pathIndex],
                         nodeType=NodeType.COMMENT,
-                        textData=comment,
+                        textData=text,
                         children=None,
-                        startIndex=self.lineIndex,
+                        startIndex=startIndex,
                         endIndex=endIndex,
                         blockIndent=self.pathList[self.pathIndex].blockIndent,
                     ))
-                self.lineIndex = endIndex + 2
+                self.lineIndex = nextIndex
                 continue
 
+            elif kind == "end":
+                if self.currentWord is not None:
+                    self.addNodeWord()
+                self.is_done = True
+                break
+
             # Scope starts and ends
-            if start_type is not None:
+            if kind == "open":
+                start_type = \
+                    NodeType.WIGGLY if text == '{' else \
+                    NodeType.CURLY if text == '(' else \
+                    NodeType.SQUARE
                 if self.currentWord is not None:
                     self.addNodeWord()
                 new_child = TreeNode(
@@ -680,18 +671,19 @@ class TypescriptParser:
                     nodeType=start_type,
                     textData=None,
                     children=None,
-                    startIndex=self.lineIndex,
+                    startIndex=startIndex,
                     endIndex=None,
                     blockIndent=0,
                 )
                 self.nodeList[self.pathIndex].append(new_child)
                 self.pathIndex = len(self.pathList)
-                self.pathList = [*self.pathList, new_child]
-                self.nodeList = [*self.nodeList, []]
-                self.lineIndex += 2 if start_type == NodeType.BLOCK else 1
+                self.pathList.append(new_child)
+                self.nodeList.append([])
+                self.lineIndex = nextIndex
                 continue
 
-            elif end_type is not None:
+            elif kind == "close" and SCOPE_ENDS.get(scopeType) == text:
+                end_type = scopeType
                 assert len(self.pathList) > 1
                 if self.currentWord is not None:
                     self.addNodeWord()
@@ -699,9 +691,9 @@ class TypescriptParser:
                     self.addNodeDict(NodeType.ARGUMENT if in_scope else NodeType.STATEMENT)
                 self.pathList[self.pathIndex].endIndex = self.lineIndex
                 self.pathIndex = len(self.pathList) - 2
-                self.pathList = self.pathList[0:-1]
-                self.nodeList = self.nodeList[0:-1]
-                self.lineIndex += 1
+                self.pathList.pop()
+                self.nodeList.pop()
+                self.lineIndex = nextIndex
                 # includes are 4-item long statements
                 if end_type == NodeType.WIGGLY and len(self.nodeList[self.pathIndex]) == 2 and \
                         self.nodeList[self.pathIndex][0].getText() == "import":
@@ -731,36 +723,36 @@ class TypescriptParser:
                     self.addNodeWord()
                 if self.nodeList[self.pathIndex]:
                     self.addNodeDict(NodeType.STATEMENT)
-                self.lineIndex += 1
+                self.lineIndex = nextIndex
                 continue
 
-            elif is_command_end:
+            elif kind == "semicolon":
                 if self.currentWord is not None:
                     self.addNodeWord()
                 if self.nodeList[self.pathIndex]:
                     self.addNodeDict(NodeType.ARGUMENT if in_scope else NodeType.STATEMENT)
-                self.lineIndex += 1
+                self.lineIndex = nextIndex
                 continue
 
             # End of statements
-            elif is_argument_end:
+            elif kind == "comma" and in_scope2:
                 if self.currentWord is not None:
                     self.addNodeWord()
                 if self.nodeList[self.pathIndex]:
                     self.addNodeDict(NodeType.ARGUMENT)
-                self.lineIndex += 1
+                self.lineIndex = nextIndex
                 continue
 
-            # Start word
-            wordType = 1 if char in [' ', '\r', '\n', '\t'] else 2 if small or big or digit or is_special else 3
+            # Start word, unmatched brackets and commas are operators
+            wordType = 2 if kind == "word" else 1 if kind == "space" or kind == "newline" else 3
             if self.wordType != wordType:
                 if self.currentWord is not None:
                     self.addNodeWord()
                 self.wordType = wordType
 
             # Collect words
-            self.currentWord = char if self.currentWord is None else self.currentWord + char
-            self.lineIndex += 1
+            self.currentWord = text if self.currentWord is None else self.currentWord + text
+            self.lineIndex = nextIndex
 
         assert self.pathIndex == len(self.pathList) - 1
         while len(self.pathList) > 1:
@@ -770,8 +762,8 @@ class TypescriptParser:
                 self.addNodeDict(NodeType.ENDSTATEMENT)
             assert len(self.pathList) > 1
             self.pathIndex = len(self.pathList) - 2
-            self.pathList = self.pathList[0:-1]
-            self.nodeList = self.nodeList[0:-1]
+            self.pathList.pop()
+            self.nodeList.pop()
 
         assert self.pathIndex == len(self.pathList) - 1
         assert len(self.pathList) == 1
@@ -803,7 +795,8 @@ class TypescriptParser:
         )
         for item in new_child.childList:
             item.parentNode = item
-        self.pathList[self.pathIndex].childList.append(new_child)
+        if self.extractor is None or self.extractor.addStatement(self, new_child):
+            self.pathList[self.pathIndex].childList.append(new_child)
         self.nodeList[self.pathIndex] = []
 
     def addNodeWord(self):
@@ -834,6 +827,7 @@ class CppParser:
     nodeList: list[list[TreeNode]]
     wordType: int
     currentWord: str
+    extractor: 'SchemaExtractor'
 
     def __init__(self):
         self.textData = None
@@ -844,6 +838,7 @@ class CppParser:
         self.wordType = 0
         self.currentWord = None
         self.scene = None
+        self.extractor = None
 
     def parseTree(self, data):
         self.textData = data
@@ -863,44 +858,20 @@ class CppParser:
         self.currentWord = None
         self.is_done = False
 
-        while self.lineIndex < len(self.textData) and not self.is_done:
-            char = self.textData[self.lineIndex]
-            two_char = self.textData[self.lineIndex:self.lineIndex+2]
-            small = ord(char) >= ord('a') and ord(char) <= ord('z')
-            big = ord(char) >= ord('A') and ord(char) <= ord('Z')
-            digit = ord(char) >= ord('0') and ord(char) <= ord('9')
-            is_special = char in ['.', '_', '#', ':']
-            in_scope2 = self.pathList[self.pathIndex].nodeType == NodeType.WIGGLY or self.pathList[
-                self.pathIndex].nodeType == NodeType.CURLY or self.pathList[self.pathIndex].nodeType == NodeType.SQUARE
-            in_scope = self.pathList[
-                self.pathIndex].nodeType == NodeType.CURLY or self.pathList[self.pathIndex].nodeType == NodeType.SQUARE
-            is_command_end = char == ';'
-            is_argument_end = in_scope2 and char == ','
-            start_type = \
-                NodeType.WIGGLY if char == '{' else \
-                NodeType.CURLY if char == '(' else \
-                NodeType.SQUARE if char == '[' else \
-                None
-            scope_end_char = \
-                '}' if self.pathList[self.pathIndex].nodeType == NodeType.WIGGLY else \
-                ')' if self.pathList[self.pathIndex].nodeType == NodeType.CURLY else \
-                ']' if self.pathList[self.pathIndex].nodeType == NodeType.SQUARE else \
-                None
-            end_type = self.pathList[self.pathIndex].nodeType if scope_end_char is not None and char == scope_end_char else None
+        for kind, startIndex, endIndex, nextIndex, text in tokenize(self.textData, CPP_TOKENS):
+            self.lineIndex = startIndex
+            scopeType = self.pathList[self.pathIndex].nodeType
+            in_scope2 = scopeType == NodeType.WIGGLY or scopeType == NodeType.CURLY or scopeType == NodeType.SQUARE
+            in_scope = scopeType == NodeType.CURLY or scopeType == NodeType.SQUARE
             is_include_end = \
+                kind == "newline" and \
                 len(self.nodeList[self.pathIndex]) > 0 and \
                 self.nodeList[self.pathIndex][0].nodeType == NodeType.WORD and \
-                self.nodeList[self.pathIndex][0].textData == '#include' and \
-                char == '\n'
-            is_include_end |= \
-                len(self.nodeList[self.pathIndex]) > 0 and \
-                self.nodeList[self.pathIndex][0].nodeType == NodeType.WORD and \
-                self.nodeList[self.pathIndex][0].textData == '#pragma' and \
-                char == '\n'
+                self.nodeList[self.pathIndex][0].textData in ['#include', '#pragma']
             is_field_end = \
+                kind == "newline" and \
                 len(self.nodeList[self.pathIndex]) >= 2 and \
-                self.nodeList[self.pathIndex][1].getText() == ":" and \
-                char == '\n'
+                self.nodeList[self.pathIndex][1].getText() == ":"
 
             # Include end
             if is_include_end:
@@ -908,63 +879,64 @@ class CppParser:
                     self.addNodeWord()
                 if self.nodeList[self.pathIndex]:
                     self.addNodeDict(NodeType.ARGUMENT if in_scope else NodeType.STATEMENT)
-                self.lineIndex += 1
+                self.lineIndex = nextIndex
                 continue
 
             # Strings
-            if char in ['"', "'", "`"]:
+            if kind == "string":
                 if self.currentWord is not None:
                     self.addNodeWord()
-                end_chr = char
-                endIndex = self.textData.find(end_chr, self.lineIndex + 1)
-                assert endIndex != -1
-                value = self.textData[self.lineIndex+1:endIndex]
                 self.nodeList[self.pathIndex].append(TreeNode(
                     parentNode=self.pathList[self.pathIndex],
                     nodeType=NodeType.STRING,
-                    textData=value,
+                    textData=text,
                     children=None,
-                    startIndex=self.lineIndex,
+                    startIndex=startIndex,
                     endIndex=endIndex,
                     blockIndent=self.pathList[self.pathIndex].blockIndent
                 ))
-                self.lineIndex = endIndex + 1
+                self.lineIndex = nextIndex
                 continue
 
             # Comments
-            if two_char in ['//', '/*']:
+            if kind == "comment":
                 if self.currentWord is not None:
                     self.addNodeWord()
-                endIndex = self.textData.find('\n' if two_char == '//' else '*/', self.lineIndex)
-                if endIndex == -1:
-                    self.is_done = True
-                    continue
-                comment = self.textData[self.lineIndex:endIndex]
                 if len(self.nodeList[self.pathIndex]) > 0:
                     self.nodeList[self.pathIndex].append(TreeNode(
                         parentNode=self.pathList[self.pathIndex],
                         nodeType=NodeType.COMMENT,
-                        textData=comment,
+                        textData=text,
                         children=None,
-                        startIndex=self.lineIndex,
+                        startIndex=startIndex,
                         endIndex=endIndex,
                         blockIndent=self.pathList[self.pathIndex].blockIndent,
                     ))
-                else:
+                elif self.extractor is None:
                     self.pathList[self.pathIndex].childList.append(TreeNode(
                         parentNode=self.pathList[self.pathIndex],
                         nodeType=NodeType.COMMENT,
-                        textData=comment,
+                        textData=text,
                         children=None,
-                        startIndex=self.lineIndex,
+                        startIndex=startIndex,
                         endIndex=endIndex,
                         blockIndent=self.pathList[self.pathIndex].blockIndent,
                     ))
-                self.lineIndex = endIndex + 2
+                self.lineIndex = nextIndex
                 continue
 
+            elif kind == "end":
+                if self.currentWord is not None:
+                    self.addNodeWord()
+                self.is_done = True
+                break
+
             # Scope starts and ends
-            if start_type is not None:
+            if kind == "open":
+                start_type = \
+                    NodeType.WIGGLY if text == '{' else \
+                    NodeType.CURLY if text == '(' else \
+                    NodeType.SQUARE
                 if self.currentWord is not None:
                     self.addNodeWord()
                 new_child = TreeNode(
@@ -972,18 +944,19 @@ class CppParser:
                     nodeType=start_type,
                     textData=None,
                     children=None,
-                    startIndex=self.lineIndex,
+                    startIndex=startIndex,
                     endIndex=None,
                     blockIndent=0,
                 )
                 self.nodeList[self.pathIndex].append(new_child)
                 self.pathIndex = len(self.pathList)
-                self.pathList = [*self.pathList, new_child]
-                self.nodeList = [*self.nodeList, []]
-                self.lineIndex += 2 if start_type == NodeType.BLOCK else 1
+                self.pathList.append(new_child)
+                self.nodeList.append([])
+                self.lineIndex = nextIndex
                 continue
 
-            elif end_type is not None:
+            elif kind == "close" and SCOPE_ENDS.get(scopeType) == text:
+                end_type = scopeType
                 assert len(self.pathList) > 1
                 if self.currentWord is not None:
                     self.addNodeWord()
@@ -991,9 +964,9 @@ class CppParser:
                     self.addNodeDict(NodeType.ARGUMENT if in_scope else NodeType.STATEMENT)
                 self.pathList[self.pathIndex].endIndex = self.lineIndex
                 self.pathIndex = len(self.pathList) - 2
-                self.pathList = self.pathList[0:-1]
-                self.nodeList = self.nodeList[0:-1]
-                self.lineIndex += 1
+                self.pathList.pop()
+                self.nodeList.pop()
+                self.lineIndex = nextIndex
                 # includes are 4-item long statements
                 if end_type == NodeType.WIGGLY and len(self.nodeList[self.pathIndex]) == 2 and \
                         self.nodeList[self.pathIndex][0].getText() == "import":
@@ -1023,36 +996,36 @@ class CppParser:
                     self.addNodeWord()
                 if self.nodeList[self.pathIndex]:
                     self.addNodeDict(NodeType.STATEMENT)
-                self.lineIndex += 1
+                self.lineIndex = nextIndex
                 continue
 
-            elif is_command_end:
+            elif kind == "semicolon":
                 if self.currentWord is not None:
                     self.addNodeWord()
                 if self.nodeList[self.pathIndex]:
                     self.addNodeDict(NodeType.ARGUMENT if in_scope else NodeType.STATEMENT)
-                self.lineIndex += 1
+                self.lineIndex = nextIndex
                 continue
 
             # End of statements
-            elif is_argument_end:
+            elif kind == "comma" and in_scope2:
                 if self.currentWord is not None:
                     self.addNodeWord()
                 if self.nodeList[self.pathIndex]:
                     self.addNodeDict(NodeType.ARGUMENT)
-                self.lineIndex += 1
+                self.lineIndex = nextIndex
                 continue
 
-            # Start word
-            wordType = 1 if char in [' ', '\r', '\n', '\t'] else 2 if small or big or digit or is_special else 3
+            # Start word, unmatched brackets and commas are operators
+            wordType = 2 if kind == "word" else 1 if kind == "space" or kind == "newline" else 3
             if self.wordType != wordType:
                 if self.currentWord is not None:
                     self.addNodeWord()
                 self.wordType = wordType
 
             # Collect words
-            self.currentWord = char if self.currentWord is None else self.currentWord + char
-            self.lineIndex += 1
+            self.currentWord = text if self.currentWord is None else self.currentWord + text
+            self.lineIndex = nextIndex
 
         assert self.pathIndex == len(self.pathList) - 1
         while len(self.pathList) > 1:
@@ -1062,8 +1035,8 @@ class CppParser:
                 self.addNodeDict(NodeType.ENDSTATEMENT)
             assert len(self.pathList) > 1
             self.pathIndex = len(self.pathList) - 2
-            self.pathList = self.pathList[0:-1]
-            self.nodeList = self.nodeList[0:-1]
+            self.pathList.pop()
+            self.nodeList.pop()
 
         assert self.pathIndex == len(self.pathList) - 1
         assert len(self.pathList) == 1
@@ -1095,7 +1068,8 @@ class CppParser:
         )
         for item in new_child.childList:
             item.parentNode = item
-        self.pathList[self.pathIndex].childList.append(new_child)
+        if self.extractor is None or self.extractor.addStatement(self, new_child):
+            self.pathList[self.pathIndex].childList.append(new_child)
         self.nodeList[self.pathIndex] = []
 
     def addNodeWord(self):
@@ -1118,6 +1092,170 @@ class CppParser:
         self.currentWord = None
 
 
+class SchemaExtractor:
+    isCpp: bool
+    result: list[dict]
+    classScope: TreeNode
+    className: str
+    members: list[dict]
+    error: Exception
+
+    def __init__(self, isCpp):
+        self.isCpp = isCpp
+        self.result = []
+        self.classScope = None
+        self.className = None
+        self.members = []
+        self.error = None
+
+    def addStatement(self, parser, node):
+        # Member arguments are kept until their member is matched, deeper scopes are never matched
+        if parser.pathIndex >= 2:
+            return parser.pathIndex == 2
+
+        # Members are matched when they end, under the class their top level statement started
+        if parser.pathIndex == 1:
+            if parser.pathList[1] is not self.classScope:
+                self.classScope = parser.pathList[1]
+                self.className = matchClass(TreeNode(None, NodeType.STATEMENT, None, parser.nodeList[0], 0, 0, 0))
+                self.members = []
+                self.error = None
+            if self.className and not self.error:
+                try:
+                    self.members.extend(matchMembers(self.className, node, self.isCpp))
+                except Exception as ex:
+                    self.error = ex
+            return False
+
+        # Members count once the whole top level statement is a class declaration
+        if self.classScope is not None and node.childList[-1] is self.classScope and matchClass(node):
+            if self.error:
+                raise self.error
+            self.result.extend(self.members)
+        self.classScope = None
+        self.className = None
+        self.members = []
+        self.error = None
+        return False
+
+
+def tokenize(textData, pattern):
+    index = 0
+    size = len(textData)
+    while index < size:
+        match = pattern.match(textData, index)
+        kind = match.lastgroup
+
+        # Strings end at the next quote, escapes are not recognized
+        if kind == "string" or kind == "fstring":
+            valueIndex = match.end()
+            endIndex = textData.find(textData[valueIndex - 1], valueIndex)
+            assert endIndex != -1
+            yield "string", index, endIndex, endIndex + 1, textData[valueIndex:endIndex]
+            index = endIndex + 1
+
+        # Comments end at the next line or block end, an unterminated comment ends the text
+        elif kind == "hash" or kind == "slash" or kind == "star":
+            endIndex = textData.find('*/' if kind == "star" else '\n', index)
+            if endIndex == -1:
+                yield "end", index, index, index, None
+                return
+            nextIndex = endIndex + 1 if kind == "hash" else endIndex + 2
+            yield "comment", index, endIndex, nextIndex, textData[index:endIndex]
+            index = nextIndex
+
+        else:
+            yield kind, index, match.end(), match.end(), match.group()
+            index = match.end()
+
+
+def matchClass(item):
+    matched1 = (
+        item.getParams(["statement", "class", "*", "wiggly"]) or
+        item.getParams(["statement", "export", "class", "*", "wiggly"]) or
+        item.getParams(["statement", "export", "abstract", "class", "*", "wiggly"])
+    )
+    if not matched1:
+        return None
+    assert len(matched1) == 1
+    return matched1[0]
+
+
+def matchMembers(class_name, item2, isCpp):
+    result = []
+
+    def getType(text):
+        return TYPE_MAP.get(text, text)
+
+    matched1 = (
+        item2.getParams(["statement", "public:", "*", "*"]) or
+        item2.getParams(["statement", "*", "*"])
+    )
+    if isCpp and matched1:
+        result.append({
+            "className": class_name,
+            "fieldName": matched1[1],
+            "fieldType": getType(matched1[0]),
+            "idNumber": -1
+        })
+    matched1b = (
+        item2.getParams(["statement", "public:", "virtual", "*", "*", "curly", "=", "0"]) or
+        item2.getParams(["statement", "virtual", "*", "*", "curly", "=", "0"])
+    )
+    matched1b2 = (
+        None if not matched1b else
+        item2.childList[3].childList[0].getParams(['argument', '*', '*']) if item2.childList[3].nodeType == NodeType.CURLY else
+        item2.childList[4].childList[0].getParams(['argument', '*', '*']) if item2.childList[4].nodeType == NodeType.CURLY else
+        None
+    )
+    if isCpp and matched1b and matched1b2:
+        result.append({
+            "className": class_name,
+            "methodName": matched1b[1],
+            "methodRequest": getType(matched1b2[0]),
+            "methodResponse": getType(matched1b[0]),
+            "idNumber": -1
+        })
+    matched2 = (
+        item2.getParams(["statement", "*", ":", "*"])
+    )
+    if matched2:
+        result.append({
+            "className": class_name,
+            "fieldName": matched2[0],
+            "fieldType": getType(matched2[1]),
+            "idNumber": -1
+        })
+    matched3 = item2.getParams(["statement", "abstract", "*", "curly", ":", "Promise", "<", "*", ">"])
+    matched4 = item2.childList[2].children[0].getParams(
+        ["argument", "*", ":", "*"]) if matched3 else None
+    if matched3 and matched4:
+        result.append({
+            "className": class_name,
+            "methodName": matched3[0],
+            "methodRequest": getType(matched4[1]),
+            "methodResponse": getType(matched3[1]),
+            "idNumber": -1
+        })
+
+    matched5 = item2.getParams(['statement', 'def', '*', 'curly', '->', '*', ':', '...'])
+    if matched5 and item2.childList[2].childList[0].getParams(["argument", "*"]) != ["self"]:
+        raise RuntimeError(f"Missing self argument in: {class_name}.{matched5[0]}")
+    matched6 = item2.childList[2].childList[1].getParams(
+        ['argument', '*', ':', '*']) if matched5 else None
+    if matched5 and not matched6:
+        raise RuntimeError(f"Missing two arguments and a type: {matched5}")
+    if matched5 and matched6:
+        result.append({
+            "className": class_name,
+            "methodName": matched5[0],
+            "methodRequest": getType(matched6[1]),
+            "methodResponse": getType(matched5[1]),
+            "idNumber": -1
+        })
+    return result
+
+
 def parseSchemaScene(file):
     result = []
     data = open(file, 'rt').read()
@@ -1127,113 +1265,71 @@ def parseSchemaScene(file):
     p = TypescriptParser() if isTs else PythonParser() if isPy else CppParser()
     p.parseTree(data)
     scene = p.scene
-    typeMap = {
-        "std::string": "str",
-        "string": "str",
-        "nlohmann::json": "dict",
-        "json": "dict",
-        "boolean": "bool",
-        "object": "dict",
-        "Object": "dict",
-        "any": "dict",
-        "list": "list",
-        "Array": "list",
-        "unknown": "dict",
-    }
-
-    def getType(text):
-        return typeMap.get(text, text)
 
     for item in scene.children:
-        matched1 = (
-            item.getParams(["statement", "class", "*", "wiggly"]) or
-            item.getParams(["statement", "export", "class", "*", "wiggly"]) or
-            item.getParams(["statement", "export", "abstract", "class", "*", "wiggly"])
-        )
-
-        if matched1:
-            assert len(matched1) == 1
-            class_name = matched1[0]
+        class_name = matchClass(item)
+        if class_name:
             for item2 in item.children[len(item.children) - 1].children:
-                matched1 = (
-                    item2.getParams(["statement", "public:", "*", "*"]) or
-                    item2.getParams(["statement", "*", "*"])
-                )
-                if isCpp and matched1:
-                    result.append({
-                        "className": class_name,
-                        "fieldName": matched1[1],
-                        "fieldType": getType(matched1[0]),
-                        "idNumber": -1
-                    })
-                matched1b = (
-                    item2.getParams(["statement", "public:", "virtual", "*", "*", "curly", "=", "0"]) or
-                    item2.getParams(["statement", "virtual", "*", "*", "curly", "=", "0"])
-                )
-                matched1b2 = (
-                    None if not matched1b else
-                    item2.childList[3].childList[0].getParams(['argument', '*', '*']) if item2.childList[3].nodeType == NodeType.CURLY else
-                    item2.childList[4].childList[0].getParams(['argument', '*', '*']) if item2.childList[4].nodeType == NodeType.CURLY else
-                    None
-                )
-                if isCpp and matched1b and matched1b2:
-                    result.append({
-                        "className": class_name,
-                        "methodName": matched1b[1],
-                        "methodRequest": getType(matched1b2[0]),
-                        "methodResponse": getType(matched1b[0]),
-                        "idNumber": -1
-                    })
-                matched2 = (
-                    item2.getParams(["statement", "*", ":", "*"])
-                )
-                if matched2:
-                    result.append({
-                        "className": class_name,
-                        "fieldName": matched2[0],
-                        "fieldType": getType(matched2[1]),
-                        "idNumber": -1
-                    })
-                matched3 = item2.getParams(["statement", "abstract", "*", "curly", ":", "Promise", "<", "*", ">"])
-                matched4 = item2.childList[2].children[0].getParams(
-                    ["argument", "*", ":", "*"]) if matched3 else None
-                if matched3 and matched4:
-                    result.append({
-                        "className": class_name,
-                        "methodName": matched3[0],
-                        "methodRequest": getType(matched4[1]),
-                        "methodResponse": getType(matched3[1]),
-                        "idNumber": -1
-                    })
-
-                matched5 = item2.getParams(['statement', 'def', '*', 'curly', '->', '*', ':', '...'])
-                if matched5 and item2.childList[2].childList[0].getParams(["argument", "*"]) != ["self"]:
-                    raise RuntimeError(f"Missing self argument in: {class_name}.{matched5[0]}")
-                matched6 = item2.childList[2].childList[1].getParams(
-                    ['argument', '*', ':', '*']) if matched5 else None
-                if matched5 and not matched6:
-                    raise RuntimeError(f"Missing two arguments and a type: {matched5}")
-                if matched5 and matched6:
-                    result.append({
-                        "className": class_name,
-                        "methodName": matched5[0],
-                        "methodRequest": getType(matched6[1]),
-                        "methodResponse": getType(matched5[1]),
-                        "idNumber": -1
-                    })
+                result.extend(matchMembers(class_name, item2, isCpp))
 
     return result, scene
 
 
 def parseSchemaList(file):
-    result, _ = parseSchemaScene(file)
-    return result
+    data = open(file, 'rt').read()
+    isPy = file.endswith('.py')
+    isTs = file.endswith('.ts')
+    isCpp = file.endswith('.h') or file.endswith('.hpp')
+    p = TypescriptParser() if isTs else PythonParser() if isPy else CppParser()
+    p.extractor = SchemaExtractor(isCpp)
+    p.parseTree(data)
+    return p.extractor.result
+
+
+def serveSchemaLists(input, output):
+    # One JSON request per line, results are kept while files keep their size and modification time,
+    # every request line gets a response line, malformed ones included
+    cache = {}
+    for line in input:
+        if not line.strip():
+            continue
+        file = None
+        try:
+            file = json.loads(line)["file"]
+            fileStat = os.stat(file)
+            key = (fileStat.st_mtime_ns, fileStat.st_size)
+            if file not in cache or cache[file][0] != key:
+                cache[file] = (key, parseSchemaList(file))
+            response = {"file": file, "schemaList": cache[file][1]}
+        except Exception as ex:
+            response = {"file": file, "error": f"{type(ex).__name__}: {ex}"}
+        output.write(json.dumps(response) + "\n")
+        output.flush()
 
 
 if __name__ == "__main__":
-    file = sys.argv[1]
+    files = [x for x in sys.argv[1:] if not x.startswith("--")]
+
+    # Long running service for tools, requests and responses are JSON lines
+    if "--serve" in sys.argv:
+        serveSchemaLists(sys.stdin, sys.stdout)
+        sys.exit(0)
+
+    for file in files:
+        assert os.path.exists(file)
+
+    # Schema lists of many files from one process, keyed by file
+    if "--batch" in sys.argv:
+        print(json.dumps({x: parseSchemaList(x) for x in files}, indent=4), file=sys.stdout, flush=True)
+        sys.exit(0)
+
+    file = files[0]
     assert file
-    assert os.path.exists(file)
-    result, scene = parseSchemaScene(file)
-    print('\n'.join(scene.getFormatted('    ')), file=sys.stderr, flush=True)
-    print(json.dumps(result, indent=4), file=sys.stdout, flush=True)
+
+    # Schema list only, the syntax tree is not built
+    if "--list" in sys.argv:
+        print(json.dumps(parseSchemaList(file), indent=4), file=sys.stdout, flush=True)
+    else:
+        result, scene = parseSchemaScene(file)
+        print('\n'.join(scene.getFormatted('    ')), file=sys.stderr, flush=True)
+        print(json.dumps(result, indent=4), file=sys.stdout, flush=True)
@@ -0,0 +1,270 @@
+##
+#   Native RPC Transport
+#
+#       PendingCall
+#
+#       FramedSocket
+#           __init__
+#           open
+#           request
+#           exchange
+#           upgrade
+#           call
+#           readLoop
+#           close
+#
+#       writeShared
+#       readShared
+#       discardShared
+#       getSharedInfo
+##
+import json
+import secrets
+import socket
+import threading
+import time
+
+from .common import FRAME_HEADER, FRAME_SHARED, SHARED_PREFIX
+from .extension import getHeaderMap, parseInt
+
+
+class PendingCall:
+    event: threading.Event
+    status: int
+    body: bytes
+    error: Exception
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.status = 0
+        self.body = None
+        self.error = None
+
+
+class FramedSocket:
+    host: str
+    port: int
+    unixPath: str
+    socket: any
+    readBuffer: bytes
+    sendLock: threading.Lock
+    requestLock: threading.Lock
+    pendingCalls: dict[int, PendingCall]
+    newRequestId: int
+    readThread: threading.Thread
+    upgraded: bool
+    sharedMemory: int
+    closed: bool
+
+    def __init__(self, host, port, unixPath=""):
+        self.host = host
+        self.port = port
+        self.unixPath = unixPath
+        self.socket = None
+        self.readBuffer = b""
+        self.sendLock = threading.Lock()
+        self.requestLock = threading.Lock()
+        self.pendingCalls = {}
+        self.newRequestId = 0
+        self.readThread = None
+        self.upgraded = False
+        self.sharedMemory = 0
+        self.closed = False
+
+    def open(self, timeout):
+        if self.unixPath:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.settimeout(timeout)
+            self.socket.connect(self.unixPath)
+            return
+        self.socket = socket.create_connection((self.host, self.port), timeout=timeout)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def request(self, url, payload, headers, timeout):
+        assert not self.upgraded
+        body = json.dumps(payload).encode("utf-8")
+        head = (
+            f"POST {url} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Content-Type: application/json\r\n"
+        )
+        for key, value in headers.items():
+            head += f"{key}: {value}\r\n"
+
+        # Stale keep-alive sockets are reopened once, like pooled HTTP clients do
+        with self.requestLock:
+            try:
+                return self.exchange(url, (head + "\r\n").encode() + body, timeout)
+            except (BrokenPipeError, ConnectionResetError):
+                self.socket.close()
+                self.readBuffer = b""
+                self.open(timeout)
+                return self.exchange(url, (head + "\r\n").encode() + body, timeout)
+
+    def exchange(self, url, message, timeout):
+        self.socket.settimeout(timeout)
+        self.socket.sendall(message)
+
+        data = self.readBuffer
+        while b"\r\n\r\n" not in data:
+            newData = self.socket.recv(65536)
+            if not newData and not data:
+                raise ConnectionResetError(f"Connection closed: {url}")
+            if not newData:
+                raise ConnectionError(f"Connection closed: {url}")
+            data += newData
+        middle = data.index(b"\r\n\r\n") + len(b"\r\n\r\n")
+        headerMap = getHeaderMap(data[0: middle].decode(), ["Content-Length"])
+        parts = [x.strip() for x in data[0: data.index(b"\n")].decode().split(" ") if x.strip()]
+        assert len(parts) >= 2
+        contentLen = parseInt(headerMap["Content-Length"])
+        while len(data) < middle + contentLen:
+            newData = self.socket.recv(65536)
+            if not newData:
+                raise ConnectionError(f"Connection closed: {url}")
+            data += newData
+        self.readBuffer = data[middle+contentLen:]
+        return parseInt(parts[1]), " ".join(parts[2:]), data[middle: middle+contentLen]
+
+    def upgrade(self):
+        assert not self.upgraded
+        self.upgraded = True
+        self.socket.settimeout(None)
+        self.readThread = threading.Thread(target=self.readLoop, daemon=True)
+        self.readThread.start()
+
+    def call(self, methodId, body, timeout):
+        assert self.upgraded
+        pending = PendingCall()
+        deadline = time.time() + timeout if timeout else 0
+        flags = 0
+        if self.sharedMemory and len(body) >= self.sharedMemory:
+            body = writeShared(body)
+            flags = FRAME_SHARED
+        with self.sendLock:
+            if self.closed:
+                if flags:
+                    discardShared(body)
+                raise ConnectionError(f"Connection closed: {methodId}")
+            self.newRequestId += 1
+            requestId = self.newRequestId
+            self.pendingCalls[requestId] = pending
+            try:
+                self.socket.sendall(FRAME_HEADER.pack(requestId, methodId, len(body), deadline, flags) + body)
+            except Exception:
+                self.pendingCalls.pop(requestId, None)
+                if flags:
+                    discardShared(body)
+                raise
+
+        if not pending.event.wait(timeout):
+            with self.sendLock:
+                self.pendingCalls.pop(requestId, None)
+            raise TimeoutError(f"Call timed out: {methodId}")
+        if pending.error:
+            raise pending.error
+        return pending.status, pending.body
+
+    def readLoop(self):
+        data = self.readBuffer
+        error = None
+        while not self.closed:
+            try:
+                newData = self.socket.recv(65536)
+            except Exception as ex:
+                error = ex
+                break
+            if not newData:
+                break
+            data += newData
+
+            # Demultiplex responses
+            while len(data) >= FRAME_HEADER.size:
+                requestId, status, length, _, flags = FRAME_HEADER.unpack_from(data)
+                end = FRAME_HEADER.size + length
+                if len(data) < end:
+                    break
+                body = data[FRAME_HEADER.size: end]
+                data = data[end:]
+                with self.sendLock:
+                    pending = self.pendingCalls.pop(requestId, None)
+
+                # Unreadable segments fail their own call only
+                frameError = None
+                if flags & FRAME_SHARED:
+                    try:
+                        body = readShared(body)
+                    except Exception as ex:
+                        frameError = RuntimeError(f"Failed to read shared memory: {ex}")
+                if pending is None:
+                    continue
+                pending.status = status
+                pending.body = body
+                pending.error = frameError
+                pending.event.set()
+
+        # Fail waiting callers
+        with self.sendLock:
+            self.closed = True
+            pendingCalls = list(self.pendingCalls.values())
+            self.pendingCalls = {}
+        for pending in pendingCalls:
+            pending.error = ConnectionError(f"Connection closed: {error}")
+            pending.event.set()
+
+    def close(self):
+        with self.sendLock:
+            self.closed = True
+        if self.socket is None:
+            return
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass
+        self.socket.close()
+        if self.readThread and self.readThread != threading.current_thread():
+            self.readThread.join(1)
+
+
+def writeShared(body):
+    from multiprocessing import resource_tracker, shared_memory
+    segment = shared_memory.SharedMemory(f"{SHARED_PREFIX}{secrets.token_hex(8)}", create=True, size=max(len(body), 1))
+    segment.buf[0: len(body)] = body
+    descriptor = json.dumps({"name": segment.name, "size": len(body)}).encode("utf-8")
+
+    # Receiver unlinks the segment, it must outlive this process' resource tracker
+    resource_tracker.unregister(segment._name, "shared_memory")
+    segment.close()
+    return descriptor
+
+
+def readShared(descriptor):
+    from multiprocessing import shared_memory
+    info = getSharedInfo(descriptor)
+    segment = shared_memory.SharedMemory(name=info["name"])
+    try:
+        # Decoded straight from the mapped segment, without an intermediate bytes copy
+        with segment.buf[0: info["size"]] as view:
+            return str(view, "utf-8")
+    finally:
+        segment.close()
+        segment.unlink()
+
+
+def discardShared(descriptor):
+    from multiprocessing import shared_memory
+    try:
+        segment = shared_memory.SharedMemory(name=getSharedInfo(descriptor)["name"])
+    except (FileNotFoundError, ValueError):
+        return
+    segment.close()
+    segment.unlink()
+
+
+def getSharedInfo(descriptor):
+    # Descriptors come from the peer, only segments of this transport are accepted
+    info = json.loads(descriptor)
+    if not isinstance(info, dict) or not str(info.get("name")).startswith(SHARED_PREFIX):
+        raise ValueError(f"Invalid shared memory name: {info}")
+    return info
@@ -0,0 +1,194 @@
+##
+#   Native RPC Test Fixtures
+#
+#       SCHEMA
+#       SERVE_SCRIPT
+#
+#       StoreImpl
+#
+#       workspace
+#       getFreePort
+#       startServer
+#       startProcess
+#       waitPort
+##
+import __main__
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+SOURCE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SOURCE_PATH)
+
+import nativerpc  # noqa: E402
+from nativerpc import common  # noqa: E402
+from nativerpc.main import Serializer  # noqa: E402
+
+SCHEMA = """class Item:
+    name: str
+    count: int
+    tags: dict
+
+    def __init__(self):
+        self.name = ""
+        self.count = 0
+        self.tags = {}
+
+
+class Order:
+    item: Item
+    items: list
+    note: str
+
+    def __init__(self):
+        self.item = Item()
+        self.items = []
+        self.note = ""
+
+
+class Store:
+    def getItem(self, param: Item) -> Item: ...
+
+    def place(self, param: Order) -> Order: ...
+"""
+
+# Server process of the test workspace, python serve.py PORT|PATH [DELAY]
+SERVE_SCRIPT = """import sys
+import time
+import nativerpc
+import schema
+
+
+class StoreImpl(schema.Store):
+    def getItem(self, param):
+        time.sleep(float(sys.argv[2]) if len(sys.argv) > 2 else 0)
+        param.count += 1
+        return param
+
+    def place(self, param):
+        return param
+
+
+host = sys.argv[1] if not sys.argv[1].isdigit() else ("localhost", int(sys.argv[1]))
+nativerpc.Server({"service": StoreImpl, "host": host}).listen()
+"""
+
+
+class StoreImpl:
+    calls: list
+
+    def __init__(self):
+        self.calls = []
+
+    def getItem(self, param):
+        self.calls.append(param.name)
+        if param.name == "fail":
+            raise ValueError("Failed item")
+        if param.name.startswith("sleep"):
+            time.sleep(float(param.name[5:]))
+        param.count += 1
+        return param
+
+    def place(self, param):
+        self.calls.append(param.note)
+        return param
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    # Each test gets its own workspace, resolved from a script inside it
+    sourcePath = tmp_path / "proj" / "src"
+    sourcePath.mkdir(parents=True)
+    (tmp_path / "workspace.json").write_text(json.dumps({
+        "projectNames": ["proj"],
+        "schemaNames": ["schema"],
+        "verifyPython": False,
+    }))
+    (sourcePath / "schema.py").write_text(SCHEMA)
+    (sourcePath / "serve.py").write_text(SERVE_SCRIPT)
+
+    entryPoint = getattr(__main__, "__file__", None)
+    __main__.__file__ = str(sourcePath / "serve.py")
+    sys.path.insert(0, str(sourcePath))
+    common._workspace = None
+    Serializer.sharedSchemas.clear()
+    yield tmp_path
+    for name in [x for x in sys.modules if x.split(".")[0] in ("schema", "schema_compiled")]:
+        del sys.modules[name]
+    sys.path.remove(str(sourcePath))
+    Serializer.sharedSchemas.clear()
+    common._workspace = None
+    __main__.__file__ = entryPoint
+
+
+def getFreePort():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def startServer(workspace):
+    # In-process servers on listener threads, closed after the test
+    servers = []
+
+    def start(options=None, service=None):
+        import schema
+        methods = {x: y for x, y in StoreImpl.__dict__.items() if not x.startswith("__") or x == "__init__"}
+        serviceType = type("StoreImpl", (schema.Store,), dict(methods, **(service or {})))
+        server = nativerpc.Server(dict({"service": serviceType, "host": ("localhost", getFreePort())}, **(options or {})))
+        thread = threading.Thread(target=server.listen, daemon=True)
+        thread.start()
+        endTime = time.time() + 10
+        while not server.clientSockets and time.time() < endTime:
+            time.sleep(0.01)
+        servers.append((server, thread))
+        return server
+
+    yield start
+    for server, thread in servers:
+        server.close()
+        thread.join(5)
+
+
+@pytest.fixture
+def startProcess(workspace):
+    # Server processes of the test workspace, killed after the test
+    processes = []
+
+    def start(*args):
+        process = subprocess.Popen(
+            [sys.executable, str(workspace / "proj" / "src" / "serve.py"), *[str(x) for x in args]],
+            stdout=subprocess.DEVNULL,
+            env=dict(os.environ, PYTHONPATH=SOURCE_PATH),
+        )
+        processes.append(process)
+        return process
+
+    yield start
+    for process in processes:
+        process.kill()
+        process.wait()
+
+
+def waitPort(host, timeout=10):
+    # Servers are ready once they accept connections
+    endTime = time.time() + timeout
+    while True:
+        try:
+            if isinstance(host, str):
+                with socket.socket(socket.AF_UNIX) as sock:
+                    sock.connect(host)
+            else:
+                socket.create_connection(host, timeout=1).close()
+            return
+        except OSError:
+            if time.time() > endTime:
+                raise
+            time.sleep(0.05)
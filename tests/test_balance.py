@@ -0,0 +1,127 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import nativerpc
+from conftest import getFreePort, waitPort
+
+
+def getItem(store, name="a"):
+    import schema
+    item = schema.Item()
+    item.name = name
+    return store.getItem(item)
+
+
+@pytest.mark.parametrize("protocol", ["http", "framed"])
+def test_single_endpoint_survives_restart(startProcess, protocol):
+    import schema
+    port = getFreePort()
+    server = startProcess(port)
+    waitPort(("localhost", port))
+    store = nativerpc.Client({"service": schema.Store, "host": ("localhost", port), "protocol": protocol}).connect()
+    assert getItem(store).count == 1
+
+    # Calls fail while the server is down, without waiting for a probe
+    server.kill()
+    server.wait()
+    with pytest.raises(Exception):
+        getItem(store)
+        getItem(store)
+    startProcess(port)
+    waitPort(("localhost", port))
+    assert getItem(store).count == 1
+    assert not store.client.endpoints[0].failed
+    store.close()
+
+
+@pytest.mark.parametrize("protocol", ["http", "framed"])
+def test_failed_endpoint_is_ejected(startProcess, protocol):
+    import schema
+    ports = [getFreePort(), getFreePort()]
+    servers = [startProcess(x) for x in ports]
+    for port in ports:
+        waitPort(("localhost", port))
+    store = nativerpc.Client({
+        "service": schema.Store,
+        "host": [("localhost", x) for x in ports],
+        "protocol": protocol,
+    }).connect()
+    client = store.client
+
+    # Calls move to the remaining endpoint, the last one is never ejected
+    servers[0].kill()
+    servers[0].wait()
+    results = []
+    for _ in range(6):
+        try:
+            results.append(getItem(store).count)
+        except Exception:
+            pass
+    assert results[-3:] == [1, 1, 1]
+    assert client.endpoints[0].failed
+    assert not client.endpoints[1].failed
+
+    # Probe restores the endpoint
+    startProcess(ports[0])
+    waitPort(("localhost", ports[0]))
+    endTime = time.time() + 5
+    while client.endpoints[0].failed and time.time() < endTime:
+        time.sleep(0.1)
+    assert not client.endpoints[0].failed
+    store.close()
+
+
+def test_all_endpoints_down_reconnect(startProcess):
+    import schema
+    ports = [getFreePort(), getFreePort()]
+    servers = [startProcess(x) for x in ports]
+    for port in ports:
+        waitPort(("localhost", port))
+    store = nativerpc.Client({
+        "service": schema.Store,
+        "host": [("localhost", x) for x in ports],
+        "protocol": "framed",
+    }).connect()
+    for server in servers:
+        server.kill()
+        server.wait()
+    for _ in range(4):
+        with pytest.raises(Exception):
+            getItem(store)
+    startProcess(ports[1])
+    waitPort(("localhost", ports[1]))
+    for _ in range(3):
+        try:
+            if getItem(store).count == 1:
+                break
+        except Exception:
+            pass
+    else:
+        pytest.fail("Client did not reconnect")
+    store.close()
+
+
+@pytest.mark.parametrize("balance", ["outstanding", "latency"])
+def test_calls_spread_across_endpoints(startServer, balance):
+    import schema
+    servers = [startServer(), startServer()]
+    store = nativerpc.Client({
+        "service": schema.Store,
+        "host": [(x.host, x.port) for x in servers],
+        "protocol": "framed",
+        "balance": balance,
+    }).connect()
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda x: getItem(store, "sleep0.02"), range(40)))
+    counts = [len(x.classInstance.calls) for x in servers]
+    assert sum(counts) == 40
+    assert min(counts) > 0
+    store.close()
+
+
+def test_unknown_balance(workspace):
+    import schema
+    with pytest.raises(AssertionError):
+        nativerpc.Client({"service": schema.Store, "host": ("localhost", 1), "balance": "random"})
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from nativerpc import bench
+
+
+@pytest.fixture
+def noisyWorkspace(monkeypatch):
+    # Benchmark processes print warnings to stdout before running, like clients failing to connect
+    createWorkspace = bench.createWorkspace
+
+    def create(folder):
+        command, env = createWorkspace(folder)
+        with open(command[-1], "rt") as stream:
+            script = stream.read()
+        with open(command[-1], "wt") as stream:
+            stream.write(script.replace("runScript(", "sys.argv[1] != 'server' and print('WARNING: noise')\nrunScript("))
+        return command, env
+
+    monkeypatch.setattr(bench, "createWorkspace", create)
+
+
+def test_load_results_ignore_stdout(noisyWorkspace):
+    result = bench.benchLoad({"--clients": "2", "--calls": "150", "--payload": "16", "--items": "2"})
+    assert result["calls"] + result["errors"] == 300
+    assert result["latencyP50Ms"] > 0
+
+
+def test_failed_load_client(noisyWorkspace):
+    with pytest.raises(RuntimeError, match="Failed load clients"):
+        bench.benchLoad({"--clients": "1", "--calls": "10", "--mix": "missing:1"})
+
+
+def test_micro_results(noisyWorkspace):
+    result = bench.benchMicro(20)
+    assert set(result) >= {"toJson.nsPerOp", "fromJson.nsPerOp", "serverCall.nsPerOp", "readRequest.peakBytes"}
+
+
+@pytest.mark.parametrize("language", ["python", "typescript", "cpp"])
+def test_generated_schemas(tmp_path, language):
+    from nativerpc import parser
+    file = tmp_path / f"schema{bench.PARSER_LANGUAGES[language]}"
+    file.write_text(bench.generateSchema(language, 6, 0, True))
+    schemaList = parser.parseSchemaList(str(file))
+    assert [x["methodName"] for x in schemaList if x.get("methodName")] == ["call1", "call3", "call5"]
+    assert {x["className"] for x in schemaList if x.get("fieldName")} == {"Message0", "Message2", "Message4"}
+
+
+def test_parser_suite(monkeypatch):
+    monkeypatch.setattr(bench, "PARSER_CASES", {"small": (10, 0, False), "nested": (10, 2, True)})
+    results = bench.benchParser(1)
+    assert len(results) == 3 * 2 * 7
+    assert results["python.small.tokens"] > 0
+    assert all(x > 0 for x in results.values())
+
+
+def test_compare_results():
+    baseline = {"a.nsPerOp": 100, "b.listTokensPerSec": 1000, "c": ["x"], "d": 5}
+    results = {"a.nsPerOp": 110, "b.listTokensPerSec": 900, "c": ["x"], "e": 1}
+    assert bench.compareResults(results, baseline, 0.2) == []
+    results = {"a.nsPerOp": 130, "b.listTokensPerSec": 700, "c": ["y"]}
+    assert bench.compareResults(results, baseline, 0.2) == [
+        "a.nsPerOp: 130.000 > 100.000",
+        "b.listTokensPerSec: 700.000 < 1000.000",
+        "c: ['y'] != ['x']",
+    ]
+
+
+def test_micro_baseline(tmp_path, capsys):
+    outputFile = str(tmp_path / "micro.json")
+    bench.main(["micro", "--repeat=3", f"--output={outputFile}"])
+    results = json.load(open(outputFile))
+    assert json.loads(capsys.readouterr().out) == results
+
+    # Slower runs than the baseline fail
+    json.dump({x: y / 1000 for x, y in results.items()}, open(outputFile, "wt"))
+    with pytest.raises(SystemExit):
+        bench.main(["micro", "--repeat=3", f"--baseline={outputFile}"])
+    assert "REGRESSION: toJson.nsPerOp" in capsys.readouterr().out
@@ -0,0 +1,130 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import nativerpc
+from nativerpc.cache import ResponseCache, SingleFlight
+
+
+def getItem(store, name):
+    import schema
+    item = schema.Item()
+    item.name = name
+    return store.getItem(item)
+
+
+def test_cache_expires_entries():
+    cache = ResponseCache()
+    cache.put("a", b"1", 0.1)
+    assert cache.get("a") == b"1"
+    time.sleep(0.15)
+    assert cache.get("a") is None
+    assert cache.getStats() == {"entries": 0, "bytes": 0, "hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_cache_evicts_least_recent():
+    cache = ResponseCache(maxEntries=2, maxBytes=10)
+    cache.put("a", b"1", 10)
+    cache.put("b", b"2", 10)
+    cache.get("a")
+    cache.put("c", b"3", 10)
+    assert [cache.get(x) for x in "abc"] == [b"1", None, b"3"]
+
+    # Byte limit, oversized bodies are never stored
+    cache.put("d", b"12345678", 10)
+    assert cache.get("a") is None and cache.get("d") == b"12345678"
+    cache.put("e", b"12345678901", 10)
+    assert cache.get("e") is None
+    assert cache.getStats()["bytes"] <= 10
+
+
+def test_client_cache(startServer):
+    import schema
+    server = startServer()
+    store = nativerpc.Client({
+        "service": schema.Store,
+        "host": (server.host, server.port),
+        "protocol": "framed",
+        "cache": {"getItem": 0.2},
+    }).connect()
+    assert [getItem(store, "a").count for _ in range(3)] == [1, 1, 1]
+    assert getItem(store, "b").count == 1
+    assert server.classInstance.calls == ["a", "b"]
+
+    # Expired entries and errors are fetched again
+    time.sleep(0.25)
+    getItem(store, "a")
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            getItem(store, "fail")
+    assert server.classInstance.calls == ["a", "b", "a", "fail", "fail"]
+    store.close()
+
+
+def test_cache_unknown_method(workspace):
+    import schema
+    with pytest.raises(AssertionError, match="Unknown method option"):
+        nativerpc.Client({"service": schema.Store, "host": ("localhost", 1), "cache": {"missing": 1}})
+
+
+def test_single_flight_shares_result():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def function():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return len(calls)
+
+    with ThreadPoolExecutor(4) as pool:
+        leader = pool.submit(flight.call, "a", function)
+        started.wait(5)
+        followers = [pool.submit(flight.call, "a", function) for _ in range(3)]
+        while flight.getStats()["followers"] < 3:
+            time.sleep(0.01)
+        release.set()
+        assert [x.result() for x in [leader, *followers]] == [1, 1, 1, 1]
+    assert flight.getStats() == {"inflight": 0, "leaders": 1, "followers": 3}
+
+
+def test_single_flight_shares_error():
+    flight = SingleFlight()
+    started = threading.Event()
+
+    def function():
+        started.set()
+        time.sleep(0.2)
+        raise ValueError("Failed flight")
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.call, "a", function)
+        started.wait(5)
+        follower = pool.submit(flight.call, "a", function)
+        for future in [leader, follower]:
+            with pytest.raises(ValueError, match="Failed flight"):
+                future.result()
+
+    # Later calls start a new flight
+    assert flight.call("a", lambda: 2) == 2
+
+
+def test_client_coalesce(startServer):
+    import schema
+    server = startServer()
+    store = nativerpc.Client({
+        "service": schema.Store,
+        "host": (server.host, server.port),
+        "protocol": "framed",
+        "coalesce": ["getItem"],
+        "timeout": 5,
+    }).connect()
+    with ThreadPoolExecutor(6) as pool:
+        results = list(pool.map(lambda x: getItem(store, x).count, ["sleep0.3"] * 4 + ["sleep0.2"] * 2))
+    assert results == [1] * 6
+    assert sorted(server.classInstance.calls) == ["sleep0.2", "sleep0.3"]
+    store.close()
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+import nativerpc
+from nativerpc.common import getIdentity
+from nativerpc.main import Serializer
+
+
+def test_lazy_connect(startServer):
+    import schema
+    store = nativerpc.Client({
+        "service": schema.Store,
+        "host": ("localhost", 1),
+        "lazy": True,
+    }).connect()
+    assert not store.client.connected
+
+    # Handshake happens on the first call
+    server = startServer()
+    store.client.endpoints[0].port = server.port
+    item = schema.Item()
+    item.name = "a"
+    assert store.getItem(item).count == 1
+    assert store.client.connected
+    store.close()
+
+
+def test_close_without_connect(workspace, monkeypatch):
+    import schema
+    from nativerpc import main
+    store = nativerpc.Client({
+        "service": schema.Store,
+        "host": ("localhost", 1),
+        "lazy": True,
+    }).connect()
+
+    # Never connected endpoints are closed without reading the process identity
+    monkeypatch.setattr(main, "getIdentity", lambda: pytest.fail("identity read"))
+    store.close()
+
+
+def test_shared_schema_state(workspace):
+    first = Serializer()
+    second = Serializer()
+    assert first.modules == second.modules
+    assert first.fieldList["Item"] is second.fieldList["Item"]
+
+    # Schema lists are copied per instance, servers and clients extend and renumber them
+    first.schemaList.append(None)
+    first.schemaList[0].idNumber = 99
+    assert len(second.schemaList) == len(first.schemaList) - 1
+    assert second.schemaList[0].idNumber != 99
+    assert Serializer().schemaList[0].idNumber != 99
+
+
+def test_identity(workspace):
+    identity = getIdentity()
+    assert (identity["projectId"], identity["clientId"]) == ("proj", os.getpid())
+    assert identity["entryPoint"] == str(workspace / "proj" / "src" / "serve.py")
+    assert identity == getIdentity()
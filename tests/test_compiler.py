@@ -0,0 +1,33 @@
+import pytest
+
+import nativerpc
+from nativerpc import compiler
+
+
+@pytest.mark.parametrize("slots", [False, True])
+def test_compiled_schema_calls(startServer, workspace, slots):
+    import schema
+    compiler.compileSchema(str(workspace / "proj"), slots)
+
+    # Services keep returning instances of their own schema classes
+    server = startServer(service={"getItem": lambda self, param: schema.Item()})
+    assert server.serializer.compiled
+    store = nativerpc.Client({"service": schema.Store, "host": (server.host, server.port)}).connect()
+    item = schema.Item()
+    item.name = "a"
+    assert store.getItem(item).name == ""
+    order = schema.Order()
+    order.item.name = "nested"
+    order.items = [1, 2]
+    result = store.place(order)
+    assert (result.item.name, result.items) == ("nested", [1, 2])
+    assert hasattr(result, "__slots__") == slots
+    store.close()
+
+
+def test_stale_compiled_schema_is_ignored(workspace, capsys):
+    compiler.compileSchema(str(workspace / "proj"))
+    schemaFile = workspace / "proj" / "src" / "schema.py"
+    schemaFile.write_text(schemaFile.read_text() + "\n")
+    assert compiler.loadCompiled(str(workspace / "proj")) is None
+    assert "stale compiled schema" in capsys.readouterr().out
@@ -0,0 +1,84 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+import nativerpc
+
+
+def sendRequest(server, url, payload, headers):
+    body = json.dumps(payload).encode("utf-8")
+    head = f"POST {url} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n"
+    for key, value in headers.items():
+        head += f"{key}: {value}\r\n"
+    with socket.create_connection((server.host, server.port), timeout=5) as sock:
+        sock.sendall((head + "\r\n").encode() + body)
+        data = b""
+        while b"\r\n\r\n" not in data:
+            data += sock.recv(65536)
+    return data.split(b"\r\n")[0].decode()
+
+
+def test_expired_deadline_is_shed(startServer):
+    server = startServer()
+    status = sendRequest(server, "/Store/getItem", {"name": "a", "count": 1, "tags": {}}, {
+        "Deadline": f"{time.time() - 1:.6f}",
+    })
+    assert status == "HTTP/1.1 504 Deadline exceeded"
+    assert server.shedCount == 1
+    assert server.classInstance.calls == []
+
+
+def test_future_deadline_is_served(startServer):
+    server = startServer()
+    status = sendRequest(server, "/Store/getItem", {"name": "a", "count": 1, "tags": {}}, {
+        "Deadline": f"{time.time() + 10:.6f}",
+    })
+    assert status == "HTTP/1.1 200 OK"
+    assert server.shedCount == 0
+
+
+def test_malformed_deadline_is_ignored(startServer):
+    server = startServer()
+    status = sendRequest(server, "/Store/getItem", {"name": "a", "count": 1, "tags": {}}, {
+        "Deadline": "soon",
+    })
+    assert status == "HTTP/1.1 200 OK"
+    assert server.clientSockets and not server.closed
+
+    # Server loop is still serving
+    status = sendRequest(server, "/Store/getItem", {"name": "b", "count": 1, "tags": {}}, {})
+    assert status == "HTTP/1.1 200 OK"
+    assert server.classInstance.calls == ["a", "b"]
+
+
+def test_shed_count_from_threads(startServer):
+    server = startServer()
+    threads = [threading.Thread(target=lambda: [server.shedCall("/Store/getItem") for _ in range(1000)])
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert server.shedCount == 8000
+
+
+@pytest.mark.parametrize("protocol", ["http", "framed"])
+def test_client_timeout(startServer, protocol):
+    import schema
+    server = startServer()
+    store = nativerpc.Client({
+        "service": schema.Store,
+        "host": (server.host, server.port),
+        "protocol": protocol,
+        "timeout": 0.2,
+    }).connect()
+    item = schema.Item()
+    item.name = "sleep0.5"
+    with pytest.raises(Exception):
+        store.getItem(item)
+    item.name = "fast"
+    assert store.getItem(item, timeout=2).count == 1
+    store.close()
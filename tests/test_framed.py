@@ -0,0 +1,103 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import nativerpc
+
+
+def connect(server, **options):
+    import schema
+    return nativerpc.Client(dict({
+        "service": schema.Store,
+        "host": (server.host, server.port),
+        "protocol": "framed",
+    }, **options)).connect()
+
+
+def getItem(store, name):
+    import schema
+    item = schema.Item()
+    item.name = name
+    return store.getItem(item)
+
+
+def test_framed_calls(startServer):
+    import schema
+    server = startServer()
+    store = connect(server)
+    assert store.client.endpoints[0].framedSocket.upgraded
+    assert getItem(store, "a").count == 1
+    order = schema.Order()
+    order.item.name = "nested"
+    order.items = [{"a": 1}]
+    order.note = "n" * 100000
+    result = store.place(order)
+    assert (result.item.name, result.items, result.note) == ("nested", [{"a": 1}], order.note)
+    store.close()
+
+
+def test_out_of_order_responses(startServer):
+    server = startServer()
+    store = connect(server, timeout=5)
+
+    # Slow calls do not hold back later ones on the same connection
+    with ThreadPoolExecutor(2) as pool:
+        slow = pool.submit(lambda: (getItem(store, "sleep0.5"), time.monotonic()))
+        time.sleep(0.1)
+        fast = pool.submit(lambda: (getItem(store, "fast"), time.monotonic()))
+        assert fast.result()[1] < slow.result()[1]
+        assert (slow.result()[0].name, fast.result()[0].name) == ("sleep0.5", "fast")
+    assert len(server.activeConnections) == 2
+    store.close()
+
+
+def test_concurrent_calls_share_connection(startServer):
+    server = startServer()
+    store = connect(server, timeout=5)
+    with ThreadPoolExecutor(8) as pool:
+        names = [f"sleep0.0{x % 5}" for x in range(40)]
+        results = list(pool.map(lambda x: getItem(store, x).name, names))
+    assert results == names
+    assert len(server.activeConnections) == 2
+    store.close()
+
+
+def test_framed_errors(startServer):
+    server = startServer()
+    store = connect(server)
+    with pytest.raises(RuntimeError, match="Failed item"):
+        getItem(store, "fail")
+    assert getItem(store, "after").count == 1
+    store.close()
+
+
+def test_method_ids(startServer):
+    import schema
+    server = startServer()
+    store = connect(server)
+    endpoint = store.client.endpoints[0]
+    assert endpoint.methodIds["/Store/getItem"] == server.methodIds["Store.getItem"]
+    assert len(set(endpoint.methodIds.values())) == len(endpoint.methodIds)
+
+    # Unknown ids are answered with an error, the connection stays usable
+    status, body = endpoint.framedSocket.call(max(endpoint.methodIds.values()) + 1, b"{}", 2)
+    assert status != 200 and b"Failed to route" in body
+    endpoint.methodIds.pop("/Store/place")
+    with pytest.raises(RuntimeError, match="Failed to route"):
+        store.place(schema.Order())
+    assert getItem(store, "a").count == 1
+    store.close()
+
+
+def test_method_ids_kept_across_reload(startServer, workspace):
+    from conftest import SCHEMA
+    server = startServer(service={"countItem": lambda self, param: param})
+    methodIds = dict(server.methodIds)
+    (workspace / "proj" / "src" / "schema.py").write_text(SCHEMA.replace(
+        "    def getItem(self, param: Item) -> Item: ...\n",
+        "    def countItem(self, param: Item) -> Item: ...\n\n    def getItem(self, param: Item) -> Item: ...\n",
+    ))
+    assert server.reloadSchema()
+    assert {x: server.methodIds[x] for x in methodIds} == methodIds
+    assert server.methodIds["Store.countItem"] == len(methodIds)
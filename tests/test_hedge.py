@@ -0,0 +1,77 @@
+import time
+
+import nativerpc
+from nativerpc.common import LatencyTracker
+
+
+def getItem(store, name):
+    import schema
+    item = schema.Item()
+    item.name = name
+    return store.getItem(item)
+
+
+def slowItem(self, param):
+    time.sleep(1 if param.name == "hedge" else 0)
+    param.count += 10
+    return param
+
+
+def test_latency_quantiles():
+    tracker = LatencyTracker(minSamples=4)
+    for value in [0.3, 0.1, 0.2]:
+        tracker.addSample(value)
+    assert tracker.getQuantile(0.95) is None
+    tracker.addSample(0.4)
+    assert tracker.getQuantile(0.5) == 0.3
+    assert tracker.getQuantile(0.95) == 0.4
+
+
+def test_hedged_call(startServer):
+    import schema
+    servers = [startServer(service={"getItem": slowItem}), startServer()]
+    store = nativerpc.Client({
+        "service": schema.Store,
+        "host": [(x.host, x.port) for x in servers],
+        "protocol": "framed",
+        "hedge": ["getItem"],
+        "timeout": 5,
+    }).connect()
+    client = store.client
+    for _ in range(20):
+        getItem(store, "warmup")
+    assert client.hedgeCount == 0
+
+    # Primary attempt goes to the slow endpoint, the hedge to the fast one wins
+    client.endpoints[0].latency = 0
+    client.endpoints[1].latency = 1
+    callCounts = [x.callCount for x in client.endpoints]
+    sampleCount = client.latencyTrackers["getItem"].sampleCount
+    startTime = time.monotonic()
+    assert getItem(store, "hedge").count == 1
+    assert time.monotonic() - startTime < 0.5
+    assert client.hedgeCount == 1
+
+    # Only the winner updates its endpoint latency, only the primary attempt is sampled for the hedge delay
+    tracker = client.latencyTrackers["getItem"]
+    while tracker.sampleCount == sampleCount and time.monotonic() - startTime < 5:
+        time.sleep(0.05)
+    assert tracker.sampleCount == sampleCount + 1 and tracker.samples[-1] >= 1
+    assert [x.callCount for x in client.endpoints] == [callCounts[0], callCounts[1] + 1]
+    assert client.endpoints[0].latency == 0
+    store.close()
+
+
+def test_single_endpoint_not_hedged(startServer):
+    import schema
+    server = startServer()
+    store = nativerpc.Client({
+        "service": schema.Store,
+        "host": (server.host, server.port),
+        "hedge": ["getItem"],
+    }).connect()
+    for _ in range(25):
+        getItem(store, "a")
+    assert store.client.hedgeCount == 0
+    assert len(server.classInstance.calls) == 25
+    store.close()
@@ -0,0 +1,49 @@
+import pytest
+
+import nativerpc
+
+
+def connect(server, **options):
+    import schema
+    return nativerpc.Client(dict({"service": schema.Store, "server": server}, **options)).connect()
+
+
+def test_loopback_json(startServer):
+    import schema
+    server = startServer()
+    store = connect(server)
+    item = schema.Item()
+    item.name = "a"
+    result = store.getItem(item)
+    assert result is not item and (result.count, item.count) == (1, 0)
+    assert len(server.loopbackConnections) == 1
+    with pytest.raises(RuntimeError, match="Failed item"):
+        item.name = "fail"
+        store.getItem(item)
+
+    # Sockets are never opened
+    assert all(x.mainSocket is None and x.framedSocket is None for x in store.client.endpoints)
+    store.close()
+    assert server.loopbackConnections == []
+
+
+def test_loopback_direct(startServer):
+    import schema
+    server = startServer()
+    store = connect(server, loopback="direct")
+    item = schema.Item()
+    item.name = "a"
+    assert store.getItem(item) is item and item.count == 1
+    item.name = "fail"
+    with pytest.raises(ValueError, match="Failed item"):
+        store.getItem(item)
+    store.close()
+
+
+def test_loopback_options(startServer):
+    import schema
+    server = startServer()
+    with pytest.raises(AssertionError, match="Unknown loopback"):
+        connect(server, loopback="shared")
+    with pytest.raises(AssertionError, match="requires a server instance"):
+        nativerpc.Client({"service": schema.Store, "server": object(), "host": ("localhost", 1)})
@@ -0,0 +1,216 @@
+import io
+import json
+
+import pytest
+
+from nativerpc import parser
+
+
+def serve(lines):
+    output = io.StringIO()
+    parser.serveSchemaLists(io.StringIO("".join(x + "\n" for x in lines)), output)
+    return [json.loads(x) for x in output.getvalue().splitlines()]
+
+
+def test_serve_answers_every_line(workspace):
+    file = str(workspace / "proj" / "src" / "schema.py")
+    responses = serve([json.dumps({"file": file}), "not json", "", json.dumps({"name": file}),
+                       json.dumps({"file": file + ".missing"}), json.dumps({"file": file})])
+    assert len(responses) == 5
+    assert responses[0]["schemaList"] == responses[4]["schemaList"]
+    assert [x["className"] for x in responses[0]["schemaList"] if x.get("methodName")] == ["Store", "Store"]
+    assert responses[1]["file"] is None and responses[1]["error"].startswith("JSONDecodeError")
+    assert responses[2]["file"] is None and responses[2]["error"].startswith("KeyError")
+    assert responses[3]["error"].startswith("FileNotFoundError")
+
+
+PYTHON_SOURCE = """import json
+
+
+class Item:
+    name: str
+    count: int
+    tags: dict
+
+    def __init__(self):
+        # Strings may hold colons, hashes and brackets
+        self.name = "a: b # not a comment ("
+        self.count = 0
+        self.tags = {'x': [1, 2, (3, 4)]}
+
+    def helper(self, value):
+        if value:
+            return f"{value}"
+        return \\
+            None
+
+
+class Order:
+    item: Item
+    items: list
+    note: str
+
+
+class Store:
+    def getItem(self, param: Item) -> Item: ...
+
+    def place(self, param: Order) -> Order: ...
+"""
+
+TYPESCRIPT_SOURCE = """export class Item {
+    // Fields
+    name: string;
+    count: number;
+    tags: object;
+    constructor() {
+        /* Strings may hold braces */
+        this.name = "a { b";
+        this.count = 0;
+        this.tags = {x: [1, 2]};
+    }
+}
+
+export class Order {
+    item: Item;
+    items: Array;
+    note: string;
+}
+
+export abstract class Store {
+    abstract getItem(param: Item): Promise<Item>;
+    abstract place(param: Order): Promise<Order>;
+}
+"""
+
+CPP_SOURCE = """class Item {
+public:
+    std::string name;
+    int count;
+    nlohmann::json tags;
+};
+
+class Order {
+public:
+    Item item;
+    std::string note;
+};
+
+class Store {
+public:
+    virtual Item getItem(Item param) = 0;
+    virtual Order place(Order param) = 0;
+};
+"""
+
+SCHEMA_LISTS = {
+    "py": (PYTHON_SOURCE, [
+        ("Item", "name", "str"), ("Item", "count", "int"), ("Item", "tags", "dict"),
+        ("Order", "item", "Item"), ("Order", "items", "list"), ("Order", "note", "str"),
+        ("Store", "getItem", "Item", "Item"), ("Store", "place", "Order", "Order"),
+    ]),
+    "ts": (TYPESCRIPT_SOURCE, [
+        ("Item", "name", "str"), ("Item", "count", "number"), ("Item", "tags", "dict"),
+        ("Order", "item", "Item"), ("Order", "items", "list"), ("Order", "note", "str"),
+        ("Store", "getItem", "Item", "Item"), ("Store", "place", "Order", "Order"),
+    ]),
+    "h": (CPP_SOURCE, [
+        ("Item", "name", "str"), ("Item", "count", "int"), ("Item", "tags", "dict"),
+        ("Order", "item", "Item"), ("Order", "note", "str"),
+        ("Store", "getItem", "Item", "Item"), ("Store", "place", "Order", "Order"),
+    ]),
+}
+
+
+def getItems(schemaList):
+    return [
+        (x["className"], x["fieldName"], x["fieldType"]) if "fieldName" in x else
+        (x["className"], x["methodName"], x["methodRequest"], x["methodResponse"])
+        for x in schemaList
+    ]
+
+
+def writeSource(tmp_path, extension):
+    file = tmp_path / f"schema.{extension}"
+    file.write_text(SCHEMA_LISTS[extension][0])
+    return str(file)
+
+
+def test_tokenize():
+    text = "a = 'x # y'  # comment\nb: int\n"
+    tokens = [(x[0], x[4]) for x in parser.tokenize(text, parser.PYTHON_TOKENS)]
+    assert tokens == [
+        ("word", "a"), ("space", " "), ("operator", "="), ("space", " "), ("string", "x # y"),
+        ("space", "  "), ("comment", "# comment"), ("word", "b"), ("operator", ":"), ("space", " "),
+        ("word", "int"), ("newline", "\n"),
+    ]
+
+    # Block comments and unterminated comments
+    tokens = [(x[0], x[4]) for x in parser.tokenize("a /* b */ c // d", parser.TYPESCRIPT_TOKENS)]
+    assert tokens == [("word", "a"), ("space", " "), ("comment", "/* b "), ("space", " "), ("word", "c"),
+                      ("space", " "), ("end", None)]
+
+
+@pytest.mark.parametrize("extension", ["py", "ts", "h"])
+def test_parse_schema_scene(tmp_path, extension):
+    schemaList, scene = parser.parseSchemaScene(writeSource(tmp_path, extension))
+    assert getItems(schemaList) == SCHEMA_LISTS[extension][1]
+    assert [parser.matchClass(x) for x in scene.children if parser.matchClass(x)] == ["Item", "Order", "Store"]
+
+
+def test_line_indents():
+    # Blank and comment lines take the indent of the next significant line
+    pythonParser = parser.PythonParser()
+    pythonParser.textData = "class A:\n    a: int\n# note\n\n    b: str\nc = 1\n"
+    assert pythonParser.getLineIndents() == {0: 0, 9: 4, 20: 4, 27: 4, 28: 4, 39: 0, 45: 0}
+
+
+def test_comment_lines_keep_block_scope(tmp_path):
+    file = tmp_path / "schema.py"
+    file.write_text(
+        "class A:\n    a: int\n# column zero comment\n\n    b: str\n        # deeper comment\n    c: dict\n"
+        "\n\nclass B:\n    d: int\n"
+    )
+    assert getItems(parser.parseSchemaList(str(file))) == [
+        ("A", "a", "int"), ("A", "b", "str"), ("A", "c", "dict"), ("B", "d", "int"),
+    ]
+
+
+@pytest.mark.parametrize("extension, source", [
+    ("py", "class A:\n    x: int\n\n    def f(self):\n        return " + "(" * 300 + ")" * 300 + "\n"),
+    ("ts", "class A {\n    x: number;\n    f() { return " + "[" * 300 + "]" * 300 + "; }\n}\n"),
+    ("h", "class A {\npublic:\n    int x;\n    void f() { " + "{" * 300 + "}" * 300 + " }\n};\n"),
+])
+def test_deep_scopes(tmp_path, extension, source):
+    file = tmp_path / f"schema.{extension}"
+    file.write_text(source)
+    assert getItems(parser.parseSchemaList(str(file)))[0][0: 2] == ("A", "x")
+
+    # Scope stacks unwind fully, parsers can be reused
+    _, scene = parser.parseSchemaScene(str(file))
+    sceneParser = {"py": parser.PythonParser, "ts": parser.TypescriptParser, "h": parser.CppParser}[extension]()
+    for _ in range(2):
+        sceneParser.parseTree(source)
+        assert (len(sceneParser.pathList), len(sceneParser.nodeList)) == (1, 1)
+        assert sceneParser.scene.getFormatted("")[0: 50] == scene.getFormatted("")[0: 50]
+
+
+@pytest.mark.parametrize("language", ["python", "typescript", "cpp"])
+@pytest.mark.parametrize("depth, comments", [(0, False), (4, False), (0, True)])
+def test_streaming_matches_scene(tmp_path, language, depth, comments):
+    from nativerpc.bench import PARSER_LANGUAGES, generateSchema
+    file = tmp_path / f"schema{PARSER_LANGUAGES[language]}"
+    file.write_text(generateSchema(language, 40, depth, comments))
+    schemaList = parser.parseSchemaList(str(file))
+    assert schemaList == parser.parseSchemaScene(str(file))[0]
+
+    # Four fields per message and one method per service, nested classes are not schema classes
+    assert len(schemaList) == (0 if depth else 100)
+
+
+@pytest.mark.parametrize("extension", ["py", "ts", "h"])
+def test_streaming_keeps_no_tree(tmp_path, extension):
+    sceneParser = {"py": parser.PythonParser, "ts": parser.TypescriptParser, "h": parser.CppParser}[extension]()
+    sceneParser.extractor = parser.SchemaExtractor(extension == "h")
+    sceneParser.parseTree(SCHEMA_LISTS[extension][0])
+    assert getItems(sceneParser.extractor.result) == SCHEMA_LISTS[extension][1]
+    assert sceneParser.scene.children == []
@@ -0,0 +1,89 @@
+import json
+import time
+
+import pytest
+
+from nativerpc import main
+from conftest import SCHEMA
+
+EDITED_SCHEMA = SCHEMA.replace(
+    "    tags: dict\n",
+    "    tags: dict\n    extra: str\n",
+).replace(
+    "        self.tags = {}\n",
+    "        self.tags = {}\n        self.extra = \"new\"\n",
+).replace(
+    "    def place(self, param: Order) -> Order: ...\n",
+    "    def place(self, param: Order) -> Order: ...\n\n    def countItem(self, param: Item) -> Item: ...\n",
+)
+
+
+def writeSchema(workspace, text):
+    schemaFile = workspace / "proj" / "src" / "schema.py"
+    schemaFile.write_text(text)
+
+
+def getItem(server, name):
+    return json.loads(server.dispatchCall("/Store/getItem", {"name": name, "count": 0, "tags": {}}))
+
+
+def test_reload_edited_class(startServer, workspace):
+    server = startServer(service={"countItem": lambda self, param: param})
+    assert "extra" not in getItem(server, "a")
+
+    # Fields added to running classes and new methods are served after a reload
+    writeSchema(workspace, EDITED_SCHEMA)
+    assert server.reloadSchema()
+    assert getItem(server, "b")["extra"] == "new"
+    assert "Store.countItem" in server.methodList
+    resp = json.loads(server.dispatchCall("/Store/countItem", {"name": "c", "count": 0, "tags": {}, "extra": "x"}))
+    assert resp["extra"] == "x"
+
+
+def test_reload_accepts_running_classes(startServer, workspace):
+    import schema
+    server = startServer(service={"getItem": lambda self, param: schema.Item()})
+    writeSchema(workspace, SCHEMA + "\n\nclass Other:\n    value: int\n")
+    assert server.reloadSchema()
+    assert getItem(server, "a") == {"name": "", "count": 0, "tags": {}}
+    assert server.serializer.findType("Item", True) is not schema.Item
+
+
+def test_foreign_classes_are_rejected(startServer, workspace):
+    class Item:
+        def __init__(self):
+            self.name = ""
+            self.count = 0
+            self.tags = {}
+
+    # Same-named classes from other modules are never accepted, with or without a reload
+    server = startServer(service={"getItem": lambda self, param: Item()})
+    with pytest.raises(AssertionError, match="Invalid response"):
+        getItem(server, "a")
+    assert server.reloadSchema()
+    with pytest.raises(AssertionError, match="Invalid response"):
+        getItem(server, "a")
+
+
+def test_failed_reload_keeps_schema(startServer, workspace, capsys):
+    server = startServer()
+    methodList = server.methodList
+    writeSchema(workspace, SCHEMA.replace("class Order:", "class Order(:"))
+    assert not server.reloadSchema()
+    assert "Failed to reload schema" in capsys.readouterr().out
+    assert server.methodList is methodList
+    assert getItem(server, "a")["count"] == 1
+
+
+def test_watch_parses_in_process(startServer, workspace, monkeypatch):
+    workers = []
+    parseSchemaFiles = main.parseSchemaFiles
+    monkeypatch.setattr(main, "parseSchemaFiles", lambda files, count=None: workers.append(count) or parseSchemaFiles(
+        files, count))
+    server = startServer({"watch": 0.1}, service={"countItem": lambda self, param: param})
+    writeSchema(workspace, EDITED_SCHEMA)
+    endTime = time.time() + 5
+    while "Store.countItem" not in server.methodList and time.time() < endTime:
+        time.sleep(0.05)
+    assert "Store.countItem" in server.methodList
+    assert workers[-1] == 1
@@ -0,0 +1,110 @@
+import json
+import os
+import shutil
+
+from nativerpc import common
+
+
+def test_module_names(tmp_path):
+    projectPath = str(tmp_path / "proj")
+    assert common.getModuleName(projectPath, str(tmp_path / "proj" / "src" / "schema.py")) == "schema"
+    assert common.getModuleName(projectPath, str(tmp_path / "proj" / "src" / "my.pyutils" / "a.py")) == "my.pyutils.a"
+    assert common.getModuleName(projectPath, str(tmp_path / "proj" / "src" / "api" / "types.pyx.py")) == "api.types.pyx"
+
+
+def test_message_files_by_pattern(workspace):
+    sourcePath = workspace / "proj" / "src"
+    (sourcePath / "api").mkdir()
+    (sourcePath / "api" / "orders.py").write_text("class A:\n    a: int\n")
+    (sourcePath / "api" / "notes.txt").write_text("")
+    (sourcePath / "schema_compiled.py").write_text("")
+    settings = json.loads((workspace / "workspace.json").read_text())
+    settings["schemaPatterns"] = ["**/*"]
+    (workspace / "workspace.json").write_text(json.dumps(settings))
+    common._workspace = None
+    files = common.getMessageFiles(str(workspace / "proj"))
+    assert files[0] == str(sourcePath / "schema.py")
+    assert str(sourcePath / "api" / "orders.py") in files
+    assert files.count(str(sourcePath / "schema.py")) == 1
+    assert not [x for x in files if not x.endswith(".py") or x.endswith("schema_compiled.py")]
+
+
+def test_merge_conflicting_declarations(capsys):
+    first = [{"className": "A", "fieldName": "a", "fieldType": "int", "idNumber": 1}]
+    second = [
+        {"className": "A", "fieldName": "a", "fieldType": "str", "idNumber": 1},
+        {"className": "B", "fieldName": "b", "fieldType": "int", "idNumber": 2},
+    ]
+    merged = common.mergeSchemaLists(["a.py", "b.py"], [first, second + first])
+    assert merged == [first[0], second[1]]
+    assert "Conflicting schema: A.a, a.py, b.py" in capsys.readouterr().out
+
+
+def test_parse_large_files_in_pool(workspace):
+    files = []
+    for index in range(2):
+        file = workspace / "proj" / "src" / f"large{index}.py"
+        file.write_text("".join(f"class Large{index}x{x}:\n    value: int\n    name: str\n\n\n" for x in range(3500)))
+        files.append(str(file))
+    assert sum(len(open(x).read()) for x in files) >= 256 * 1024
+    pooled = common.parseSchemaFiles(files, 2)
+    shutil.rmtree(workspace / common.CACHE_FOLDER)
+    assert pooled == common.parseSchemaFiles(files, 1)
+    assert len(pooled[1]) == 7000
+
+
+def test_library_parses_in_process(workspace, monkeypatch):
+    import concurrent.futures
+    files = []
+    for index in range(2):
+        file = workspace / "proj" / "src" / f"large{index}.py"
+        file.write_text("".join(f"class Large{index}x{x}:\n    value: int\n\n\n" for x in range(8000)))
+        files.append(str(file))
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", None)
+    assert len(common.parseSchemaFiles(files)[0]) == 8000
+
+
+def test_compiler_command_uses_pool(workspace, monkeypatch):
+    from nativerpc import compiler
+    workers = []
+    parseSchemaFiles = compiler.parseSchemaFiles
+    monkeypatch.setattr(compiler, "parseSchemaFiles", lambda files, count: workers.append(count) or parseSchemaFiles(
+        files, count))
+    compiler.main([str(workspace / "proj")])
+    assert workers == [os.cpu_count() or 1]
+
+
+def test_schema_cache(workspace, monkeypatch):
+    from nativerpc import parser
+    file = str(workspace / "proj" / "src" / "schema.py")
+    parsed = common.parseSchemaFiles([file])
+    cacheFile = common.getSchemaCacheFile(file)
+    assert cacheFile.startswith(str(workspace / common.CACHE_FOLDER))
+    assert json.load(open(cacheFile))["schemaList"] == parsed[0]
+
+    # Unchanged files and touched files with the same content are not parsed again
+    parsed = []
+    parseSchemaList = parser.parseSchemaList
+    monkeypatch.setattr(parser, "parseSchemaList", lambda x: parsed.append(x) or parseSchemaList(x))
+    schemaList = common.parseSchemaList(file)
+    os.utime(file, (1, 1))
+    assert common.parseSchemaList(file) == schemaList
+    assert json.load(open(cacheFile))["mtime"] == 1000000000
+    assert parsed == []
+
+    # Changed and corrupted entries are parsed
+    with open(file, "at") as stream:
+        stream.write("\n\nclass Extra:\n    value: int\n")
+    assert common.parseSchemaList(file)[-1]["className"] == "Extra"
+    with open(cacheFile, "wt") as stream:
+        stream.write("{")
+    assert common.parseSchemaList(file)[-1]["className"] == "Extra"
+    assert parsed == [file, file]
+
+
+def test_schema_cache_outside_workspace(tmp_path):
+    file = tmp_path / "schema.py"
+    file.write_text("class A:\n    a: int\n")
+    assert common.getSchemaCacheFile(str(file)) == ""
+    assert common.parseSchemaList(str(file))[0]["fieldName"] == "a"
+    assert os.listdir(tmp_path) == ["schema.py"]
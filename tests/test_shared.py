@@ -0,0 +1,114 @@
+import json
+import os
+import socket
+import threading
+from multiprocessing import shared_memory
+
+import pytest
+
+import nativerpc
+from nativerpc import transport
+from nativerpc.common import FRAME_HEADER, FRAME_SHARED, SHARED_PREFIX
+
+
+@pytest.fixture
+def foreignSegment():
+    segment = shared_memory.SharedMemory(create=True, size=16)
+    yield segment
+    segment.close()
+    segment.unlink()
+
+
+def getSegmentNames():
+    return set(os.listdir("/dev/shm"))
+
+
+def test_large_payloads_use_shared_memory(startServer, monkeypatch):
+    import schema
+    written = []
+    writeShared = transport.writeShared
+    monkeypatch.setattr(transport, "writeShared", lambda body: written.append(body) or writeShared(body))
+    server = startServer()
+    store = nativerpc.Client({
+        "service": schema.Store,
+        "host": (server.host, server.port),
+        "protocol": "framed",
+        "sharedMemory": 1024,
+    }).connect()
+    order = schema.Order()
+    order.note = "x" * 100000
+    assert store.place(order).note == order.note
+    assert written and b"x" * 100000 in written[0]
+    assert not [x for x in getSegmentNames() if x.startswith(SHARED_PREFIX)]
+    store.close()
+
+
+def test_shared_names_use_prefix():
+    descriptor = transport.writeShared(b"payload")
+    assert json.loads(descriptor)["name"].startswith(SHARED_PREFIX)
+    assert transport.readShared(descriptor) == "payload"
+
+
+def test_foreign_segments_are_not_touched(foreignSegment):
+    descriptor = json.dumps({"name": foreignSegment.name, "size": 16}).encode()
+    with pytest.raises(ValueError):
+        transport.readShared(descriptor)
+    transport.discardShared(descriptor)
+    assert foreignSegment.name in getSegmentNames()
+
+
+def test_server_rejects_foreign_segment(startServer, monkeypatch, foreignSegment):
+    import schema
+    server = startServer()
+    store = nativerpc.Client({
+        "service": schema.Store,
+        "host": (server.host, server.port),
+        "protocol": "framed",
+        "sharedMemory": 1024,
+    }).connect()
+    descriptor = json.dumps({"name": foreignSegment.name, "size": 16}).encode()
+    monkeypatch.setattr(transport, "writeShared", lambda body: descriptor)
+    order = schema.Order()
+    order.note = "x" * 2048
+    with pytest.raises(RuntimeError, match="Invalid shared memory name"):
+        store.place(order)
+    assert foreignSegment.name in getSegmentNames()
+
+    # Connection keeps serving
+    monkeypatch.undo()
+    order.note = "small"
+    assert store.place(order).note == "small"
+    store.close()
+
+
+def test_missing_segment_fails_one_call():
+    left, right = socket.socketpair()
+    framedSocket = transport.FramedSocket("localhost", 0)
+    framedSocket.socket = left
+    framedSocket.upgrade()
+
+    def respond():
+        # First response points to a segment that does not exist, the second one is inline
+        for body, flags in [(json.dumps({"name": f"{SHARED_PREFIX}missing", "size": 4}).encode(), FRAME_SHARED),
+                            (b'"ok"', 0)]:
+            header = right.recv(FRAME_HEADER.size)
+            requestId, _, length, _, _ = FRAME_HEADER.unpack(header)
+            right.recv(length)
+            right.sendall(FRAME_HEADER.pack(requestId, 200, len(body), 0, flags) + body)
+
+    thread = threading.Thread(target=respond)
+    thread.start()
+    with pytest.raises(RuntimeError, match="Failed to read shared memory"):
+        framedSocket.call(1, b"{}", 5)
+    assert framedSocket.call(1, b"{}", 5) == (200, b'"ok"')
+    thread.join()
+    framedSocket.close()
+    right.close()
+
+
+def test_discard_unlinks_own_segment():
+    descriptor = transport.writeShared(b"x")
+    name = json.loads(descriptor)["name"]
+    assert name in getSegmentNames()
+    transport.discardShared(descriptor)
+    assert name not in getSegmentNames()
@@ -0,0 +1,30 @@
+import json
+import subprocess
+import sys
+
+from nativerpc import common
+from nativerpc.bench import LAZY_MODULES
+from conftest import SOURCE_PATH
+
+
+def test_import_is_lazy(workspace):
+    # Fresh interpreter with a warm schema cache, the running one has loaded everything already
+    code = (
+        "import sys, nativerpc, schema\n"
+        "server = nativerpc.Server({'service': type('S', (schema.Store,), {}), 'host': ('localhost', 0)})\n"
+        f"print(__import__('json').dumps([x for x in {LAZY_MODULES!r} if x in sys.modules]))\n"
+    )
+    sourcePath = workspace / "proj" / "src"
+    (sourcePath / "startup.py").write_text(code)
+    common.parseSchemaFiles([str(sourcePath / "schema.py")])
+    output = subprocess.check_output([sys.executable, str(sourcePath / "startup.py")],
+                                     env={"PYTHONPATH": SOURCE_PATH, "PATH": ""})
+    assert json.loads(output.splitlines()[-1]) == []
+
+
+def test_python_version_cached(workspace, monkeypatch):
+    context = common.getWorkspace()
+    version = common.getPythonVersion(context)
+    monkeypatch.setattr(common.subprocess, "check_output", None)
+    assert common.getPythonVersion(context) == version
+    assert (workspace / common.CACHE_FOLDER / "python.json").exists()
@@ -0,0 +1,70 @@
+import os
+import socket
+import threading
+
+import pytest
+
+import nativerpc
+
+
+def test_unix_socket_calls(startServer, workspace):
+    import schema
+    path = str(workspace / "store.sock")
+    server = startServer({"host": path})
+    store = nativerpc.Client({"service": schema.Store, "host": path}).connect()
+    item = schema.Item()
+    item.name = "unix"
+    assert store.getItem(item).count == 1
+    store.close()
+    assert server.unixFile is not None
+
+
+def test_unix_socket_replaces_stale_socket(startServer, workspace):
+    path = str(workspace / "store.sock")
+    stale = socket.socket(socket.AF_UNIX)
+    stale.bind(path)
+    stale.close()
+    startServer({"host": path})
+    assert os.path.exists(path)
+
+
+def test_unix_socket_keeps_regular_file(workspace):
+    import schema
+    path = workspace / "store.sock"
+    path.write_text("keep")
+
+    class StoreImpl(schema.Store):
+        def getItem(self, param):
+            return param
+
+        def place(self, param):
+            return param
+
+    server = nativerpc.Server({"service": StoreImpl, "host": str(path)})
+    with pytest.raises(RuntimeError, match="Not a socket"):
+        server.startServer()
+    assert path.read_text() == "keep"
+
+
+def test_unix_socket_removed_on_close(startServer, workspace):
+    path = str(workspace / "store.sock")
+    server = startServer({"host": path})
+    thread = [x for x in threading.enumerate() if getattr(x, "_target", None) == server.listen][0]
+    server.close()
+    thread.join(5)
+    assert not os.path.exists(path)
+
+
+def test_unix_socket_replaced_by_other_server(startServer, workspace):
+    path = str(workspace / "store.sock")
+    server = startServer({"host": path})
+    thread = [x for x in threading.enumerate() if getattr(x, "_target", None) == server.listen][0]
+
+    # Another server took over the path, its socket stays
+    os.remove(path)
+    other = socket.socket(socket.AF_UNIX)
+    other.bind(path)
+    server.close()
+    thread.join(5)
+    assert os.path.exists(path)
+    other.close()
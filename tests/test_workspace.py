@@ -0,0 +1,62 @@
+import json
+import os
+import threading
+
+from nativerpc import common
+
+
+def test_workspace_resolved_once(workspace):
+    context = common.getWorkspace()
+    assert context.projectPath == str(workspace / "proj")
+    assert context.settings["projectNames"] == ["proj"]
+    assert common.getWorkspace() is context
+
+
+def test_refresh_swaps_context(workspace):
+    context = common.getWorkspace()
+    configFile = workspace / "workspace.json"
+    configFile.write_text(json.dumps(dict(context.settings, schemaNames=["other"])))
+    os.utime(configFile, (context.workspaceTime + 10, context.workspaceTime + 10))
+
+    # Running readers keep the old context intact, new readers get the changed settings
+    context.checkTime -= 10
+    refreshed = common.getWorkspace()
+    assert refreshed is not context
+    assert refreshed.settings["schemaNames"] == ["other"]
+    assert context.settings["schemaNames"] == ["schema"]
+    assert common.getWorkspace() is refreshed
+
+
+def test_refresh_keeps_shell_id(workspace):
+    context = common.getWorkspace()
+    shellId = context.getShellId()
+    context.checkTime -= 10
+    context.workspaceTime -= 10
+
+    # Process lifetime caches carry over, the parent process chain is not walked again
+    refreshed = common.getWorkspace()
+    assert refreshed is not context
+    assert refreshed.shellId == shellId
+
+
+def test_concurrent_refresh(workspace):
+    configFile = workspace / "workspace.json"
+    seen = set()
+    running = True
+
+    def read():
+        while running:
+            context = common.getWorkspace()
+            seen.add((context.projectPath, context.projectName))
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for index in range(50):
+        context = common.getWorkspace()
+        os.utime(configFile, (index, index))
+        context.checkTime -= 10
+    running = False
+    for thread in threads:
+        thread.join()
+    assert seen == {(str(workspace / "proj"), "proj")}